@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from typing import List, Dict, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.models.product import Product, ProductCreate
-from app.models.supplier import Supplier, SupplierCreate
+from app.models.supplier import Supplier, SupplierCreate, SupplierUpdate
 from app.dependencies import get_db
 from app.services.product import ProductService
+from app.services.import_stream import (
+    StreamingImportService, iter_file_chunks, parse_rows, resolve_import_path
+)
 
 router = APIRouter()
 
@@ -24,6 +27,14 @@ async def get_supplier(supplier_id: str, db: AsyncIOMotorDatabase = Depends(get_
         raise HTTPException(status_code=404, detail="Supplier not found")
     return supplier
 
+@router.put("/suppliers/{supplier_id}", response_model=Supplier)
+async def update_supplier(supplier_id: str, supplier: SupplierUpdate, db: AsyncIOMotorDatabase = Depends(get_db)):
+    product_service = ProductService(db)
+    updated_supplier = await product_service.update_supplier(supplier_id, supplier)
+    if not updated_supplier:
+        raise HTTPException(status_code=404, detail="Supplier not found")
+    return updated_supplier
+
 @router.post("/import/{source}", response_model=Product)
 async def import_product(source: str, data: dict, db: AsyncIOMotorDatabase = Depends(get_db)):
     product_service = ProductService(db)
@@ -34,10 +45,57 @@ async def import_product(source: str, data: dict, db: AsyncIOMotorDatabase = Dep
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/import/bulk/{source}", response_model=List[Product])
+@router.post("/import/bulk/{source}")
 async def bulk_import_products(source: str, products_data: List[dict], db: AsyncIOMotorDatabase = Depends(get_db)):
     product_service = ProductService(db)
     try:
         return await product_service.bulk_import_products(source, products_data)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+def _detect_format(format: Optional[str], hint: str) -> str:
+    if format:
+        return format
+    return "csv" if "csv" in hint.lower() else "ndjson"
+
+@router.post("/import/stream/{source}")
+async def stream_import_products(
+    source: str,
+    request: Request,
+    format: Optional[str] = Query(None, regex="^(csv|ndjson)$"),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Import a CSV or NDJSON feed streamed in the request body"""
+    import_service = StreamingImportService(db)
+    format = _detect_format(format, request.headers.get("content-type", ""))
+    job_id = await import_service.create_job(source, format, "upload")
+    try:
+        return await import_service.run(job_id, source, parse_rows(request.stream(), format))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Import job {job_id} failed: {str(e)}")
+
+@router.post("/import/file/{source}")
+async def file_import_products(
+    source: str,
+    path: str,
+    background_tasks: BackgroundTasks,
+    format: Optional[str] = Query(None, regex="^(csv|ndjson)$"),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Start importing a CSV or NDJSON feed from IMPORT_FILE_ROOT in the background"""
+    resolved = resolve_import_path(path)
+    if not resolved:
+        raise HTTPException(status_code=404, detail="Import file not found")
+    import_service = StreamingImportService(db)
+    format = _detect_format(format, resolved)
+    job_id = await import_service.create_job(source, format, path)
+    background_tasks.add_task(import_service.run, job_id, source, parse_rows(iter_file_chunks(resolved), format))
+    return {"job_id": job_id, "status": "pending"}
+
+@router.get("/import/jobs/{job_id}")
+async def get_import_job(job_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+    """Get the progress of a streaming import"""
+    job = await StreamingImportService(db).get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
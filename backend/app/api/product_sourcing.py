@@ -31,16 +31,40 @@ async def compare_prices(
 async def bulk_import_products(
     supplier_id: str,
     category: str,
-    limit: int = Query(100, ge=1, le=1000),
+    limit: Optional[int] = Query(None, ge=1),
+    page_size: Optional[int] = Query(None, ge=1, le=1000),
+    job_id: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Bulk import products from a supplier"""
+    """Bulk import products from a supplier, or resume a failed import"""
     async with ProductSourcingService() as service:
-        result = await service.bulk_import_products(supplier_id, category, limit)
+        result = await service.bulk_import_products(supplier_id, category, limit, page_size, job_id)
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         return result
 
+@router.get("/products/bulk-import/{job_id}")
+async def get_bulk_import_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the progress of a bulk import"""
+    async with ProductSourcingService() as service:
+        job = await service.get_import_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Import job not found")
+        return job
+
+@router.get("/products/variations")
+async def get_variations_bulk(
+    parent_ids: List[str] = Query(..., max_length=200),
+    current_user: User = Depends(get_current_user)
+):
+    """Get variations for many products at once, grouped by parent ID"""
+    async with ProductSourcingService() as service:
+        variations = await service.get_variations_bulk(parent_ids)
+        return variations
+
 @router.get("/products/{product_id}/variations")
 async def get_product_variations(
     product_id: str,
@@ -68,9 +92,28 @@ async def create_product_variation(
 async def search_products(
     query: str,
     filters: Optional[Dict] = None,
+    after: Optional[str] = None,
+    sort_by: str = "created_at",
+    sort_order: int = -1,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    total: str = Query("exact", regex="^(exact|approximate|none)$"),
     current_user: User = Depends(get_current_user)
 ):
     """Advanced product search with filters"""
+    filters = {
+        **(filters or {}),
+        "sort_by": sort_by,
+        "sort_order": sort_order,
+        "page": page,
+        "per_page": per_page,
+        "total": total
+    }
+    if after:
+        filters["after"] = after
     async with ProductSourcingService() as service:
-        result = await service.search_products(query, filters)
+        try:
+            result = await service.search_products(query, filters)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
         return result 
\ No newline at end of file
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.models.product import Product, ProductCreate, ProductUpdate
+from app.models.product import Product, ProductCreate, ProductUpdate, ProductPage
 from app.models.user import User
 from app.dependencies import get_db, get_current_user, get_current_admin
 from app.services.product import ProductService
@@ -19,6 +19,23 @@ async def get_products(
     product_service = ProductService(db)
     return await product_service.get_products(skip=skip, limit=limit, category=category, search=search)
 
+@router.get("/page", response_model=ProductPage)
+async def list_products(
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[str] = None,
+    category: Optional[str] = None,
+    supplier_id: Optional[str] = None,
+    search: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    product_service = ProductService(db)
+    try:
+        return await product_service.list_products(
+            limit=limit, after=after, category=category, supplier_id=supplier_id, search=search
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/{product_id}", response_model=Product)
 async def get_product(
     product_id: str,
@@ -64,6 +64,18 @@ async def start_auto_sync(
     background_tasks.add_task(sync_service.start_auto_sync, interval_minutes)
     return {"message": "Auto sync started"}
 
+@router.get("/suppliers/sync-runs")
+async def get_sync_runs(
+    limit: int = 20,
+    current_user: User = Depends(get_current_admin),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    sync_service = SupplierSyncService(db)
+    runs = await sync_service.get_sync_runs(limit)
+    for run in runs:
+        run["_id"] = str(run["_id"])
+    return runs
+
 @router.get("/suppliers/{supplier_id}/stats")
 async def get_supplier_stats(
     supplier_id: str,
@@ -38,6 +38,15 @@ class Settings(BaseSettings):
     NOTIFICATION_QUEUE_SIZE: int = 1000
     NOTIFICATION_RETRY_ATTEMPTS: int = 3
     
+    # Product sourcing settings
+    PRICE_COMPARISON_DEADLINE_SECONDS: float = 3.0
+    PRICE_COMPARISON_HEDGE_AFTER_SECONDS: float = 1.0
+    QUOTE_CACHE_TTL_SECONDS: float = 30.0
+    QUOTE_CACHE_STALE_SECONDS: float = 120.0
+    QUOTE_CACHE_MAX_ENTRIES: int = 10000
+    BULK_IMPORT_PAGE_SIZE: int = 500
+    SEARCH_APPROX_COUNT_LIMIT: int = 1000
+    
     # Stripe settings
     stripe_secret_key: str = ""
     stripe_webhook_secret: str = ""
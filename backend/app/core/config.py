@@ -68,6 +68,55 @@ class Settings(BaseSettings):
     # ML Service
     ML_MODEL_PATH: str = "models"
 
+    # Supplier sync settings
+    SYNC_INTERVAL_MINUTES: int = 60
+    PRICE_CHANGE_THRESHOLD: float = 5.0
+    PRICE_CHANGE_NOTIFICATION_THRESHOLD: float = 20.0
+    STOCK_ALERT_THRESHOLD: int = 10
+    SYNC_WRITE_BATCH_SIZE: int = 500
+    SYNC_MIN_INTERVAL_MINUTES: int = 5
+    SYNC_MAX_INTERVAL_MINUTES: int = 60 * 24
+    SYNC_SCHEDULER_BATCH_SIZE: int = 200
+    SYNC_SCHEDULER_POLL_SECONDS: int = 60
+    SYNC_VELOCITY_WINDOW_DAYS: int = 7
+    SYNC_VELOCITY_REFERENCE: float = 5.0  # units/day at which a product syncs twice as often
+    SUPPLIER_CACHE_TTL_SECONDS: int = 300
+    SYNC_SHARD_COUNT: int = 64
+    SYNC_LEASE_SECONDS: int = 120
+
+    # Product cache settings
+    PRODUCT_CACHE_TTL_SECONDS: float = 30.0
+    PRODUCT_CACHE_NEGATIVE_TTL_SECONDS: float = 5.0
+    PRODUCT_CACHE_MAX_ENTRIES: int = 5000
+    PRODUCT_CACHE_REDIS_ENABLED: bool = False
+    PRODUCT_CACHE_REDIS_TTL_SECONDS: float = 300.0
+
+    # Product import settings
+    IMPORT_BULK_WRITE_BATCH_SIZE: int = 1000
+    IMPORT_STREAM_BATCH_SIZE: int = 1000
+    IMPORT_STREAM_QUEUE_BATCHES: int = 4
+    IMPORT_TRANSFORM_WORKERS: int = 2  # 0 runs validation/transform on the event loop
+    IMPORT_TRANSFORM_CONCURRENCY: int = 4
+    IMPORT_FILE_ROOT: str = "imports"
+
+    # Inventory settings
+    STOCK_SHARD_COUNT: int = 8
+    STOCK_SHARD_CACHE_SECONDS: float = 10.0
+    STOCK_HOLD_SECONDS: int = 15 * 60
+    STOCK_HOLD_SWEEP_BATCH_SIZE: int = 500
+    STOCK_HOLD_SWEEP_INTERVAL_SECONDS: int = 30
+    STOCK_BULK_WRITE_BATCH_SIZE: int = 1000
+    INVENTORY_HISTORY_BUCKET_SIZE: int = 200
+    ORDER_OUTBOX_LEASE_SECONDS: int = 60
+    ORDER_OUTBOX_MAX_ATTEMPTS: int = 8
+    ORDER_OUTBOX_BATCH_SIZE: int = 100
+    ORDER_OUTBOX_POLL_INTERVAL_SECONDS: int = 5
+    FULFILLMENT_BATCH_SIZE: int = 100
+    FULFILLMENT_LEASE_SECONDS: int = 300
+    FULFILLMENT_SUPPLIER_CONCURRENCY: int = 8
+    FULFILLMENT_MAX_ATTEMPTS: int = 5
+    FULFILLMENT_POLL_SECONDS: int = 10
+
     @validator("BACKEND_CORS_ORIGINS", pre=True)
     def assemble_cors_origins(cls, v: Union[str, List[str]]) -> Union[List[str], str]:
         if isinstance(v, str) and not v.startswith("["):
@@ -1,10 +1,18 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api import auth, products, notifications, orders
 from app.db.mongodb import get_database
+from app.services.product_sourcing_service import close_shared_session
+from app.services.import_stream import shutdown_transform_pool
+from app.services.stock_alerts import StockAlerts
+from app.services.supplier_registry import supplier_registry
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+# Background work started on boot; held so it is not garbage collected and awaited on shutdown
+_startup_tasks = set()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
@@ -28,11 +36,19 @@ app.include_router(orders.router, prefix=f"{settings.API_V1_STR}/orders", tags=[
 
 @app.on_event("startup")
 async def startup_db_client():
-    await get_database()
+    db = await get_database()
+    # Seeds the low-stock view on first deploy without holding up startup
+    _startup_tasks.add(asyncio.create_task(StockAlerts(db).rebuild_if_needed()))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    pass  # MongoDB client will be closed automatically
+    for task in _startup_tasks:
+        task.cancel()
+    await asyncio.gather(*_startup_tasks, return_exceptions=True)
+    await close_shared_session()
+    shutdown_transform_pool()
+    await supplier_registry.close()
+    # MongoDB client will be closed automatically
 
 @app.get("/")
 async def root():
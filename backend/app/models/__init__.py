@@ -1,7 +1,7 @@
 # This file makes the directory a Python package 
 
 from .user import User, UserCreate, UserUpdate, UserInDB
-from .product import Product, ProductCreate, ProductUpdate
+from .product import Product, ProductCreate, ProductUpdate, ProductSummary, ProductPage
 from .order import Order, OrderCreate, OrderUpdate, OrderItem, OrderStatus
 from .cart import Cart, CartItem, CartCreate, CartUpdate, CartItemCreate, CartItemUpdate
 from .supplier import Supplier, SupplierCreate, SupplierUpdate, SupplierSync, SyncStatus
@@ -23,6 +23,8 @@ __all__ = [
     "Product",
     "ProductCreate",
     "ProductUpdate",
+    "ProductSummary",
+    "ProductPage",
     "Order",
     "OrderCreate",
     "OrderUpdate",
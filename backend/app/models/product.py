@@ -45,6 +45,24 @@ class Product(BaseModel):
             }
         }
 
+class ProductSummary(BaseModel):
+    """Fields needed to render a product in a list view"""
+    id: str = Field(alias="_id")
+    name: str
+    price: float
+    image_url: Optional[str] = None
+    category: Optional[str] = None
+    supplier_id: Optional[str] = None
+    stock_quantity: Optional[int] = None
+    status: str = "active"
+
+    class Config:
+        populate_by_name = True
+
+class ProductPage(BaseModel):
+    items: List[ProductSummary]
+    next_cursor: Optional[str] = None
+
 class ProductCreate(BaseModel):
     name: str
     description: str
@@ -6,7 +6,7 @@ from datetime import datetime
 from typing import Dict, Any
 import json
 import time
-from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
 from functools import wraps
 from typing import Callable
 import boto3
@@ -167,6 +167,69 @@ ML_PREDICTION_COUNT = Counter(
     ['model_type', 'status']
 )
 
+SUPPLIER_REQUEST_LATENCY = Histogram(
+    'supplier_request_latency_seconds',
+    'Supplier API request latency in seconds',
+    ['supplier']
+)
+
+SYNC_PRODUCTS = Counter(
+    'sync_products_total',
+    'Number of products processed by supplier sync',
+    ['status']
+)
+
+SYNC_RUN_DURATION = Histogram(
+    'sync_run_duration_seconds',
+    'Duration of a supplier sync run in seconds',
+    ['mode'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+SYNC_QUEUE_DEPTH = Gauge(
+    'sync_queue_depth',
+    'Number of products currently due for supplier sync'
+)
+
+SYNC_STALEST_PRODUCT_AGE = Gauge(
+    'sync_stalest_product_age_seconds',
+    'Seconds since the least recently synced product was synced'
+)
+
+PRODUCT_CACHE_LOOKUPS = Counter(
+    'product_cache_lookups_total',
+    'Product cache lookups by tier and result (hit, negative_hit, miss)',
+    ['tier', 'result']
+)
+
+PRODUCT_CACHE_SIZE = Gauge(
+    'product_cache_entries',
+    'Number of products held in the in-process product cache'
+)
+
+STOCK_HOLDS_OUTSTANDING = Gauge(
+    'stock_holds_outstanding',
+    'Number of stock reservation holds that are still held'
+)
+
+STOCK_HOLDS_RELEASED = Counter(
+    'stock_holds_released_total',
+    'Number of stock reservation holds released, by reason (expired, released)',
+    ['reason']
+)
+
+ORDER_STAGE_DURATION = Histogram(
+    'order_stage_duration_seconds',
+    'Time spent in each order processing stage (reserve, label, commit)',
+    ['stage']
+)
+
+FULFILLMENT_ORDERS = Counter(
+    'fulfillment_orders_total',
+    'Orders handled by the fulfillment worker, by outcome (fulfilled, retry, failed)',
+    ['status']
+)
+
 def start_metrics_server():
     """Start Prometheus metrics server"""
     start_http_server(8000)
@@ -0,0 +1,234 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from app.services.supplier_registry import supplier_registry
+from app.core.config import settings
+from app.monitoring import log_error, FULFILLMENT_ORDERS, SUPPLIER_REQUEST_LATENCY
+
+class FulfillmentWorker:
+    """Places supplier purchase orders for paid orders in leased batches.
+
+    ``OrderService.process_order`` marks an order ``fulfillment_status:
+    "ready"`` when it moves it to processing; the worker owns that field
+    from there on and never touches ``status``. A worker claims up to
+    ``FULFILLMENT_BATCH_SIZE`` ready, paid orders, one ``find_one_and_update``
+    each, stamping them with a lease expiry and a fresh ``fulfillment_token``,
+    and keeps extending the lease while the batch runs. Any number of
+    workers can run side by side; an order is only ever leased to one of
+    them, and leases of dead workers expire and are claimed again. The
+    batch's lines are grouped by supplier, each supplier gets one cached API
+    client and at most ``FULFILLMENT_SUPPLIER_CONCURRENCY`` requests in
+    flight. Every accepted line is saved to ``supplier_orders`` as soon as
+    the supplier confirms it, so a crash or a retry never orders it twice,
+    and the outcomes go back in one ``bulk_write`` fenced on the token:
+    ``fulfillment_status`` becomes ``placed``, or ``failed`` once
+    ``FULFILLMENT_MAX_ATTEMPTS`` is used up.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, worker_id: Optional[str] = None):
+        self.order_collection = db.orders
+        self.product_collection = db.products
+        self.supplier_collection = db.suppliers
+        self.batch_size = settings.FULFILLMENT_BATCH_SIZE
+        self.lease_seconds = settings.FULFILLMENT_LEASE_SECONDS
+        self.supplier_concurrency = settings.FULFILLMENT_SUPPLIER_CONCURRENCY
+        self.max_attempts = settings.FULFILLMENT_MAX_ATTEMPTS
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @staticmethod
+    def _to_object_id(value):
+        return ObjectId(value) if ObjectId.is_valid(value) else value
+
+    async def ensure_indexes(self):
+        await self.order_collection.create_index(
+            [("fulfillment_status", 1), ("fulfillment_available_at", 1)]
+        )
+
+    async def claim_batch(self) -> List[Dict]:
+        """Lease up to ``batch_size`` orders that are ready for fulfillment"""
+        claimed = []
+        for _ in range(self.batch_size):
+            now = datetime.utcnow()
+            order = await self.order_collection.find_one_and_update(
+                {
+                    "fulfillment_status": "ready",
+                    "status": "processing",
+                    "payment_status": "paid",
+                    "$or": [
+                        {"fulfillment_available_at": {"$exists": False}},
+                        {"fulfillment_available_at": {"$lte": now}}
+                    ]
+                },
+                {"$set": {
+                    "fulfillment_owner": self.worker_id,
+                    "fulfillment_token": ObjectId(),
+                    "fulfillment_available_at": now + timedelta(seconds=self.lease_seconds)
+                }},
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if order is None:
+                break
+            claimed.append(order)
+        return claimed
+
+    async def process_batch(self, orders: List[Dict]) -> Dict[str, int]:
+        """Place every unplaced line of the leased orders and record the outcomes"""
+        product_keys = {self._to_object_id(item["product_id"]) for order in orders for item in order["items"]}
+        products = await self.product_collection.find(
+            {"_id": {"$in": list(product_keys)}}, {"supplier_id": 1, "supplier_product_id": 1}
+        ).to_list(None)
+        products_by_id = {str(product["_id"]): product for product in products}
+
+        # supplier ID -> [(order, line index, supplier product ID, quantity)]
+        by_supplier: Dict[str, List[Tuple[Dict, int, str, int]]] = {}
+        errors: Dict[Any, List[str]] = {}
+        for order in orders:
+            placed = order.get("supplier_orders", {})
+            for index, item in enumerate(order["items"]):
+                if str(index) in placed:
+                    continue
+                product = products_by_id.get(str(item["product_id"]))
+                if not product or not product.get("supplier_id"):
+                    errors.setdefault(order["_id"], []).append(f"No supplier for product {item['product_id']}")
+                    continue
+                by_supplier.setdefault(str(product["supplier_id"]), []).append(
+                    (order, index, product["supplier_product_id"], item["quantity"])
+                )
+
+        heartbeat = asyncio.create_task(self._heartbeat(orders))
+        try:
+            await supplier_registry.prefetch(self.supplier_collection, by_supplier.keys())
+            placements: Dict[Any, Dict[str, Dict]] = {}
+            await asyncio.gather(*[
+                self._submit_supplier(supplier_id, lines, placements, errors)
+                for supplier_id, lines in by_supplier.items()
+            ])
+            return await self._record(orders, placements, errors)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, orders: List[Dict]):
+        """Keep extending the batch's leases so slow suppliers don't let them lapse mid-batch"""
+        tokens = [order["fulfillment_token"] for order in orders]
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.order_collection.update_many(
+                    {"fulfillment_token": {"$in": tokens}},
+                    {"$set": {"fulfillment_available_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except Exception as e:
+                log_error(e, {"context": "fulfillment_heartbeat", "worker_id": self.worker_id})
+
+    async def _save_placement(self, order: Dict, index: int, placement: Dict):
+        """Persist one accepted line straight away
+
+        Not fenced on the lease: the supplier has accepted the line whoever
+        holds the order now. Only the first record of a line is kept; a
+        second one means the line was ordered twice and is logged.
+        """
+        field = f"supplier_orders.{index}"
+        result = await self.order_collection.update_one(
+            {"_id": order["_id"], field: {"$exists": False}},
+            {"$set": {field: placement}}
+        )
+        if result.modified_count == 0:
+            log_error(
+                ValueError("Order line was already placed"),
+                {"context": "fulfillment", "order_id": str(order["_id"]), "line": index, "placement": placement}
+            )
+
+    async def _submit_supplier(self, supplier_id: str, lines: List[Tuple[Dict, int, str, int]],
+                               placements: Dict[Any, Dict[str, Dict]], errors: Dict[Any, List[str]]):
+        """Place one supplier's lines with bounded concurrency"""
+        api = await supplier_registry.get_client(self.supplier_collection, supplier_id)
+        supplier = await supplier_registry.get_supplier(self.supplier_collection, supplier_id)
+        supplier_name = (supplier or {}).get("name", supplier_id)
+        if api is None:
+            for order, _, _, _ in lines:
+                errors.setdefault(order["_id"], []).append(f"Supplier {supplier_id} not found")
+            return
+        semaphore = asyncio.Semaphore(self.supplier_concurrency)
+
+        async def place(order: Dict, index: int, supplier_product_id: str, quantity: int):
+            async with semaphore:
+                try:
+                    with SUPPLIER_REQUEST_LATENCY.labels(supplier=supplier_name).time():
+                        result = await api.place_order(supplier_product_id, quantity, order["shipping_address"])
+                except Exception as e:
+                    log_error(e, {"context": "fulfillment", "order_id": str(order["_id"]), "supplier_id": supplier_id})
+                    errors.setdefault(order["_id"], []).append(str(e))
+                    return
+                placement = {**result, "supplier_id": supplier_id, "placed_at": datetime.utcnow()}
+                try:
+                    await self._save_placement(order, index, placement)
+                except Exception as e:
+                    # Left for _record to write with the batch
+                    placements.setdefault(order["_id"], {})[str(index)] = placement
+                    log_error(e, {"context": "fulfillment", "order_id": str(order["_id"]), "line": index})
+
+        try:
+            await asyncio.gather(*[place(*line) for line in lines])
+        finally:
+            await supplier_registry.release(api)
+
+    async def _record(self, orders: List[Dict], placements: Dict[Any, Dict[str, Dict]],
+                      errors: Dict[Any, List[str]]) -> Dict[str, int]:
+        """Write every order's outcome in one bulk write, fenced on its lease token"""
+        now = datetime.utcnow()
+        operations = []
+        counts = {"fulfilled": 0, "retry": 0, "failed": 0}
+        for order in orders:
+            update: Dict[str, Any] = {"$set": {"updated_at": now}, "$unset": {"fulfillment_owner": ""}}
+            # Placements _save_placement could not write, with the same guard so a recorded line is never replaced
+            for index, placement in placements.get(order["_id"], {}).items():
+                field = f"supplier_orders.{index}"
+                operations.append(UpdateOne({"_id": order["_id"], field: {"$exists": False}}, {"$set": {field: placement}}))
+            order_errors = errors.get(order["_id"])
+            if not order_errors:
+                update["$set"]["fulfillment_status"] = "placed"
+                update["$unset"]["fulfillment_available_at"] = ""
+                outcome = "fulfilled"
+            else:
+                attempts = order.get("fulfillment_attempts", 0) + 1
+                update["$set"]["fulfillment_attempts"] = attempts
+                update["$set"]["fulfillment_errors"] = order_errors
+                if attempts >= self.max_attempts:
+                    update["$set"]["fulfillment_status"] = "failed"
+                    update["$unset"]["fulfillment_available_at"] = ""
+                    outcome = "failed"
+                else:
+                    # Back off before another worker picks the order up again
+                    update["$set"]["fulfillment_available_at"] = now + timedelta(seconds=min(30 * 2 ** attempts, 3600))
+                    outcome = "retry"
+            counts[outcome] += 1
+            operations.append(UpdateOne(
+                {"_id": order["_id"], "fulfillment_token": order["fulfillment_token"]},
+                update
+            ))
+        if operations:
+            await self.order_collection.bulk_write(operations, ordered=False)
+        for outcome, count in counts.items():
+            FULFILLMENT_ORDERS.labels(status=outcome).inc(count)
+        return counts
+
+    async def run(self):
+        """Claim and fulfill batches until stopped, draining backlogs back to back"""
+        await self.ensure_indexes()
+        while True:
+            try:
+                orders = await self.claim_batch()
+                if orders:
+                    await self.process_batch(orders)
+                if len(orders) < self.batch_size:
+                    await asyncio.sleep(settings.FULFILLMENT_POLL_SECONDS)
+            except Exception as e:
+                log_error(e, {"context": "fulfillment_worker", "worker_id": self.worker_id})
+                await asyncio.sleep(settings.FULFILLMENT_POLL_SECONDS)
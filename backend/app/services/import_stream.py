@@ -0,0 +1,277 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import codecs
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.config import settings
+from app.services.product import ProductService, prepare_import_rows
+
+_transform_pool: Optional[ProcessPoolExecutor] = None
+
+def get_transform_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool shared by all import jobs, or None when transforms run inline"""
+    global _transform_pool
+    if _transform_pool is None and settings.IMPORT_TRANSFORM_WORKERS > 0:
+        # Spawn rather than fork so children do not inherit the event loop or Mongo client threads
+        _transform_pool = ProcessPoolExecutor(
+            max_workers=settings.IMPORT_TRANSFORM_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _transform_pool
+
+def shutdown_transform_pool():
+    global _transform_pool
+    if _transform_pool is not None:
+        _transform_pool.shutdown(wait=False, cancel_futures=True)
+        _transform_pool = None
+
+def timed_prepare_import_rows(source: str, rows: List[Dict[str, Any]]):
+    """Run ``prepare_import_rows`` and return its result with the CPU time it took"""
+    started = time.perf_counter()
+    prepared = prepare_import_rows(source, rows)
+    return prepared, time.perf_counter() - started
+
+async def iter_file_chunks(path: str, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """Read a local file in chunks without blocking the event loop"""
+    handle = await asyncio.to_thread(open, path, "rb")
+    try:
+        while True:
+            chunk = await asyncio.to_thread(handle.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        await asyncio.to_thread(handle.close)
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines, holding at most one partial line"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Parse one JSON object per line; malformed lines yield None"""
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield row if isinstance(row, dict) else None
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Parse CSV with a header row; quoted fields may span lines"""
+    header: Optional[List[str]] = None
+    record = ""
+    async for line in lines:
+        record = f"{record}\n{line}" if record else line
+        # An odd number of quotes means a quoted field continues on the next line
+        if record.count('"') % 2:
+            continue
+        if not record.strip():
+            record = ""
+            continue
+        values = next(csv.reader([record]))
+        record = ""
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield dict(zip(header, values)) if len(values) == len(header) else None
+
+def parse_rows(chunks: AsyncIterator[bytes], format: str) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    lines = iter_lines(chunks)
+    return iter_csv(lines) if format == "csv" else iter_ndjson(lines)
+
+class StreamingImportService:
+    """Feeds streamed CSV/NDJSON rows into the bulk import pipeline.
+
+    The import runs as three stages joined by bounded queues:
+
+    * parse: a reader task turns the byte stream into fixed-size batches;
+    * transform: each batch is validated and transformed in the shared process
+      pool, with up to ``IMPORT_TRANSFORM_CONCURRENCY`` batches in flight;
+    * write: the writer awaits transformed batches in feed order and upserts
+      them through ``ProductService.write_prepared_rows``.
+
+    When the writer falls behind, the queues fill and the reader stops pulling
+    bytes from the request body or file. Progress counters and per-stage
+    timings live in ``import_jobs``.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.jobs_collection = db.import_jobs
+        self.product_service = ProductService(db)
+        self.batch_size = settings.IMPORT_STREAM_BATCH_SIZE
+        self.queue_size = settings.IMPORT_STREAM_QUEUE_BATCHES
+        self.transform_concurrency = settings.IMPORT_TRANSFORM_CONCURRENCY
+
+    async def create_job(self, source: str, format: str, origin: str) -> str:
+        now = datetime.utcnow()
+        result = await self.jobs_collection.insert_one({
+            "type": "file_import",
+            "source": source,
+            "format": format,
+            "origin": origin,
+            "status": "pending",
+            "rows_read": 0,
+            "batches": 0,
+            "inserted": 0,
+            "updated": 0,
+            "superseded": 0,
+            "invalid": 0,
+            "error": 0,
+            "errors": [],
+            "stage_seconds": {"parse": 0.0, "transform": 0.0, "write": 0.0},
+            "started_at": now,
+            "updated_at": now
+        })
+        return str(result.inserted_id)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not ObjectId.is_valid(job_id):
+            return None
+        job = await self.jobs_collection.find_one({"_id": ObjectId(job_id)})
+        if job:
+            job["_id"] = str(job["_id"])
+        return job
+
+    async def run(self, job_id: str, source: str, rows: AsyncIterator[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Import every row from ``rows`` and return the final job document"""
+        await self._update_job(job_id, {"$set": {"status": "running"}})
+        parsed: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        transformed: asyncio.Queue = asyncio.Queue(maxsize=self.transform_concurrency)
+        reader = asyncio.create_task(self._read_batches(rows, parsed))
+        transformer = asyncio.create_task(self._transform_batches(source, parsed, transformed))
+        try:
+            while True:
+                item = await transformed.get()
+                if item is None:
+                    break
+                await self._write_batch(job_id, *item)
+            await transformer
+            await reader
+            await self._update_job(job_id, {"$set": {"status": "completed", "finished_at": datetime.utcnow()}})
+        except Exception as e:
+            reader.cancel()
+            transformer.cancel()
+            await self._update_job(job_id, {"$set": {
+                "status": "failed",
+                "failure": str(e),
+                "finished_at": datetime.utcnow()
+            }})
+            raise
+        return await self.get_job(job_id)
+
+    async def _read_batches(self, rows: AsyncIterator[Optional[Dict[str, Any]]], queue: asyncio.Queue):
+        batch: List[Optional[Dict[str, Any]]] = []
+        offset = 0
+        started = time.perf_counter()
+        try:
+            async for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    await queue.put((offset, batch, time.perf_counter() - started))
+                    offset += len(batch)
+                    batch = []
+                    # Time spent blocked on a full queue is backpressure, not parsing
+                    started = time.perf_counter()
+            if batch:
+                await queue.put((offset, batch, time.perf_counter() - started))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Wake the next stage so the error surfaces through `await reader`
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _transform_batches(self, source: str, parsed: asyncio.Queue, transformed: asyncio.Queue):
+        """Submit parsed batches to the process pool, handing futures on in feed order"""
+        loop = asyncio.get_running_loop()
+        pool = get_transform_pool()
+        try:
+            while True:
+                item = await parsed.get()
+                if item is None:
+                    break
+                offset, batch, parse_seconds = item
+                valid = [row for row in batch if row is not None]
+                if pool is None:
+                    future = loop.create_future()
+                    future.set_result(timed_prepare_import_rows(source, valid))
+                else:
+                    future = loop.run_in_executor(pool, timed_prepare_import_rows, source, valid)
+                # The bounded queue caps how many batches are in the pool at once
+                await transformed.put((offset, batch, parse_seconds, future))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await transformed.put(None)
+            raise
+        await transformed.put(None)
+
+    async def _write_batch(self, job_id: str, offset: int, batch: List[Optional[Dict[str, Any]]],
+                           parse_seconds: float, future: asyncio.Future):
+        prepared, transform_seconds = await future
+        started = time.perf_counter()
+        positions = [i for i, row in enumerate(batch) if row is not None]
+        unparseable = len(batch) - len(positions)
+        result = await self.product_service.write_prepared_rows(prepared)
+        write_seconds = time.perf_counter() - started
+
+        # Report errors by their row number in the feed
+        errors = [
+            {"row": offset + i, "status": "invalid", "error": "Unparseable row"}
+            for i, row in enumerate(batch) if row is None
+        ]
+        errors += [
+            {"row": offset + positions[outcome["index"]], "status": outcome["status"], "error": outcome.get("error")}
+            for outcome in result["results"]
+            if outcome["status"] in ("invalid", "error")
+        ]
+        errors = errors[:10]
+        await self._update_job(job_id, {
+            "$inc": {
+                "rows_read": len(batch),
+                "batches": 1,
+                "inserted": result["inserted"],
+                "updated": result["updated"],
+                "superseded": result["superseded"],
+                "invalid": result["invalid"] + unparseable,
+                "error": result["error"],
+                "stage_seconds.parse": parse_seconds,
+                "stage_seconds.transform": transform_seconds,
+                "stage_seconds.write": write_seconds
+            },
+            "$push": {"errors": {"$each": errors, "$slice": 100}}
+        })
+
+    async def _update_job(self, job_id: str, update: Dict[str, Any]):
+        update.setdefault("$set", {})["updated_at"] = datetime.utcnow()
+        await self.jobs_collection.update_one({"_id": ObjectId(job_id)}, update)
+
+def resolve_import_path(path: str) -> Optional[str]:
+    """Resolve a feed path inside IMPORT_FILE_ROOT, rejecting anything outside it"""
+    root = os.path.realpath(settings.IMPORT_FILE_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root or not os.path.isfile(resolved):
+        return None
+    return resolved
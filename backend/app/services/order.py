@@ -1,7 +1,10 @@
 from typing import List, Optional, Dict
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
-from app.models import Order, CartItem, Product
+from pymongo import UpdateOne
+from app.models import Order, OrderItem, CartItem, Product
+from app.services.stock_alerts import StockAlerts
+from services.stock_shards import StockShards
 from datetime import datetime
 
 class OrderService:
@@ -10,6 +13,8 @@ class OrderService:
         self.collection = db.orders
         self.products_collection = db.products
         self.cart_collection = db.cart_items
+        self.stock_shards = StockShards(db)
+        self.stock_alerts = StockAlerts(db)
 
     async def create_order(self, user_id: str, shipping_address: Dict, billing_address: Dict, payment_method: str) -> Optional[Order]:
         if not ObjectId.is_valid(user_id):
@@ -20,49 +25,146 @@ class OrderService:
         if not cart_items:
             return None
 
-        # Calculate total amount and validate stock
-        total_amount = 0
-        order_items = []
-        
+        # Merge repeated lines so each product is checked and decremented once
+        quantities: Dict[str, int] = {}
         for item in cart_items:
-            product = await self.products_collection.find_one({"_id": ObjectId(item["product_id"])})
-            if not product or product["stock"] < item["quantity"]:
+            product_id = str(item["product_id"])
+            quantities[product_id] = quantities.get(product_id, 0) + item["quantity"]
+
+        # Calculate total amount and validate stock with a single query
+        products = await self.products_collection.find(
+            {"_id": {"$in": [ObjectId(product_id) for product_id in quantities]}},
+            {"price": 1, "stock": 1, "stock_shard_count": 1}
+        ).to_list(length=None)
+        products_by_id = {str(product["_id"]): product for product in products}
+
+        total_amount = 0
+        sharded: Dict[str, int] = {}
+        for product_id, quantity in quantities.items():
+            product = products_by_id.get(product_id)
+            if not product:
+                return None
+            if product.get("stock_shard_count"):
+                # Sharded stock lives in stock_shards; the product's own stock field is unused
+                self.stock_shards.remember(product_id, product["stock_shard_count"])
+                sharded[product_id] = quantity
+            elif product["stock"] < quantity:
                 return None
-            
-            total_amount += product["price"] * item["quantity"]
-            order_items.append(CartItem(**item))
+            total_amount += product["price"] * quantity
+        unsharded = {product_id: quantity for product_id, quantity in quantities.items() if product_id not in sharded}
 
         # Create order
         order = Order(
+            _id=str(ObjectId()),
             user_id=user_id,
-            items=order_items,
+            items=[
+                OrderItem(
+                    product_id=str(item["product_id"]),
+                    quantity=item["quantity"],
+                    price=item["price"],
+                    name=item["name"],
+                    image_url=item.get("image_url")
+                )
+                for item in cart_items
+            ],
             total_amount=total_amount,
             shipping_address=shipping_address,
-            billing_address=billing_address,
-            payment_method=payment_method,
-            status="pending",
-            payment_status="pending"
+            status="pending"
         )
+        order_doc = {
+            **order.model_dump(exclude={"id"}),
+            "_id": ObjectId(order.id),
+            "billing_address": billing_address,
+            "payment_method": payment_method,
+            "payment_status": "pending"
+        }
 
-        # Start transaction
-        async with await self.db.client.start_session() as session:
-            async with session.start_transaction():
-                # Insert order
-                result = await self.collection.insert_one(order.dict(exclude={"id"}), session=session)
-                
-                # Update product stock
-                for item in cart_items:
-                    await self.products_collection.update_one(
-                        {"_id": ObjectId(item["product_id"])},
-                        {"$inc": {"stock": -item["quantity"]}},
-                        session=session
-                    )
-                
-                # Clear cart
-                await self.cart_collection.delete_many({"user_id": ObjectId(user_id)}, session=session)
+        # Sharded products are taken from their shards first, outside the transaction
+        taken = await self._take_sharded(sharded)
+        if taken is None:
+            return None
 
+        # Start transaction; whatever stops it from committing hands the shard units back
+        committed = False
+        try:
+            async with await self.db.client.start_session() as session:
+                async with session.start_transaction():
+                    # Insert order
+                    result = await self.collection.insert_one(order_doc, session=session)
+
+                    # Decrement stock only where enough is still left; a concurrent checkout may have won
+                    if unsharded:
+                        stock_result = await self.products_collection.bulk_write([
+                            UpdateOne(
+                                {"_id": ObjectId(product_id), "stock": {"$gte": quantity}},
+                                {"$inc": {"stock": -quantity}}
+                            )
+                            for product_id, quantity in unsharded.items()
+                        ], ordered=False, session=session)
+                        if stock_result.modified_count < len(unsharded):
+                            await session.abort_transaction()
+                            return None
+
+                    # Clear cart
+                    await self.cart_collection.delete_many({"user_id": ObjectId(user_id)}, session=session)
+                committed = True
+        finally:
+            if not committed:
+                await self._restock(taken)
+
+        await self._raise_alerts(unsharded, taken)
         created_order = await self.collection.find_one({"_id": result.inserted_id})
-        return Order(**created_order) if created_order else None
+        return Order(**{**created_order, "_id": str(created_order["_id"])}) if created_order else None
+
+    async def _raise_alerts(self, unsharded: Dict[str, int], sharded: Dict[str, int]):
+        """Raise low-stock alerts for products an order just took stock from
+
+        Checkouts only lower stock, so only products that are low now can
+        need a change; reading after the commit keeps concurrent checkouts
+        from hiding a crossing from each other.
+        """
+        if unsharded:
+            products = await self.products_collection.find(
+                {"_id": {"$in": [ObjectId(product_id) for product_id in unsharded]}},
+                {"stock": 1, "reorder_point": 1}
+            ).to_list(length=None)
+            await self.stock_alerts.apply([product for product in products if self.stock_alerts.is_low(product)])
+        for product_id in sharded:
+            await self._apply_sharded_alert(product_id)
+
+    async def _apply_sharded_alert(self, product_id: str):
+        totals = await self.stock_shards.available(product_id)
+        product = await self.products_collection.find_one({"_id": ObjectId(product_id)}, {"reorder_point": 1}) or {}
+        await self.stock_alerts.apply([
+            {"_id": ObjectId(product_id), "stock": totals["stock"], "reorder_point": product.get("reorder_point")}
+        ])
+
+    async def _sharded_counts(self, quantities: Dict[str, int]) -> Dict[str, int]:
+        """Shard counts of the given products that keep their stock in shards"""
+        products = await self.products_collection.find(
+            {"_id": {"$in": [ObjectId(product_id) for product_id in quantities]}, "stock_shard_count": {"$exists": True}},
+            {"stock_shard_count": 1}
+        ).to_list(length=None)
+        for product in products:
+            self.stock_shards.remember(product["_id"], product["stock_shard_count"])
+        return {str(product["_id"]): product["stock_shard_count"] for product in products}
+
+    async def _take_sharded(self, quantities: Dict[str, int]) -> Optional[Dict[str, int]]:
+        """Take stock from sharded products, all or nothing; None when any is short"""
+        taken: Dict[str, int] = {}
+        for product_id, quantity in quantities.items():
+            try:
+                await self.stock_shards.move(product_id, quantity, "stock", None, "Insufficient stock")
+            except ValueError:
+                await self._restock(taken)
+                return None
+            taken[product_id] = quantity
+        return taken
+
+    async def _restock(self, quantities: Dict[str, int]):
+        """Give sharded stock back to a random shard of each product"""
+        for product_id, quantity in quantities.items():
+            await self.stock_shards.add(product_id, quantity)
 
     async def get_order(self, order_id: str) -> Optional[Order]:
         if not ObjectId.is_valid(order_id):
@@ -138,14 +240,23 @@ class OrderService:
                     session=session
                 )
 
-                # Restore product stock
+                # Restore product stock; sharded products get theirs back through the shards
+                quantities: Dict[str, int] = {}
                 for item in order["items"]:
-                    await self.products_collection.update_one(
-                        {"_id": ObjectId(item["product_id"])},
-                        {"$inc": {"stock": item["quantity"]}},
-                        session=session
-                    )
+                    product_id = str(item["product_id"])
+                    quantities[product_id] = quantities.get(product_id, 0) + item["quantity"]
+                sharded = await self._sharded_counts(quantities)
+                unsharded = [
+                    UpdateOne({"_id": ObjectId(product_id)}, {"$inc": {"stock": quantity}})
+                    for product_id, quantity in quantities.items() if product_id not in sharded
+                ]
+                if unsharded:
+                    await self.products_collection.bulk_write(unsharded, ordered=False, session=session)
 
+        await self._restock({product_id: quantities[product_id] for product_id in sharded})
+        await self.stock_alerts.refresh([product_id for product_id in quantities if product_id not in sharded])
+        for product_id in sharded:
+            await self._apply_sharded_alert(product_id)
         updated_order = await self.collection.find_one({"_id": ObjectId(order_id)})
         return Order(**updated_order) if updated_order else None
 
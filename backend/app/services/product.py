@@ -1,9 +1,88 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
-from app.models import Product, Supplier, ProductCreate, ProductUpdate
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from app.models import Product, ProductPage, ProductSummary, Supplier, ProductCreate, ProductUpdate, SupplierUpdate
+from app.services.supplier_registry import supplier_registry
+from app.services.product_cache import product_cache
+from app.services.stock_alerts import StockAlerts
 import httpx
+import re
 from datetime import datetime
+from app.core.config import settings
+
+# Full names of collections whose indexes this process has already built
+_import_indexes_ready: Set[str] = set()
+_list_indexes_ready: Set[str] = set()
+
+# Projection for list views; leaves out descriptions, supplier_data and import_data
+PRODUCT_SUMMARY_PROJECTION = {field: 1 for field in ProductSummary.model_fields if field != "id"}
+
+IMPORT_REQUIRED_FIELDS = ["name", "description", "price", "supplier_id"]
+IMPORT_OPTIONAL_FIELDS = ["image_url", "stock", "supplier_price", "min_order_quantity",
+                          "shipping_weight", "shipping_dimensions"]
+# CSV feeds deliver every value as a string
+IMPORT_NUMERIC_FIELDS = {"stock": int, "min_order_quantity": int, "supplier_price": float, "shipping_weight": float}
+
+def coerce_import_value(field: str, value: Any) -> Any:
+    """Convert a numeric import field to its stored type, raising ValueError if it is not one"""
+    kind = IMPORT_NUMERIC_FIELDS[field]
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {field}: {value!r}")
+    if kind is int:
+        if not number.is_integer():
+            raise ValueError(f"Invalid {field}: {value!r}")
+        return int(number)
+    return number
+
+def validate_import_row(source: str, data: Dict[str, Any]) -> bool:
+    return all(field in data for field in IMPORT_REQUIRED_FIELDS)
+
+def transform_import_row(source: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    # Transform data based on source
+    transformed = {
+        "name": data["name"],
+        "description": data["description"],
+        "price": float(data["price"]),
+        "supplier_id": ObjectId(data["supplier_id"]),
+        "import_source": source,
+        "import_data": data
+    }
+
+    # Add optional fields if present; an empty CSV cell counts as absent
+    for field in IMPORT_OPTIONAL_FIELDS:
+        if field in data and data[field] != "":
+            value = data[field]
+            transformed[field] = coerce_import_value(field, value) if field in IMPORT_NUMERIC_FIELDS else value
+
+    return transformed
+
+def prepare_import_rows(source: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Validate and transform a chunk of import rows
+
+    Pure CPU work with picklable inputs and outputs, so it can run in a
+    process pool. Each entry holds either ``product`` and ``external_id`` or
+    an ``error``.
+    """
+    prepared = []
+    for data in rows:
+        if not validate_import_row(source, data):
+            prepared.append({"error": "Invalid import data"})
+            continue
+        try:
+            product_data = transform_import_row(source, data)
+        except Exception as e:
+            prepared.append({"error": str(e)})
+            continue
+        external_id = data.get("id")
+        if external_id is None:
+            # Keep id-less rows out of the unique (import_source, import_data.id) index
+            product_data["import_data"] = {k: v for k, v in data.items() if k != "id"}
+        prepared.append({"product": product_data, "external_id": external_id})
+    return prepared
 
 class ProductService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -16,29 +95,87 @@ class ProductService:
         skip: int = 0,
         limit: int = 100,
         category: Optional[str] = None,
-        supplier_id: Optional[str] = None
+        supplier_id: Optional[str] = None,
+        search: Optional[str] = None
     ) -> List[Product]:
         """Get all products with optional filtering"""
-        query = {}
-        if category:
-            query["category"] = category
-        if supplier_id:
-            query["supplier_id"] = supplier_id
-        
+        query = self._list_query(category, supplier_id, search)
         cursor = self.collection.find(query).skip(skip).limit(limit)
         products = await cursor.to_list(length=limit)
         return [Product(**{**product, "_id": str(product["_id"])}) for product in products]
 
+    async def list_products(
+        self,
+        limit: int = 50,
+        after: Optional[str] = None,
+        category: Optional[str] = None,
+        supplier_id: Optional[str] = None,
+        search: Optional[str] = None
+    ) -> ProductPage:
+        """Get one page of product summaries in ``_id`` order
+
+        Pass the previous page's ``next_cursor`` as ``after``; each page is an
+        index range scan on ``(category, _id)`` or ``(supplier_id, _id)`` no
+        matter how deep it is. Raises ValueError for a malformed cursor.
+        """
+        await self.ensure_list_indexes()
+        query = self._list_query(category, supplier_id, search)
+        if after is not None:
+            if not ObjectId.is_valid(after):
+                raise ValueError("Invalid product cursor")
+            query["_id"] = {"$gt": ObjectId(after)}
+
+        products = await self.collection.find(query, PRODUCT_SUMMARY_PROJECTION).sort(
+            "_id", 1
+        ).limit(limit).to_list(length=limit)
+        items = [
+            ProductSummary(**{
+                **product,
+                "_id": str(product["_id"]),
+                "supplier_id": str(product["supplier_id"]) if product.get("supplier_id") is not None else None
+            })
+            for product in products
+        ]
+        next_cursor = items[-1].id if len(items) == limit else None
+        return ProductPage(items=items, next_cursor=next_cursor)
+
+    def _list_query(self, category: Optional[str], supplier_id: Optional[str],
+                    search: Optional[str]) -> Dict[str, Any]:
+        query: Dict[str, Any] = {}
+        if category:
+            query["category"] = category
+        if supplier_id:
+            # Imported products store the supplier as an ObjectId, others as a string
+            query["supplier_id"] = (
+                {"$in": [supplier_id, ObjectId(supplier_id)]} if ObjectId.is_valid(supplier_id) else supplier_id
+            )
+        if search:
+            query["name"] = {"$regex": re.escape(search), "$options": "i"}
+        return query
+
+    async def ensure_list_indexes(self):
+        """Indexes that keep filtered list pages constant-time at any depth"""
+        if self.collection.full_name in _list_indexes_ready:
+            return
+        await self.collection.create_index([("category", 1), ("_id", 1)])
+        await self.collection.create_index([("supplier_id", 1), ("_id", 1)])
+        _list_indexes_ready.add(self.collection.full_name)
+
     async def get_product(self, product_id: str) -> Optional[Product]:
-        """Get a product by ID"""
-        try:
-            product = await self.collection.find_one({"_id": ObjectId(product_id)})
-            if product:
-                return Product(**{**product, "_id": str(product["_id"])})
+        """Get a product by ID, served from the product cache when warm"""
+        if not ObjectId.is_valid(product_id):
             return None
+        try:
+            return await product_cache.get(product_id, lambda: self._load_product(product_id))
         except:
             return None
 
+    async def _load_product(self, product_id: str) -> Optional[Product]:
+        product = await self.collection.find_one({"_id": ObjectId(product_id)})
+        if product:
+            return Product(**{**product, "_id": str(product["_id"])})
+        return None
+
     async def create_product(self, product: ProductCreate) -> Product:
         """Create a new product"""
         product_dict = product.model_dump()
@@ -59,6 +196,7 @@ class ProductService:
             {"_id": ObjectId(product_id)},
             {"$set": update_data}
         )
+        await product_cache.invalidate([product_id])
         updated_product = await self.collection.find_one({"_id": ObjectId(product_id)})
         if updated_product:
             return Product(**{**updated_product, "_id": str(updated_product["_id"])})
@@ -67,15 +205,34 @@ class ProductService:
     async def delete_product(self, product_id: str) -> bool:
         """Delete a product"""
         result = await self.collection.delete_one({"_id": ObjectId(product_id)})
+        await product_cache.invalidate([product_id])
+        await StockAlerts(self.db).refresh([product_id])
         return result.deleted_count > 0
 
     # Supplier Management
     async def create_supplier(self, supplier: Supplier) -> Supplier:
         supplier_dict = supplier.dict(exclude={"id"})
         result = await self.supplier_collection.insert_one(supplier_dict)
+        await supplier_registry.invalidate(result.inserted_id)
         created_supplier = await self.supplier_collection.find_one({"_id": result.inserted_id})
         return Supplier(**created_supplier)
 
+    async def update_supplier(self, supplier_id: str, supplier: SupplierUpdate) -> Optional[Supplier]:
+        if not ObjectId.is_valid(supplier_id):
+            return None
+        update_data = supplier.model_dump(exclude_unset=True)
+        if not update_data:
+            return None
+
+        update_data["updated_at"] = datetime.utcnow()
+        await self.supplier_collection.update_one(
+            {"_id": ObjectId(supplier_id)},
+            {"$set": update_data}
+        )
+        await supplier_registry.invalidate(supplier_id)
+        updated_supplier = await self.supplier_collection.find_one({"_id": ObjectId(supplier_id)})
+        return Supplier(**updated_supplier) if updated_supplier else None
+
     async def get_supplier(self, supplier_id: str) -> Optional[Supplier]:
         if not ObjectId.is_valid(supplier_id):
             return None
@@ -99,47 +256,167 @@ class ProductService:
                 {"_id": existing_product["_id"]},
                 {"$set": product_data}
             )
+            await product_cache.invalidate([existing_product["_id"]])
             updated_product = await self.collection.find_one({"_id": existing_product["_id"]})
-            return Product(**updated_product)
+            return self._imported_product(updated_product)
         else:
             product_data["created_at"] = datetime.utcnow()
             product_data["updated_at"] = datetime.utcnow()
             result = await self.collection.insert_one(product_data)
             created_product = await self.collection.find_one({"_id": result.inserted_id})
-            return Product(**created_product)
+            return self._imported_product(created_product)
+
+    @staticmethod
+    def _imported_product(product: Dict[str, Any]) -> Product:
+        # Imports store supplier_id as an ObjectId
+        return Product(**{**product, "_id": str(product["_id"]), "supplier_id": str(product["supplier_id"])})
 
     def _validate_import_data(self, source: str, data: Dict[str, Any]) -> bool:
-        required_fields = ["name", "description", "price", "supplier_id"]
-        return all(field in data for field in required_fields)
+        return validate_import_row(source, data)
 
     def _transform_import_data(self, source: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        # Transform data based on source
-        transformed = {
-            "name": data["name"],
-            "description": data["description"],
-            "price": float(data["price"]),
-            "supplier_id": ObjectId(data["supplier_id"]),
-            "import_source": source,
-            "import_data": data
-        }
+        return transform_import_row(source, data)
+
+    # Bulk Import
+    async def ensure_import_indexes(self):
+        """Unique key used to match re-imported rows to existing products
 
-        # Add optional fields if present
-        optional_fields = ["image_url", "stock", "supplier_price", "min_order_quantity", 
-                         "shipping_weight", "shipping_dimensions"]
-        for field in optional_fields:
-            if field in data:
-                transformed[field] = data[field]
+        Collections imported before the key existed may hold several products
+        per key; those are detached first (see ``detach_duplicate_imports``).
+        """
+        if self.collection.full_name in _import_indexes_ready:
+            return
+        keys = [("import_source", 1), ("import_data.id", 1)]
+        options = {"unique": True, "partialFilterExpression": {"import_data.id": {"$exists": True}}}
+        try:
+            await self.collection.create_index(keys, **options)
+        except OperationFailure as e:
+            if e.code != 11000:
+                raise
+            await self.detach_duplicate_imports()
+            await self.collection.create_index(keys, **options)
+        _import_indexes_ready.add(self.collection.full_name)
 
-        return transformed
+    async def detach_duplicate_imports(self) -> int:
+        """Keep the most recently updated product per import key and detach the rest
 
-    # Bulk Import
-    async def bulk_import_products(self, source: str, products_data: List[Dict[str, Any]]) -> List[Product]:
-        imported_products = []
-        for product_data in products_data:
-            try:
-                product = await self.import_product(source, product_data)
-                imported_products.append(product)
-            except Exception as e:
-                print(f"Error importing product: {str(e)}")
+        Detached products keep their documents, so orders that point at them
+        stay valid; their ``import_data.id`` moves to ``import_data.duplicate_of_id``
+        and later imports no longer match them. Returns how many were detached.
+        """
+        duplicates = await self.collection.aggregate([
+            {"$match": {"import_data.id": {"$exists": True}}},
+            {"$sort": {"updated_at": -1, "_id": -1}},
+            {"$group": {
+                "_id": {"source": "$import_source", "id": "$import_data.id"},
+                "ids": {"$push": "$_id"},
+                "count": {"$sum": 1}
+            }},
+            {"$match": {"count": {"$gt": 1}}}
+        ], allowDiskUse=True).to_list(None)
+        detached = [product_id for group in duplicates for product_id in group["ids"][1:]]
+        for start in range(0, len(detached), settings.IMPORT_BULK_WRITE_BATCH_SIZE):
+            await self.collection.update_many(
+                {"_id": {"$in": detached[start:start + settings.IMPORT_BULK_WRITE_BATCH_SIZE]}},
+                {"$rename": {"import_data.id": "import_data.duplicate_of_id"}}
+            )
+        if detached:
+            await product_cache.invalidate(detached)
+        return len(detached)
+
+    async def bulk_import_products(self, source: str, products_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Validate, transform and upsert many rows with batched bulk writes
+
+        Rows are keyed on ``(import_source, import_data.id)``; rows without an
+        ``id`` are inserted. Returns counters plus one outcome per input row:
+        ``inserted``, ``updated``, ``superseded`` (a later row in the same
+        payload had the same id), ``invalid`` or ``error``.
+        """
+        return await self.write_prepared_rows(prepare_import_rows(source, products_data))
+
+    async def write_prepared_rows(self, prepared: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Upsert rows produced by ``prepare_import_rows`` and report per-row outcomes"""
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(prepared)
+        operations = []
+        op_rows: List[int] = []
+        positions: Dict[Any, int] = {}
+        new_ids: Dict[int, ObjectId] = {}
+        now = datetime.utcnow()
+
+        for index, row in enumerate(prepared):
+            if "error" in row:
+                outcomes[index] = {"index": index, "status": "invalid", "error": row["error"]}
+                continue
+
+            product_data = row["product"]
+            product_data["updated_at"] = now
+            external_id = row["external_id"]
+            if external_id is None:
+                product_data["created_at"] = now
+                product_data["_id"] = new_ids[index] = ObjectId()
+                operations.append(InsertOne(product_data))
+                op_rows.append(index)
                 continue
-        return imported_products 
\ No newline at end of file
+
+            operation = UpdateOne(
+                {"import_source": product_data["import_source"], "import_data.id": external_id},
+                {"$set": product_data, "$setOnInsert": {"created_at": now}},
+                upsert=True
+            )
+            if external_id in positions:
+                position = positions[external_id]
+                outcomes[op_rows[position]] = {"index": op_rows[position], "status": "superseded"}
+                operations[position] = operation
+                op_rows[position] = index
+            else:
+                positions[external_id] = len(operations)
+                operations.append(operation)
+                op_rows.append(index)
+
+        if operations:
+            await self.ensure_import_indexes()
+        batch_size = settings.IMPORT_BULK_WRITE_BATCH_SIZE
+        for start in range(0, len(operations), batch_size):
+            chunk = operations[start:start + batch_size]
+            await self._write_import_chunk(chunk, op_rows[start:start + batch_size], new_ids, outcomes)
+
+        # Updated products may be cached; inserted ones are new IDs and cannot be
+        updated_keys = {
+            (prepared[outcome["index"]]["product"]["import_source"], prepared[outcome["index"]]["external_id"])
+            for outcome in outcomes if outcome["status"] == "updated"
+        }
+        await self._invalidate_imported(updated_keys)
+
+        summary = {"inserted": 0, "updated": 0, "superseded": 0, "invalid": 0, "error": 0}
+        for outcome in outcomes:
+            summary[outcome["status"]] += 1
+        return {**summary, "total": len(prepared), "results": outcomes}
+
+    async def _invalidate_imported(self, keys):
+        by_source: Dict[str, List[Any]] = {}
+        for source, external_id in keys:
+            by_source.setdefault(source, []).append(external_id)
+        for source, external_ids in by_source.items():
+            products = await self.collection.find(
+                {"import_source": source, "import_data.id": {"$in": external_ids}}, {"_id": 1}
+            ).to_list(None)
+            await product_cache.invalidate([product["_id"] for product in products])
+
+    async def _write_import_chunk(self, chunk: List, rows: List[int], new_ids: Dict[int, ObjectId], outcomes: List):
+        try:
+            result = await self.collection.bulk_write(chunk, ordered=False)
+            upserted = result.upserted_ids
+            errors = {}
+        except BulkWriteError as e:
+            upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+            errors = {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+
+        for position, index in enumerate(rows):
+            if position in errors:
+                outcomes[index] = {"index": index, "status": "error", "error": errors[position]}
+            elif index in new_ids:
+                outcomes[index] = {"index": index, "status": "inserted", "id": str(new_ids[index])}
+            elif position in upserted:
+                outcomes[index] = {"index": index, "status": "inserted", "id": str(upserted[position])}
+            else:
+                outcomes[index] = {"index": index, "status": "updated"}
@@ -0,0 +1,172 @@
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import time
+from app.models import Product
+from app.core.config import settings
+from app.monitoring import PRODUCT_CACHE_LOOKUPS, PRODUCT_CACHE_SIZE, logger
+
+ProductLoader = Callable[[], Awaitable[Optional[Product]]]
+
+# Stored in Redis for products known not to exist
+_MISSING = b"null"
+
+# Document fields that end up in a cached Product; writes touching none of them need no invalidation
+CACHED_PRODUCT_FIELDS = frozenset(Product.model_fields) | {"_id"}
+
+class ProductCache:
+    """Read-through cache for single products keyed by product ID.
+
+    The first tier is an in-process LRU bounded by ``max_entries`` whose
+    entries expire after ``ttl_seconds``; IDs that do not exist are cached for
+    the shorter ``negative_ttl_seconds``. When a Redis client is configured it
+    is consulted on a local miss and filled on load, so processes share warm
+    entries. Concurrent misses for one ID share a single load. Writers must
+    call ``invalidate``; other processes' local tiers catch up within the TTL.
+    Cached products are shared between callers and must not be mutated.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        negative_ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        redis=None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.PRODUCT_CACHE_TTL_SECONDS
+        self.negative_ttl_seconds = (
+            negative_ttl_seconds if negative_ttl_seconds is not None
+            else settings.PRODUCT_CACHE_NEGATIVE_TTL_SECONDS
+        )
+        self.max_entries = max_entries or settings.PRODUCT_CACHE_MAX_ENTRIES
+        self.redis_ttl_seconds = settings.PRODUCT_CACHE_REDIS_TTL_SECONDS
+        self.redis = redis
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[Optional[Product], float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bumped on every invalidation so loads that started before it are not cached
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    async def get(self, product_id: str, load: ProductLoader) -> Optional[Product]:
+        """Get a product, calling ``load`` only when neither tier has it"""
+        key = str(product_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            product, expires_at = entry
+            if expires_at > self.clock():
+                self._entries.move_to_end(key)
+                self._record("memory", "hit" if product is not None else "negative_hit")
+                return product
+            del self._entries[key]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, load, self._generation))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._load_done(key, f))
+        # Shield the shared load so one caller going away does not cancel it for the others
+        return await asyncio.shield(future)
+
+    async def invalidate(self, product_ids: Optional[Iterable] = None):
+        """Drop cached products from both tiers, or the whole local tier when no IDs are given"""
+        self._generation += 1
+        if product_ids is None:
+            self._entries.clear()
+            self._inflight.clear()
+            PRODUCT_CACHE_SIZE.set(0)
+            return
+        keys = [str(product_id) for product_id in product_ids]
+        for key in keys:
+            self._entries.pop(key, None)
+            # Later readers must not join a load that may have read the old document
+            self._inflight.pop(key, None)
+        PRODUCT_CACHE_SIZE.set(len(self._entries))
+        if self.redis is not None and keys:
+            try:
+                await self.redis.delete(*[self._redis_key(key) for key in keys])
+            except Exception as e:
+                logger.warning("product_cache_invalidate_failed", error=str(e))
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for this process since startup"""
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else 0.0,
+            "entries": len(self._entries)
+        }
+
+    async def _load(self, key: str, load: ProductLoader, generation: int) -> Optional[Product]:
+        found, product = await self._redis_get(key)
+        if found:
+            self._record("redis", "hit" if product is not None else "negative_hit")
+        else:
+            self._record("redis" if self.redis is not None else "memory", "miss")
+            product = await load()
+            if generation == self._generation:
+                await self._redis_set(key, product)
+        if generation == self._generation:
+            self._store(key, product)
+        return product
+
+    def _load_done(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def _store(self, key: str, product: Optional[Product]):
+        ttl = self.ttl_seconds if product is not None else self.negative_ttl_seconds
+        self._entries[key] = (product, self.clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        PRODUCT_CACHE_SIZE.set(len(self._entries))
+
+    def _record(self, tier: str, result: str):
+        if result == "miss":
+            self._misses += 1
+        else:
+            self._hits += 1
+        PRODUCT_CACHE_LOOKUPS.labels(tier=tier, result=result).inc()
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"product:{key}"
+
+    async def _redis_get(self, key: str) -> Tuple[bool, Optional[Product]]:
+        if self.redis is None:
+            return False, None
+        try:
+            raw = await self.redis.get(self._redis_key(key))
+        except Exception as e:
+            # Redis is an optimisation; fall through to the database when it is unavailable
+            logger.warning("product_cache_redis_failed", error=str(e))
+            return False, None
+        if raw is None:
+            return False, None
+        if raw == _MISSING:
+            return True, None
+        return True, Product.model_validate_json(raw)
+
+    async def _redis_set(self, key: str, product: Optional[Product]):
+        if self.redis is None:
+            return
+        if product is None:
+            value, ttl = _MISSING, self.negative_ttl_seconds
+        else:
+            value, ttl = product.model_dump_json(by_alias=True), self.redis_ttl_seconds
+        try:
+            await self.redis.set(self._redis_key(key), value, ex=max(int(ttl), 1))
+        except Exception as e:
+            logger.warning("product_cache_redis_failed", error=str(e))
+
+def _create_redis_client():
+    if not settings.PRODUCT_CACHE_REDIS_ENABLED:
+        return None
+    import redis.asyncio as redis
+    return redis.Redis(host=settings.REDIS_HOST, port=int(settings.REDIS_PORT))
+
+product_cache = ProductCache(redis=_create_redis_client())
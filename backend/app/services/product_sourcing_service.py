@@ -1,25 +1,70 @@
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from datetime import datetime
+import base64
 import aiohttp
 import asyncio
+from bson import ObjectId, json_util
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from app.models import Product, Supplier
 from app.db import get_database
 from app.config import settings
+from app.services.quote_cache import quote_cache
+
+_shared_session: Optional[aiohttp.ClientSession] = None
+
+def _get_shared_session() -> aiohttp.ClientSession:
+    """Session reused across requests so background quote refreshes outlive the request"""
+    global _shared_session
+    if _shared_session is None or _shared_session.closed:
+        _shared_session = aiohttp.ClientSession()
+    return _shared_session
+
+async def close_shared_session():
+    global _shared_session
+    if _shared_session is not None:
+        await _shared_session.close()
+        _shared_session = None
+
+SEARCH_SORT_FIELDS = ("created_at", "price", "name")
+SEARCH_PAGINATION_KEYS = ("sort_by", "sort_order", "page", "per_page", "after", "total")
+
+_indexes_ready = False
+
+def encode_search_cursor(sort_value: Any, product_id: Any) -> str:
+    """Encode the last row of a page as an opaque ``after`` token"""
+    raw = json_util.dumps({"v": sort_value, "id": product_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_search_cursor(token: str) -> Dict:
+    cursor = json_util.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    if not isinstance(cursor, dict) or "v" not in cursor or "id" not in cursor:
+        raise ValueError("Invalid search cursor")
+    return cursor
 
 class ProductSourcingService:
-    def __init__(self):
-        self.db = get_database()
+    def __init__(self, db=None):
+        self.db = None
+        self.session = None
+        if db is not None:
+            self._use_database(db)
+
+    def _use_database(self, db):
+        self.db = db
         self.product_collection = self.db["products"]
         self.supplier_collection = self.db["suppliers"]
-        self.session = None
+        self.import_jobs_collection = self.db["import_jobs"]
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        if self.db is None:
+            self._use_database(await get_database())
+        self.session = _get_shared_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        # The shared session stays open for background quote refreshes;
+        # close_shared_session() closes it on shutdown
+        pass
 
     async def search_suppliers(self, query: str, filters: Optional[Dict] = None) -> List[Dict]:
         """Search for suppliers based on query and filters"""
@@ -30,8 +75,14 @@ class ProductSourcingService:
         suppliers = await self.supplier_collection.find(search_filters).to_list(length=100)
         return suppliers
 
-    async def compare_prices(self, product_id: str) -> List[Dict]:
-        """Compare prices across different suppliers for a product"""
+    async def compare_prices(self, product_id: str, deadline: Optional[float] = None) -> List[Dict]:
+        """Compare prices across different suppliers for a product
+
+        Suppliers are queried concurrently. Quotes that arrive within
+        ``deadline`` seconds are returned cheapest first, followed by an entry
+        for every supplier that timed out or failed. Recent quotes are served
+        from the quote cache.
+        """
         product = await self.product_collection.find_one({"_id": product_id})
         if not product:
             return []
@@ -39,84 +90,302 @@ class ProductSourcingService:
         suppliers = await self.supplier_collection.find({
             "product_categories": {"$in": product["categories"]}
         }).to_list(length=100)
+        if not suppliers or not self.session:
+            return []
+
+        deadline = deadline if deadline is not None else settings.PRICE_COMPARISON_DEADLINE_SECONDS
+        tasks = {
+            asyncio.create_task(self._get_quote(supplier, product_id)): supplier
+            for supplier in suppliers
+        }
+        done, pending = await asyncio.wait(tasks.keys(), timeout=deadline)
+        for task in pending:
+            task.cancel()
 
         price_comparisons = []
-        for supplier in suppliers:
-            if self.session:
-                async with self.session.get(
-                    f"{supplier['api_url']}/products/{product_id}/price",
-                    headers={"Authorization": f"Bearer {supplier['api_key']}"}
-                ) as response:
-                    if response.status == 200:
-                        price_data = await response.json()
-                        price_comparisons.append({
-                            "supplier_id": supplier["_id"],
-                            "supplier_name": supplier["name"],
-                            "price": price_data["price"],
-                            "shipping_cost": price_data.get("shipping_cost", 0),
-                            "stock_quantity": price_data.get("stock_quantity", 0),
-                            "estimated_delivery": price_data.get("estimated_delivery", None)
-                        })
-
-        return sorted(price_comparisons, key=lambda x: x["price"] + x["shipping_cost"])
-
-    async def bulk_import_products(self, supplier_id: str, category: str, limit: int = 100) -> Dict:
-        """Bulk import products from a supplier"""
+        unavailable = []
+        for task, supplier in tasks.items():
+            if task in pending:
+                unavailable.append(self._unavailable_quote(supplier, "timeout"))
+            elif task.exception() is not None or task.result() is None:
+                unavailable.append(self._unavailable_quote(supplier, "error"))
+            else:
+                price_comparisons.append(task.result())
+
+        price_comparisons.sort(key=lambda x: x["price"] + x["shipping_cost"])
+        return price_comparisons + unavailable
+
+    async def _get_quote(self, supplier: Dict, product_id: str) -> Optional[Dict]:
+        """Get a supplier quote from the cache, fetching it on a miss"""
+        return await quote_cache.get(
+            (str(supplier["_id"]), product_id),
+            lambda: self._fetch_quote_hedged(supplier, product_id)
+        )
+
+    async def _fetch_quote(self, supplier: Dict, product_id: str) -> Optional[Dict]:
+        """Fetch a single price quote from a supplier"""
+        async with self.session.get(
+            f"{supplier['api_url']}/products/{product_id}/price",
+            headers={"Authorization": f"Bearer {supplier['api_key']}"}
+        ) as response:
+            if response.status != 200:
+                return None
+            price_data = await response.json()
+            return {
+                "supplier_id": supplier["_id"],
+                "supplier_name": supplier["name"],
+                "status": "ok",
+                "price": price_data["price"],
+                "shipping_cost": price_data.get("shipping_cost", 0),
+                "stock_quantity": price_data.get("stock_quantity", 0),
+                "estimated_delivery": price_data.get("estimated_delivery", None)
+            }
+
+    async def _fetch_quote_hedged(self, supplier: Dict, product_id: str) -> Optional[Dict]:
+        """Fetch a quote, sending a second request if the first is slow
+
+        Whichever attempt answers first wins and the other is cancelled.
+        """
+        attempts = {asyncio.create_task(self._fetch_quote(supplier, product_id))}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=settings.PRICE_COMPARISON_HEDGE_AFTER_SECONDS)
+            if not done:
+                attempts.add(asyncio.create_task(self._fetch_quote(supplier, product_id)))
+
+            last_error = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                    elif task.result() is not None:
+                        return task.result()
+            if last_error is not None:
+                raise last_error
+            return None
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def _unavailable_quote(self, supplier: Dict, status: str) -> Dict:
+        return {
+            "supplier_id": supplier["_id"],
+            "supplier_name": supplier["name"],
+            "status": status,
+            "price": None,
+            "shipping_cost": None,
+            "stock_quantity": None,
+            "estimated_delivery": None
+        }
+
+    async def bulk_import_products(
+        self,
+        supplier_id: str,
+        category: str,
+        limit: Optional[int] = None,
+        page_size: Optional[int] = None,
+        job_id: Optional[str] = None
+    ) -> Dict:
+        """Bulk import products from a supplier
+
+        Pages through the supplier catalog until it is exhausted (or ``limit``
+        products have been read), writing each page as it arrives. The next
+        page is fetched while the current one is written, so at most two pages
+        are held in memory. Progress is recorded in an ``import_jobs`` document
+        and only counters are returned. Passing the ``job_id`` of an import
+        that failed or was interrupted resumes it after its last written page.
+        """
         supplier = await self.supplier_collection.find_one({"_id": supplier_id})
         if not supplier:
             return {"error": "Supplier not found"}
+        if not self.session:
+            return {"error": "Failed to import products"}
+
+        if job_id:
+            job = None
+            if ObjectId.is_valid(job_id):
+                job = await self.import_jobs_collection.find_one({
+                    "_id": ObjectId(job_id), "supplier_id": supplier_id, "category": category
+                })
+            if not job:
+                return {"error": "Import job not found"}
+            if job["status"] == "completed":
+                return {"error": "Import job already completed"}
+            page_size = job["page_size"]
+            limit = job.get("limit")
+            job["status"] = "running"
+            await self.import_jobs_collection.update_one(
+                {"_id": job["_id"]},
+                {
+                    "$set": {"status": "running", "updated_at": datetime.utcnow()},
+                    "$unset": {"error": "", "finished_at": ""}
+                }
+            )
+        else:
+            page_size = page_size or settings.BULK_IMPORT_PAGE_SIZE
+            if limit:
+                page_size = min(page_size, limit)
+
+            job = {
+                "type": "supplier_import",
+                "supplier_id": supplier_id,
+                "category": category,
+                "status": "running",
+                "page_size": page_size,
+                "limit": limit,
+                "pages": 0,
+                "read_count": 0,
+                "imported_count": 0,
+                "failed_count": 0,
+                "started_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }
+            result = await self.import_jobs_collection.insert_one(job)
+            job["_id"] = result.inserted_id
+        job_id = job["_id"]
+
+        page = job["pages"] + 1
+        read = job.get("read_count", 0)
+        next_page = asyncio.create_task(self._fetch_supplier_page(supplier, category, page, page_size))
+        try:
+            while True:
+                products = await next_page
+                next_page = None
+                if not products:
+                    break
+                if limit:
+                    products = products[:limit - read]
+                read += len(products)
+
+                more = len(products) == page_size and (not limit or read < limit)
+                if more:
+                    page += 1
+                    next_page = asyncio.create_task(
+                        self._fetch_supplier_page(supplier, category, page, page_size)
+                    )
+
+                documents = []
+                failed = 0
+                for product in products:
+                    try:
+                        documents.append(self._transform_supplier_product(product, supplier_id, category))
+                    except (KeyError, TypeError, ValueError):
+                        failed += 1
+                imported, write_failed = await self._insert_chunk(documents)
+                job["pages"] += 1
+                job["imported_count"] += imported
+                job["failed_count"] += failed + write_failed
+                await self.import_jobs_collection.update_one(
+                    {"_id": job_id},
+                    {
+                        "$inc": {
+                            "pages": 1, "read_count": len(products),
+                            "imported_count": imported, "failed_count": failed + write_failed
+                        },
+                        "$set": {"updated_at": datetime.utcnow()}
+                    }
+                )
+
+                if not more:
+                    break
+            job["status"] = "completed"
+        except Exception as e:
+            job["status"] = "failed"
+            await self.import_jobs_collection.update_one(
+                {"_id": job_id}, {"$set": {"error": str(e)}}
+            )
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+            await self.import_jobs_collection.update_one(
+                {"_id": job_id},
+                {"$set": {"status": job["status"], "finished_at": datetime.utcnow()}}
+            )
+
+        if job["status"] == "failed" and not job["imported_count"]:
+            return {"error": "Failed to import products", "job_id": str(job_id)}
+        return {
+            "job_id": str(job_id),
+            "status": job["status"],
+            "pages": job["pages"],
+            "imported_count": job["imported_count"],
+            "failed_count": job["failed_count"]
+        }
+
+    async def get_import_job(self, job_id: str) -> Optional[Dict]:
+        """Get the progress counters of an import job"""
+        if not ObjectId.is_valid(job_id):
+            return None
+        job = await self.import_jobs_collection.find_one({"_id": ObjectId(job_id)})
+        if job:
+            job["_id"] = str(job["_id"])
+        return job
 
-        if self.session:
-            async with self.session.get(
-                f"{supplier['api_url']}/products",
-                params={"category": category, "limit": limit},
-                headers={"Authorization": f"Bearer {supplier['api_key']}"}
-            ) as response:
-                if response.status == 200:
-                    products = await response.json()
-                    
-                    # Process and insert products
-                    processed_products = []
-                    for product in products:
-                        processed_product = {
-                            "name": product["name"],
-                            "description": product.get("description", ""),
-                            "price": product["price"],
-                            "categories": [category],
-                            "supplier_id": supplier_id,
-                            "stock_quantity": product.get("stock_quantity", 0),
-                            "images": product.get("images", []),
-                            "attributes": product.get("attributes", {}),
-                            "created_at": datetime.utcnow(),
-                            "updated_at": datetime.utcnow()
-                        }
-                        processed_products.append(processed_product)
-
-                    if processed_products:
-                        result = await self.product_collection.insert_many(processed_products)
-                        return {
-                            "imported_count": len(result.inserted_ids),
-                            "products": processed_products
-                        }
-
-        return {"error": "Failed to import products"}
+    async def _fetch_supplier_page(self, supplier: Dict, category: str, page: int, page_size: int) -> List[Dict]:
+        """Fetch one page of a supplier's catalog"""
+        async with self.session.get(
+            f"{supplier['api_url']}/products",
+            params={"category": category, "limit": page_size, "page": page},
+            headers={"Authorization": f"Bearer {supplier['api_key']}"}
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to fetch supplier products page {page}: {response.status}")
+            return await response.json()
+
+    def _transform_supplier_product(self, product: Dict, supplier_id: str, category: str) -> Dict:
+        now = datetime.utcnow()
+        return {
+            "name": product["name"],
+            "description": product.get("description", ""),
+            "price": product["price"],
+            "categories": [category],
+            "supplier_id": supplier_id,
+            "stock_quantity": product.get("stock_quantity", 0),
+            "images": product.get("images", []),
+            "attributes": product.get("attributes", {}),
+            "created_at": now,
+            "updated_at": now
+        }
+
+    async def _insert_chunk(self, documents: List[Dict]) -> tuple:
+        """Insert documents without stopping at the first error, returning (inserted, failed)"""
+        if not documents:
+            return 0, 0
+        try:
+            result = await self.product_collection.insert_many(documents, ordered=False)
+            return len(result.inserted_ids), 0
+        except BulkWriteError as e:
+            failed = len(e.details.get("writeErrors", []))
+            return e.details.get("nInserted", len(documents) - failed), failed
 
     async def get_product_variations(self, product_id: str) -> List[Dict]:
         """Get all variations of a product"""
-        product = await self.product_collection.find_one({"_id": product_id})
-        if not product:
-            return []
+        variations = await self.get_variations_bulk([product_id])
+        return variations[product_id]
 
-        variations = await self.product_collection.find({
-            "parent_id": product_id,
-            "is_variation": True
-        }).to_list(length=100)
-
-        return variations
+    async def get_variations_bulk(self, parent_ids: List[str], limit_per_parent: int = 100) -> Dict[str, List[Dict]]:
+        """Get the variations of many products with a single grouped query"""
+        if not parent_ids:
+            return {}
+        await self.ensure_indexes()
+        pipeline = [
+            {"$match": {"parent_id": {"$in": parent_ids}, "is_variation": True}},
+            {"$group": {"_id": "$parent_id", "variations": {"$push": "$$ROOT"}}},
+            {"$project": {"variations": {"$slice": ["$variations", limit_per_parent]}}}
+        ]
+        groups = await self.product_collection.aggregate(pipeline).to_list(length=None)
+        grouped = {group["_id"]: group["variations"] for group in groups}
+        return {parent_id: grouped.get(parent_id, []) for parent_id in parent_ids}
 
     async def create_product_variation(self, product_id: str, variation_data: Dict) -> Dict:
         """Create a new variation for a product"""
-        product = await self.product_collection.find_one({"_id": product_id})
+        # Bump the parent's denormalized count and read its name in one round trip
+        product = await self.product_collection.find_one_and_update(
+            {"_id": product_id},
+            {"$inc": {"variation_count": 1}},
+            projection={"name": 1},
+            return_document=ReturnDocument.AFTER
+        )
         if not product:
             return {"error": "Product not found"}
 
@@ -129,31 +398,123 @@ class ProductSourcingService:
             "updated_at": datetime.utcnow()
         }
 
-        result = await self.product_collection.insert_one(variation)
+        try:
+            result = await self.product_collection.insert_one(variation)
+        except Exception:
+            await self.product_collection.update_one({"_id": product_id}, {"$inc": {"variation_count": -1}})
+            raise
         return {"variation_id": str(result.inserted_id), "variation": variation}
 
-    async def search_products(self, query: str, filters: Optional[Dict] = None) -> List[Dict]:
-        """Advanced product search with filters"""
-        search_filters = {"$text": {"$search": query}}
-        if filters:
-            search_filters.update(filters)
-        
-        # Add sorting and pagination
+    async def rebuild_variation_counts(self) -> int:
+        """Recompute every parent's variation_count from its children
+
+        Every count is reset first, so parents whose variations were all
+        deleted drop back to 0.
+        """
+        await self.product_collection.update_many(
+            {"variation_count": {"$gt": 0}}, {"$set": {"variation_count": 0}}
+        )
+        counts = await self.product_collection.aggregate([
+            {"$match": {"is_variation": True}},
+            {"$group": {"_id": "$parent_id", "count": {"$sum": 1}}}
+        ]).to_list(length=None)
+        if counts:
+            await self.product_collection.bulk_write([
+                UpdateOne({"_id": c["_id"]}, {"$set": {"variation_count": c["count"]}})
+                for c in counts
+            ], ordered=False)
+        return len(counts)
+
+    async def ensure_indexes(self):
+        """Create the search, pagination and variation indexes once per process"""
+        global _indexes_ready
+        if _indexes_ready:
+            return
+        # A collection can only have one text index; reuse whichever already exists
+        indexes = await self.product_collection.index_information()
+        if not any("text" in dict(index["key"]).values() for index in indexes.values()):
+            await self.product_collection.create_index([("name", "text"), ("description", "text")])
+        for field in SEARCH_SORT_FIELDS:
+            await self.product_collection.create_index([(field, 1), ("_id", 1)])
+        await self.product_collection.create_index([("parent_id", 1), ("is_variation", 1)])
+        _indexes_ready = True
+
+    @staticmethod
+    def _keyset_filter(sort_by: str, value: Any, product_id: Any, sort_order: int) -> Dict:
+        """Rows after ``(value, product_id)`` in ``(sort_by, _id)`` order
+
+        Missing and null sort values sort together below every other value,
+        so they come first ascending and last descending.
+        """
+        op = "$lt" if sort_order < 0 else "$gt"
+        tie = {sort_by: value, "_id": {op: product_id}}
+        if value is None:
+            return {"$or": [{sort_by: {"$ne": None}}, tie]} if sort_order > 0 else tie
+        branches = [{sort_by: {op: value}}, tie]
+        if sort_order < 0:
+            branches.append({sort_by: None})
+        return {"$or": branches}
+
+    async def search_products(self, query: str, filters: Optional[Dict] = None) -> Dict:
+        """Advanced product search with filters
+
+        Pass the ``next_after`` token of a result as ``after`` to get the next
+        page; keyset pages cost the same at any depth. ``total`` is
+        ``"exact"`` by default; deep result sets can opt into ``"approximate"``
+        (counted up to ``SEARCH_APPROX_COUNT_LIMIT``) or ``"none"``. A ``page`` without ``after`` still falls back to offset
+        pagination. Text queries match through the text index, which cannot
+        serve the sort; their matches are sorted in a top-``per_page`` sort.
+        """
+        filters = dict(filters or {})
         sort_by = filters.get("sort_by", "created_at")
-        sort_order = filters.get("sort_order", -1)
-        page = filters.get("page", 1)
-        per_page = filters.get("per_page", 20)
-        
-        products = await self.product_collection.find(search_filters).sort(
-            sort_by, sort_order
-        ).skip((page - 1) * per_page).limit(per_page).to_list(length=per_page)
-        
-        total = await self.product_collection.count_documents(search_filters)
-        
-        return {
+        if sort_by not in SEARCH_SORT_FIELDS:
+            sort_by = "created_at"
+        sort_order = -1 if int(filters.get("sort_order", -1)) < 0 else 1
+        page = int(filters.get("page", 1))
+        per_page = int(filters.get("per_page", 20))
+        after = filters.get("after")
+        total_mode = filters.get("total", "exact")
+
+        search_filters = {k: v for k, v in filters.items() if k not in SEARCH_PAGINATION_KEYS}
+        if query:
+            search_filters["$text"] = {"$search": query}
+
+        await self.ensure_indexes()
+
+        page_filters = search_filters
+        skip = 0
+        if after:
+            cursor = decode_search_cursor(after)
+            page_filters = {"$and": [
+                search_filters, self._keyset_filter(sort_by, cursor["v"], cursor["id"], sort_order)
+            ]}
+        elif page > 1:
+            skip = (page - 1) * per_page
+
+        products = await self.product_collection.find(page_filters).sort(
+            [(sort_by, sort_order), ("_id", sort_order)]
+        ).skip(skip).limit(per_page).to_list(length=per_page)
+
+        next_after = None
+        if len(products) == per_page:
+            last = products[-1]
+            next_after = encode_search_cursor(last.get(sort_by), last["_id"])
+
+        result = {
             "products": products,
-            "total": total,
-            "page": page,
             "per_page": per_page,
-            "total_pages": (total + per_page - 1) // per_page
-        } 
\ No newline at end of file
+            "sort_by": sort_by,
+            "next_after": next_after
+        }
+
+        if total_mode == "exact":
+            total = await self.product_collection.count_documents(search_filters)
+            result.update(total=total, total_is_estimate=False)
+        elif total_mode == "approximate":
+            cap = settings.SEARCH_APPROX_COUNT_LIMIT
+            total = await self.product_collection.count_documents(search_filters, limit=cap)
+            result.update(total=total, total_is_estimate=total >= cap)
+
+        if not after and "total" in result:
+            result.update(page=page, total_pages=(result["total"] + per_page - 1) // per_page)
+        return result
@@ -0,0 +1,78 @@
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import time
+from app.config import settings
+
+QuoteFetcher = Callable[[], Awaitable[Optional[Dict]]]
+
+class QuoteCache:
+    """Short-lived cache of supplier quotes keyed by (supplier_id, product_id).
+
+    Fresh entries (younger than ``ttl_seconds``) are served directly. Stale
+    entries (up to ``stale_seconds`` past the TTL) are still served, while a
+    single background refresh replaces them. Concurrent misses for the same
+    key share one upstream call. Failed lookups are never cached.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        stale_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.QUOTE_CACHE_TTL_SECONDS
+        self.stale_seconds = stale_seconds if stale_seconds is not None else settings.QUOTE_CACHE_STALE_SECONDS
+        self.max_entries = max_entries or settings.QUOTE_CACHE_MAX_ENTRIES
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[Dict, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def get(self, key: Hashable, fetch: QuoteFetcher) -> Optional[Dict]:
+        """Get a quote, calling ``fetch`` only when the cache cannot answer"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            quote, fetched_at = entry
+            age = self.clock() - fetched_at
+            if age < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                return quote
+            if age < self.ttl_seconds + self.stale_seconds:
+                self._entries.move_to_end(key)
+                self._start_fetch(key, fetch)
+                return quote
+        # Shield the shared fetch so one caller giving up does not cancel it for the others
+        return await asyncio.shield(self._start_fetch(key, fetch))
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one quote, or every quote when no key is given"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _start_fetch(self, key: Hashable, fetch: QuoteFetcher) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._fetch_done(key, f))
+        return future
+
+    def _fetch_done(self, key: Hashable, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            # Mark background refresh failures as retrieved; callers that awaited see them anyway
+            future.exception()
+
+    async def _fetch_and_store(self, key: Hashable, fetch: QuoteFetcher) -> Optional[Dict]:
+        quote = await fetch()
+        if quote is not None:
+            self._entries[key] = (quote, self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return quote
+
+quote_cache = QuoteCache()
@@ -0,0 +1,143 @@
+from typing import Any, Dict, Iterable, Optional
+from datetime import datetime
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.config import settings
+
+class StockAlerts:
+    """Low-stock view kept current by the writes that change stock.
+
+    ``stock_alerts`` holds one document per product whose stock is at or
+    below its reorder point (the product's ``reorder_point``, or
+    ``STOCK_ALERT_THRESHOLD`` when it has none). Writers report the stock
+    they just wrote through ``apply``; readers page through the alerts and
+    join current stock for that page only, so no read scans ``products``.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.collection = db.stock_alerts
+        self.rebuild_collection = db.stock_alert_rebuilds
+        self.product_collection = db.products
+        self.default_reorder_point = settings.STOCK_ALERT_THRESHOLD
+        self.batch_size = settings.SYNC_WRITE_BATCH_SIZE
+
+    def reorder_point(self, product: Dict[str, Any]) -> int:
+        reorder_point = product.get("reorder_point")
+        return self.default_reorder_point if reorder_point is None else reorder_point
+
+    def is_low(self, product: Dict[str, Any], stock: Optional[int] = None) -> bool:
+        """Whether stock is at or below the reorder point; False when no stock is known"""
+        if stock is None:
+            stock = product.get("stock")
+        return stock is not None and stock <= self.reorder_point(product)
+
+    async def apply(self, products: Iterable[Dict[str, Any]]):
+        """Raise or clear alerts for products given as ``{"_id", "stock", "reorder_point"?}``"""
+        now = datetime.utcnow()
+        operations = []
+        for product in products:
+            if self.is_low(product):
+                operations.append(UpdateOne(
+                    {"_id": product["_id"]},
+                    {
+                        "$set": {"reorder_point": self.reorder_point(product), "updated_at": now},
+                        "$setOnInsert": {"since": now}
+                    },
+                    upsert=True
+                ))
+            else:
+                operations.append(DeleteOne({"_id": product["_id"]}))
+        for i in range(0, len(operations), self.batch_size):
+            await self.collection.bulk_write(operations[i:i + self.batch_size], ordered=False)
+
+    async def apply_if_crossed(self, product: Dict[str, Any], delta: int):
+        """Update the alert for a product whose stock just changed by ``delta``
+
+        Skips the write unless the change moved the product across its
+        reorder point, which keeps the reservation hot path to one write.
+        """
+        if self.is_low(product) != self.is_low(product, product["stock"] - delta):
+            await self.apply([product])
+
+    async def refresh(self, product_ids: Iterable):
+        """Recompute alerts for products from their stored stock
+
+        Products with sharded stock are skipped; their stored ``stock`` is not
+        the real total, so the inventory service reports them itself.
+        """
+        keys = [ObjectId(p) if ObjectId.is_valid(p) else p for p in product_ids]
+        if not keys:
+            return
+        products = await self.product_collection.find(
+            {"_id": {"$in": keys}}, {"stock": 1, "reorder_point": 1, "stock_shard_count": 1}
+        ).to_list(None)
+        found = {product["_id"] for product in products}
+        await self.apply([product for product in products if not product.get("stock_shard_count")])
+        # Deleted products should not keep an alert
+        missing = [key for key in keys if key not in found]
+        if missing:
+            await self.collection.delete_many({"_id": {"$in": missing}})
+
+    async def rebuild(self):
+        """Rebuild every alert from the products collection, e.g. after a deploy"""
+        batch = []
+        async for product in self.product_collection.find(
+            {"stock": {"$exists": True}, "stock_shard_count": {"$exists": False}}, {"stock": 1, "reorder_point": 1}
+        ):
+            batch.append(product)
+            if len(batch) >= self.batch_size:
+                await self.apply(batch)
+                batch = []
+        await self.apply(batch)
+        await self.rebuild_collection.update_one(
+            {"_id": "stock_alerts"}, {"$set": {"rebuilt_at": datetime.utcnow()}}, upsert=True
+        )
+
+    async def rebuild_if_needed(self) -> bool:
+        """Rebuild once per database, so products already low before the view existed show up"""
+        if await self.rebuild_collection.find_one({"_id": "stock_alerts"}):
+            return False
+        await self.rebuild()
+        return True
+
+    async def set_reorder_point(self, product_id: str, reorder_point: Optional[int], stock: Optional[int] = None):
+        """Set a product's reorder point (None restores the default) and refresh its alert
+
+        Pass ``stock`` when the stored stock is not the real total.
+        """
+        key = ObjectId(product_id) if ObjectId.is_valid(product_id) else product_id
+        update = {"$unset": {"reorder_point": ""}} if reorder_point is None else {"$set": {"reorder_point": reorder_point}}
+        await self.product_collection.update_one({"_id": key}, update)
+        if stock is None:
+            await self.refresh([key])
+        else:
+            await self.apply([{"_id": key, "stock": stock, "reorder_point": reorder_point}])
+
+    async def list_alerts(self, after: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """Get one page of low-stock products in ``_id`` order with their current stock"""
+        query: Dict[str, Any] = {}
+        if after is not None:
+            if not ObjectId.is_valid(after):
+                raise ValueError("Invalid alert cursor")
+            query["_id"] = {"$gt": ObjectId(after)}
+        alerts = await self.collection.find(query).sort("_id", 1).limit(limit).to_list(limit)
+        products = await self.product_collection.find(
+            {"_id": {"$in": [alert["_id"] for alert in alerts]}},
+            {"name": 1, "stock": 1, "reserved_stock": 1, "stock_shard_count": 1}
+        ).to_list(None)
+        by_id = {product["_id"]: product for product in products}
+        items = []
+        for alert in alerts:
+            product = by_id.get(alert["_id"], {})
+            items.append({
+                "product_id": str(alert["_id"]),
+                "name": product.get("name"),
+                "available_stock": product.get("stock", 0),
+                "reserved_stock": product.get("reserved_stock", 0),
+                "reorder_point": alert["reorder_point"],
+                "sharded": bool(product.get("stock_shard_count")),
+                "since": alert["since"]
+            })
+        next_cursor = str(alerts[-1]["_id"]) if len(alerts) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
@@ -284,9 +284,18 @@ class AmazonAPI(SupplierAPI):
 class SupplierAPIFactory:
     @staticmethod
     def create_api(supplier: Supplier) -> SupplierAPI:
-        if supplier.name.lower() == "aliexpress":
-            return AliExpressAPI(supplier.api_key, supplier.api_secret)
-        elif supplier.name.lower() == "amazon":
-            return AmazonAPI(supplier.api_key, supplier.api_secret)
+        return SupplierAPIFactory._create(supplier.name, supplier.api_key, supplier.api_secret)
+
+    @staticmethod
+    def create_api_from_document(supplier: Dict) -> SupplierAPI:
+        """Create an API client from a raw supplier document"""
+        return SupplierAPIFactory._create(supplier["name"], supplier.get("api_key"), supplier.get("api_secret"))
+
+    @staticmethod
+    def _create(name: str, api_key: str, api_secret: str) -> SupplierAPI:
+        if name.lower() == "aliexpress":
+            return AliExpressAPI(api_key, api_secret)
+        elif name.lower() == "amazon":
+            return AmazonAPI(api_key, api_secret)
         else:
-            raise ValueError(f"Unsupported supplier: {supplier.name}") 
\ No newline at end of file
+            raise ValueError(f"Unsupported supplier: {name}")
\ No newline at end of file
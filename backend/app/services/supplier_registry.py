@@ -0,0 +1,139 @@
+from typing import Dict, Iterable, Optional, Set, Tuple
+import asyncio
+import time
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.services.supplier_api import SupplierAPI, SupplierAPIFactory
+from app.core.config import settings
+
+class SupplierRegistry:
+    """Process-wide cache of supplier documents and ready-to-use API clients.
+
+    Entries are keyed by ``str(supplier_id)`` and expire after
+    ``SUPPLIER_CACHE_TTL_SECONDS``. Missing suppliers are cached too so a
+    product pointing at a deleted supplier does not hit the database on
+    every sync. Call ``invalidate`` whenever a supplier document changes.
+    Clients are tied to the credentials they were built with; once a
+    refreshed document carries different ones, the client is rebuilt, so
+    other processes pick up rotated keys within the TTL. Clients are
+    reference counted, so rotating or invalidating never closes one under
+    a request still in flight.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.SUPPLIER_CACHE_TTL_SECONDS
+        self._suppliers: Dict[str, Tuple[Optional[Dict], float]] = {}
+        self._clients: Dict[str, Tuple[Tuple, SupplierAPI]] = {}
+        # Client -> callers holding it; retired clients are closed when this reaches 0
+        self._users: Dict[SupplierAPI, int] = {}
+        self._retired: Set[SupplierAPI] = set()
+        self._lock = asyncio.Lock()
+
+    def _cached(self, key: str) -> Tuple[bool, Optional[Dict]]:
+        entry = self._suppliers.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            return False, None
+        return True, entry[0]
+
+    def _store(self, key: str, supplier: Optional[Dict]):
+        self._suppliers[key] = (supplier, time.monotonic() + self.ttl_seconds)
+
+    @staticmethod
+    def _credentials(supplier: Dict) -> Tuple:
+        return (supplier.get("name"), supplier.get("api_key"), supplier.get("api_secret"))
+
+    @staticmethod
+    def _to_object_id(supplier_id):
+        return ObjectId(supplier_id) if ObjectId.is_valid(supplier_id) else supplier_id
+
+    async def prefetch(self, collection: AsyncIOMotorCollection, supplier_ids: Iterable):
+        """Load any uncached suppliers from the given IDs with a single query"""
+        keys = {str(supplier_id) for supplier_id in supplier_ids if supplier_id is not None}
+        missing = [key for key in keys if not self._cached(key)[0]]
+        if not missing:
+            return
+        suppliers = await collection.find(
+            {"_id": {"$in": [self._to_object_id(key) for key in missing]}}
+        ).to_list(None)
+        found = {str(supplier["_id"]): supplier for supplier in suppliers}
+        for key in missing:
+            self._store(key, found.get(key))
+
+    async def get_supplier(self, collection: AsyncIOMotorCollection, supplier_id) -> Optional[Dict]:
+        """Get a supplier document, loading it on a cache miss"""
+        key = str(supplier_id)
+        hit, supplier = self._cached(key)
+        if hit:
+            return supplier
+        supplier = await collection.find_one({"_id": self._to_object_id(key)})
+        self._store(key, supplier)
+        return supplier
+
+    async def get_client(self, collection: AsyncIOMotorCollection, supplier_id) -> Optional[SupplierAPI]:
+        """Get an open API client for a supplier, creating it on first use
+
+        Give every client back with ``release`` once its requests are done.
+        A client replaced after a rotation or dropped by ``invalidate`` stays
+        open until its last user has released it.
+        """
+        key = str(supplier_id)
+        supplier = await self.get_supplier(collection, key)
+        if not supplier:
+            return None
+        credentials = self._credentials(supplier)
+        entry = self._clients.get(key)
+        if entry is not None and entry[0] == credentials:
+            return self._use(entry[1])
+        async with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and entry[0] == credentials:
+                return self._use(entry[1])
+            client = SupplierAPIFactory.create_api_from_document(supplier)
+            await client.__aenter__()
+            self._clients[key] = (credentials, client)
+            self._use(client)
+        if entry is not None:
+            # Credentials were rotated; the old client is of no further use
+            await self._retire(entry[1])
+        return client
+
+    def _use(self, client: SupplierAPI) -> SupplierAPI:
+        self._users[client] = self._users.get(client, 0) + 1
+        return client
+
+    async def release(self, client: Optional[SupplierAPI]):
+        """Hand back a client from ``get_client``, closing it if it was retired meanwhile"""
+        users = self._users.get(client, 0) - 1
+        if users > 0:
+            self._users[client] = users
+            return
+        self._users.pop(client, None)
+        if client in self._retired:
+            self._retired.discard(client)
+            await client.__aexit__(None, None, None)
+
+    async def _retire(self, client: SupplierAPI):
+        """Close a client that is no longer cached, or once its last user releases it"""
+        if self._users.get(client):
+            self._retired.add(client)
+        else:
+            await client.__aexit__(None, None, None)
+
+    async def invalidate(self, supplier_id=None):
+        """Drop a cached supplier and retire its client, or everything when no ID is given"""
+        keys = list(self._suppliers.keys() | self._clients.keys()) if supplier_id is None else [str(supplier_id)]
+        for key in keys:
+            self._suppliers.pop(key, None)
+            entry = self._clients.pop(key, None)
+            if entry is not None:
+                await self._retire(entry[1])
+
+    async def close(self):
+        """Close all API clients, including retired ones still in use, e.g. on shutdown"""
+        await self.invalidate()
+        retired, self._retired = self._retired, set()
+        for client in retired:
+            self._users.pop(client, None)
+            await client.__aexit__(None, None, None)
+
+supplier_registry = SupplierRegistry()
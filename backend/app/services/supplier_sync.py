@@ -1,11 +1,22 @@
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional
 import asyncio
+import time
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from pymongo import UpdateOne
 from app.models import Product, Supplier
-from app.services.supplier_api import SupplierAPIFactory
+from app.services.product_cache import CACHED_PRODUCT_FIELDS, product_cache
+from app.services.stock_alerts import StockAlerts
+from app.services.supplier_registry import supplier_registry
+from app.services.sync_scheduler import SyncScheduler
+from app.services.sync_shards import LeaseLost, SyncShardCoordinator
+from services.stock_shards import StockShards
 from app.core.config import settings
+from app.monitoring import (
+    log_error, SUPPLIER_REQUEST_LATENCY, SYNC_PRODUCTS, SYNC_RUN_DURATION,
+    SYNC_QUEUE_DEPTH, SYNC_STALEST_PRODUCT_AGE
+)
 
 class SupplierSyncService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -13,73 +24,273 @@ class SupplierSyncService:
         self.product_collection = db.products
         self.supplier_collection = db.suppliers
         self.sync_collection = db.sync_logs
+        self.sync_runs_collection = db.sync_runs
+        self.stock_alerts = StockAlerts(db)
+        self.stock_shards = StockShards(db)
         self.sync_interval = settings.SYNC_INTERVAL_MINUTES
         self.price_change_threshold = settings.PRICE_CHANGE_THRESHOLD
         self.stock_alert_threshold = settings.STOCK_ALERT_THRESHOLD
+        self.write_batch_size = settings.SYNC_WRITE_BATCH_SIZE
+        self._pending_updates: Dict = {}
+        self._pending_alerts: Dict = {}
+        # Product ID -> product with its new supplier stock, for products whose stock is sharded
+        self._pending_shard_stock: Dict = {}
+        self._pending_logs: List[Dict] = []
+        # Checked before every flush in sharded mode; returns False once the shard lease is lost
+        self._fence: Optional[Callable[[], Awaitable[bool]]] = None
+        self.scheduler = SyncScheduler(db)
+        self._run_stats = self._new_run_stats()
 
     async def start_auto_sync(self):
-        """Start the automatic synchronization process"""
+        """Start the automatic synchronization process
+
+        Only products whose ``next_sync_at`` has passed are synced; each sync
+        reschedules the product based on its sales velocity, price volatility
+        and stock level. A run drains the due queue batch by batch and is
+        recorded once it is empty.
+        """
+        await self.scheduler.ensure_indexes()
         while True:
             try:
-                await self.sync_all_products()
-                await asyncio.sleep(self.sync_interval * 60)
+                started = self._start_run()
+                while await self.sync_due_products() >= self.scheduler.batch_size:
+                    pass
+                await self._finish_run("due", started)
+                wait = await self.scheduler.seconds_until_next_due()
+                poll = settings.SYNC_SCHEDULER_POLL_SECONDS
+                await asyncio.sleep(poll if wait is None else min(max(wait, 1), poll))
             except Exception as e:
-                print(f"Error in auto sync: {str(e)}")
+                log_error(e, {"context": "auto_sync"})
                 await asyncio.sleep(60)  # Wait a minute before retrying
 
+    async def run_sync_worker(self, worker_id: Optional[str] = None):
+        """Run one sync worker in a sharded deployment
+
+        Start any number of these across processes or nodes; each claims one
+        product shard at a time, syncs the shard's due products while
+        heartbeating its lease, then hands the shard back. Every flush first
+        renews the lease, so a worker that lost its shard drops its buffered
+        writes instead of racing the new owner. A run is one pass of
+        ``SYNC_SHARD_COUNT`` claims and is recorded when the pass ends.
+        """
+        coordinator = SyncShardCoordinator(self.db, worker_id)
+        await coordinator.ensure_shards()
+        await self.scheduler.ensure_indexes()
+        await coordinator.assign_missing_shards()
+        idle_claims = 0
+        claims = 0
+        started = self._start_run()
+        while True:
+            try:
+                if claims >= coordinator.shard_count:
+                    await self._finish_run("shard_pass", started, worker_id=coordinator.worker_id)
+                    claims = 0
+                    started = self._start_run()
+                lease = await coordinator.claim_shard()
+                claims += 1
+                if not lease:
+                    await asyncio.sleep(settings.SYNC_SCHEDULER_POLL_SECONDS)
+                    continue
+
+                heartbeat = asyncio.create_task(coordinator.heartbeat(lease))
+                self._fence = lambda: coordinator.renew(lease)
+                synced = 0
+                try:
+                    while not heartbeat.done():
+                        batch = await self.sync_due_products(query={"sync_shard": lease["_id"]})
+                        synced += batch
+                        if batch < self.scheduler.batch_size:
+                            break
+                except LeaseLost:
+                    log_error(LeaseLost(f"Lost lease on shard {lease['_id']}"), {"worker_id": coordinator.worker_id})
+                finally:
+                    self._fence = None
+                    heartbeat.cancel()
+                    await coordinator.release(lease)
+
+                # Back off once a full pass over the shards found nothing due, and only
+                # then give newly created products their shard
+                idle_claims = idle_claims + 1 if synced == 0 else 0
+                if idle_claims >= coordinator.shard_count:
+                    idle_claims = 0
+                    await coordinator.assign_missing_shards()
+                    await asyncio.sleep(settings.SYNC_SCHEDULER_POLL_SECONDS)
+            except Exception as e:
+                log_error(e, {"context": "sync_worker", "worker_id": coordinator.worker_id})
+                await asyncio.sleep(60)
+
+    async def sync_due_products(self, query: Optional[Dict] = None) -> int:
+        """Sync one batch of products that are due, returning how many were processed
+
+        Counts go into the current run; the caller starts and finishes runs.
+        """
+        products = await self.scheduler.get_due_products(query=query)
+        await supplier_registry.prefetch(self.supplier_collection, {p.get("supplier_id") for p in products})
+        velocities = await self.scheduler.get_sales_velocity([p["_id"] for p in products])
+        for product in products:
+            try:
+                await self.sync_product(
+                    product,
+                    flush=False,
+                    sales_velocity=velocities.get(str(product["_id"]), 0.0)
+                )
+            except LeaseLost:
+                raise
+            except Exception as e:
+                self._record_failure(product, e)
+                self._queue_product_update(product["_id"], self.scheduler.retry_later())
+        await self.flush_writes()
+        return len(products)
+
     async def sync_all_products(self):
         """Sync all products with their suppliers"""
+        started = self._start_run()
         products = await self.product_collection.find({}).to_list(None)
+        await supplier_registry.prefetch(self.supplier_collection, {p.get("supplier_id") for p in products})
         for product in products:
             try:
-                await self.sync_product(product)
+                await self.sync_product(product, flush=False)
             except Exception as e:
-                print(f"Error syncing product {product['_id']}: {str(e)}")
+                self._record_failure(product, e)
+        await self.flush_writes()
+        await self._finish_run("full", started)
+
+    async def sync_product(self, product: Dict, flush: bool = True,
+                           sales_velocity: Optional[float] = None):
+        """Sync a single product with its supplier
 
-    async def sync_product(self, product: Dict):
-        """Sync a single product with its supplier"""
-        supplier = await self.supplier_collection.find_one({"_id": ObjectId(product["supplier_id"])})
-        if not supplier:
+        Product updates and sync logs are buffered and written in batches; pass
+        ``flush=False`` when syncing many products and call ``flush_writes`` once
+        at the end.
+        """
+        api = await supplier_registry.get_client(self.supplier_collection, product["supplier_id"])
+        if api is None:
+            self._count("skipped")
+            self._queue_product_update(
+                product["_id"], self.scheduler.retry_later(self.scheduler.max_interval)
+            )
+            if flush:
+                await self.flush_writes()
             return
 
-        api = SupplierAPIFactory.create_api(supplier["name"], supplier["api_key"], supplier["api_secret"])
-        
-        async with api:
-            # Get current supplier data
+        # Get current supplier data
+        supplier = await supplier_registry.get_supplier(self.supplier_collection, product["supplier_id"])
+        request_started = time.perf_counter()
+        try:
             supplier_data = await api.get_product_details(product["supplier_product_id"])
-            
-            # Check price changes
-            new_price = float(supplier_data["price"])
-            price_change = abs(new_price - product["supplier_price"]) / product["supplier_price"] * 100
-            
-            if price_change >= self.price_change_threshold:
-                await self._handle_price_change(product, new_price, price_change)
-            
-            # Check stock changes
-            new_stock = int(supplier_data["stock"])
-            if new_stock <= self.stock_alert_threshold and product["stock"] > self.stock_alert_threshold:
-                await self._handle_low_stock(product, new_stock)
-            
-            # Update product
-            await self._update_product(product, supplier_data)
-            
-            # Log sync
-            await self._log_sync(product, supplier_data)
+        finally:
+            await supplier_registry.release(api)
+        self._observe_latency(
+            (supplier or {}).get("name", str(product["supplier_id"])), time.perf_counter() - request_started
+        )
+        
+        # Check price changes
+        new_price = float(supplier_data["price"])
+        price_change = abs(new_price - product["supplier_price"]) / product["supplier_price"] * 100
+        
+        if price_change >= self.price_change_threshold:
+            await self._handle_price_change(product, new_price, price_change)
+        
+        # Check stock changes
+        new_stock = int(supplier_data["stock"])
+        if new_stock <= self.stock_alert_threshold and product["stock"] > self.stock_alert_threshold:
+            await self._handle_low_stock(product, new_stock)
+        
+        # Update product
+        await self._update_product(product, supplier_data)
+        
+        # Log sync
+        await self._log_sync(product, supplier_data)
+
+        # Schedule next sync
+        self._queue_product_update(
+            product["_id"],
+            self.scheduler.schedule(product, price_change, new_stock, sales_velocity)
+        )
+        self._count("synced")
+
+        if flush or self._pending_write_count() >= self.write_batch_size:
+            await self.flush_writes()
+
+    @staticmethod
+    def _new_run_stats() -> Dict:
+        return {"synced": 0, "skipped": 0, "failed": 0, "suppliers": {}, "errors": []}
+
+    def _start_run(self) -> float:
+        self._run_stats = self._new_run_stats()
+        return time.perf_counter()
+
+    def _count(self, status: str):
+        SYNC_PRODUCTS.labels(status=status).inc()
+        self._run_stats[status] += 1
+
+    def _record_failure(self, product: Dict, error: Exception):
+        self._count("failed")
+        log_error(error, {"context": "sync_product", "product_id": str(product["_id"])})
+        if len(self._run_stats["errors"]) < 20:
+            self._run_stats["errors"].append({"product_id": str(product["_id"]), "error": str(error)})
+
+    def _observe_latency(self, supplier_name: str, seconds: float):
+        SUPPLIER_REQUEST_LATENCY.labels(supplier=supplier_name).observe(seconds)
+        stats = self._run_stats["suppliers"].setdefault(
+            supplier_name, {"requests": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        )
+        stats["requests"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    async def _finish_run(self, mode: str, started: float, query: Optional[Dict] = None,
+                          worker_id: Optional[str] = None):
+        """Publish run metrics and store a summary document in sync_runs
+
+        Runs that found nothing to sync only refresh the backlog gauges.
+        """
+        duration = time.perf_counter() - started
+        SYNC_RUN_DURATION.labels(mode=mode).observe(duration)
+        queue_depth = await self.scheduler.count_due_products()
+        SYNC_QUEUE_DEPTH.set(queue_depth)
+        stalest_age = await self.scheduler.stalest_product_age()
+        if stalest_age is not None:
+            SYNC_STALEST_PRODUCT_AGE.set(stalest_age)
+
+        stats = self._run_stats
+        if not stats["synced"] + stats["skipped"] + stats["failed"]:
+            return
+        await self.sync_runs_collection.insert_one({
+            "mode": mode,
+            "query": query,
+            "worker_id": worker_id,
+            "started_at": datetime.utcnow() - timedelta(seconds=duration),
+            "finished_at": datetime.utcnow(),
+            "duration_seconds": duration,
+            "products_synced": stats["synced"],
+            "products_skipped": stats["skipped"],
+            "products_failed": stats["failed"],
+            "queue_depth": queue_depth,
+            "stalest_product_age_seconds": stalest_age,
+            "suppliers": [
+                {
+                    "name": name,
+                    "requests": s["requests"],
+                    "avg_latency_seconds": s["total_seconds"] / s["requests"],
+                    "max_latency_seconds": s["max_seconds"]
+                }
+                for name, s in stats["suppliers"].items()
+            ],
+            "errors": stats["errors"]
+        })
 
     async def _handle_price_change(self, product: Dict, new_price: float, price_change: float):
         """Handle price changes and notify relevant parties"""
         # Update product price
-        await self.product_collection.update_one(
-            {"_id": product["_id"]},
-            {"$set": {
-                "supplier_price": new_price,
-                "price": new_price * (1 + product["markup_percentage"] / 100),
-                "last_price_update": datetime.utcnow()
-            }}
-        )
+        self._queue_product_update(product["_id"], {
+            "supplier_price": new_price,
+            "price": new_price * (1 + product["markup_percentage"] / 100),
+            "last_price_update": datetime.utcnow()
+        })
         
         # Log price change
-        await self.sync_collection.insert_one({
+        self._pending_logs.append({
             "product_id": product["_id"],
             "type": "price_change",
             "old_price": product["supplier_price"],
@@ -95,16 +306,13 @@ class SupplierSyncService:
     async def _handle_low_stock(self, product: Dict, new_stock: int):
         """Handle low stock situations"""
         # Update product stock
-        await self.product_collection.update_one(
-            {"_id": product["_id"]},
-            {"$set": {
-                "stock": new_stock,
-                "last_stock_update": datetime.utcnow()
-            }}
-        )
+        self._queue_product_update(product["_id"], {
+            "stock": new_stock,
+            "last_stock_update": datetime.utcnow()
+        })
         
         # Log stock alert
-        await self.sync_collection.insert_one({
+        self._pending_logs.append({
             "product_id": product["_id"],
             "type": "low_stock",
             "old_stock": product["stock"],
@@ -131,20 +339,75 @@ class SupplierSyncService:
             }
         }
         
-        await self.product_collection.update_one(
-            {"_id": product["_id"]},
-            {"$set": update_data}
-        )
+        new_stock = update_data["stock"]
+        if product.get("stock_shard_count"):
+            # The product's stock field is unused while sharded; the new total goes to the shards
+            del update_data["stock"]
+            self._queue_product_update(product["_id"], update_data)
+            self._pending_updates[product["_id"]].pop("stock", None)
+            self._pending_shard_stock[product["_id"]] = {
+                "_id": product["_id"], "stock": new_stock, "reorder_point": product.get("reorder_point"),
+                "stock_shard_count": product["stock_shard_count"]
+            }
+            return
+        self._queue_product_update(product["_id"], update_data)
+        if self.stock_alerts.is_low(product) != self.stock_alerts.is_low(product, new_stock):
+            self._pending_alerts[product["_id"]] = {
+                "_id": product["_id"], "stock": new_stock, "reorder_point": product.get("reorder_point")
+            }
 
     async def _log_sync(self, product: Dict, supplier_data: Dict):
         """Log synchronization details"""
-        await self.sync_collection.insert_one({
+        self._pending_logs.append({
             "product_id": product["_id"],
             "type": "sync",
             "supplier_data": supplier_data,
             "timestamp": datetime.utcnow()
         })
 
+    def _queue_product_update(self, product_id, fields: Dict):
+        """Merge fields into the pending $set for a product"""
+        self._pending_updates.setdefault(product_id, {}).update(fields)
+
+    def _pending_write_count(self) -> int:
+        return len(self._pending_updates) + len(self._pending_logs)
+
+    async def flush_writes(self):
+        """Write all buffered product updates and sync logs
+
+        Raises LeaseLost, discarding the buffered writes, when a sharded
+        worker no longer owns the shard it is syncing.
+        """
+        updates, self._pending_updates = self._pending_updates, {}
+        logs, self._pending_logs = self._pending_logs, []
+        alerts, self._pending_alerts = self._pending_alerts, {}
+        shard_stock, self._pending_shard_stock = self._pending_shard_stock, {}
+        if self._fence is not None and not await self._fence():
+            raise LeaseLost("Shard lease lost before flush")
+
+        for product_id, product in shard_stock.items():
+            self.stock_shards.remember(product_id, product.pop("stock_shard_count"))
+            await self.stock_shards.set_total(product_id, product["stock"])
+            alerts[product_id] = product
+
+        operations = [
+            UpdateOne({"_id": product_id}, {"$set": fields})
+            for product_id, fields in updates.items()
+        ]
+        for i in range(0, len(operations), self.write_batch_size):
+            await self.product_collection.bulk_write(
+                operations[i:i + self.write_batch_size], ordered=False
+            )
+        # Scheduling-only updates do not change what the product cache holds
+        changed = [product_id for product_id, fields in updates.items() if fields.keys() & CACHED_PRODUCT_FIELDS]
+        if changed:
+            await product_cache.invalidate(changed)
+        for i in range(0, len(logs), self.write_batch_size):
+            await self.sync_collection.insert_many(
+                logs[i:i + self.write_batch_size], ordered=False
+            )
+        await self.stock_alerts.apply(alerts.values())
+
     async def get_sync_history(self, product_id: str, days: int = 7) -> List[Dict]:
         """Get synchronization history for a product"""
         start_date = datetime.utcnow() - timedelta(days=days)
@@ -153,6 +416,10 @@ class SupplierSyncService:
             "timestamp": {"$gte": start_date}
         }).sort("timestamp", -1).to_list(None)
 
+    async def get_sync_runs(self, limit: int = 20) -> List[Dict]:
+        """Get the most recent sync run summaries"""
+        return await self.sync_runs_collection.find({}).sort("finished_at", -1).limit(limit).to_list(limit)
+
     async def get_price_history(self, product_id: str, days: int = 30) -> List[Dict]:
         """Get price history for a product"""
         start_date = datetime.utcnow() - timedelta(days=days)
@@ -162,10 +429,9 @@ class SupplierSyncService:
             "timestamp": {"$gte": start_date}
         }).sort("timestamp", -1).to_list(None)
 
-    async def get_stock_alerts(self, threshold: Optional[int] = None) -> List[Dict]:
-        """Get products with low stock alerts"""
-        query = {"stock": {"$lte": threshold or self.stock_alert_threshold}}
-        return await self.product_collection.find(query).to_list(None)
+    async def get_stock_alerts(self, after: Optional[str] = None, limit: int = 50) -> Dict:
+        """Get one page of products at or below their reorder point"""
+        return await self.stock_alerts.list_alerts(after, limit)
 
     async def get_price_changes(self, threshold: Optional[float] = None) -> List[Dict]:
         """Get products with significant price changes"""
@@ -0,0 +1,117 @@
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.config import settings
+
+class SyncScheduler:
+    """Assigns each product its own sync interval and tracks when it is next due.
+
+    Products carry a ``next_sync_at`` timestamp; the scheduler only hands out
+    products whose time has come, ordered by how overdue they are.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.product_collection = db.products
+        self.order_collection = db.orders
+        self.base_interval = settings.SYNC_INTERVAL_MINUTES
+        self.min_interval = settings.SYNC_MIN_INTERVAL_MINUTES
+        self.max_interval = settings.SYNC_MAX_INTERVAL_MINUTES
+        self.batch_size = settings.SYNC_SCHEDULER_BATCH_SIZE
+        self.velocity_window_days = settings.SYNC_VELOCITY_WINDOW_DAYS
+        self.velocity_reference = settings.SYNC_VELOCITY_REFERENCE
+        self.price_change_threshold = settings.PRICE_CHANGE_THRESHOLD
+        self.stock_alert_threshold = settings.STOCK_ALERT_THRESHOLD
+
+    async def ensure_indexes(self):
+        """Create the indexes backing the due-time queue and staleness checks"""
+        await self.product_collection.create_index("next_sync_at")
+        await self.product_collection.create_index("last_sync")
+
+    def _due_query(self, now: datetime) -> Dict:
+        # Products that have never been scheduled have no next_sync_at and are due immediately
+        return {"next_sync_at": {"$not": {"$gt": now}}}
+
+    async def get_due_products(self, limit: Optional[int] = None, query: Optional[Dict] = None) -> List[Dict]:
+        """Get the most overdue products, oldest first"""
+        limit = limit or self.batch_size
+        due_query = self._due_query(datetime.utcnow())
+        if query:
+            due_query = {"$and": [due_query, query]}
+        return await self.product_collection.find(due_query).sort(
+            "next_sync_at", 1
+        ).limit(limit).to_list(limit)
+
+    async def count_due_products(self) -> int:
+        """Count products currently waiting to be synced"""
+        return await self.product_collection.count_documents(self._due_query(datetime.utcnow()))
+
+    async def seconds_until_next_due(self) -> Optional[float]:
+        """Seconds until the next product becomes due, or None if nothing is scheduled"""
+        product = await self.product_collection.find_one(
+            {}, {"next_sync_at": 1}, sort=[("next_sync_at", 1)]
+        )
+        if not product:
+            return None
+        next_sync_at = product.get("next_sync_at")
+        if next_sync_at is None:
+            return 0.0
+        return max((next_sync_at - datetime.utcnow()).total_seconds(), 0.0)
+
+    async def stalest_product_age(self) -> Optional[float]:
+        """Seconds since the least recently synced product was synced"""
+        product = await self.product_collection.find_one(
+            {"last_sync": {"$exists": True}}, {"last_sync": 1}, sort=[("last_sync", 1)]
+        )
+        if not product:
+            return None
+        return (datetime.utcnow() - product["last_sync"]).total_seconds()
+
+    async def get_sales_velocity(self, product_ids: List) -> Dict[str, float]:
+        """Get units sold per day for each product over the velocity window"""
+        if not product_ids:
+            return {}
+        ids = [str(product_id) for product_id in product_ids]
+        since = datetime.utcnow() - timedelta(days=self.velocity_window_days)
+        pipeline = [
+            {"$match": {"created_at": {"$gte": since}, "items.product_id": {"$in": ids}}},
+            {"$unwind": "$items"},
+            {"$match": {"items.product_id": {"$in": ids}}},
+            {"$group": {"_id": "$items.product_id", "units": {"$sum": "$items.quantity"}}}
+        ]
+        results = await self.order_collection.aggregate(pipeline).to_list(None)
+        return {r["_id"]: r["units"] / self.velocity_window_days for r in results}
+
+    def compute_interval(self, sales_velocity: float, price_volatility: float, stock: int) -> float:
+        """Compute a product's sync interval in minutes
+
+        Fast sellers, volatile prices and low stock pull the interval towards
+        ``SYNC_MIN_INTERVAL_MINUTES``; products with no sales and stable prices
+        drift out to ``SYNC_MAX_INTERVAL_MINUTES``.
+        """
+        interval = float(self.base_interval)
+        interval /= 1 + sales_velocity / self.velocity_reference
+        interval /= 1 + price_volatility / self.price_change_threshold
+        if stock <= self.stock_alert_threshold:
+            interval /= 2
+        if sales_velocity == 0 and price_volatility < self.price_change_threshold:
+            interval *= 4
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def schedule(self, product: Dict, price_change: float, stock: int,
+                 sales_velocity: Optional[float] = None) -> Dict:
+        """Build the scheduling fields to store on a product after a sync"""
+        if sales_velocity is None:
+            sales_velocity = product.get("sales_velocity", 0.0)
+        # Exponentially decay past price moves so one spike does not pin a product hot forever
+        price_volatility = 0.5 * product.get("price_volatility", 0.0) + 0.5 * price_change
+        interval = self.compute_interval(sales_velocity, price_volatility, stock)
+        return {
+            "sales_velocity": sales_velocity,
+            "price_volatility": price_volatility,
+            "sync_interval_minutes": interval,
+            "next_sync_at": datetime.utcnow() + timedelta(minutes=interval)
+        }
+
+    def retry_later(self, minutes: Optional[float] = None) -> Dict:
+        """Scheduling fields for a product whose sync failed or was skipped"""
+        return {"next_sync_at": datetime.utcnow() + timedelta(minutes=minutes or self.min_interval)}
@@ -0,0 +1,112 @@
+from typing import Dict, Optional
+import asyncio
+import os
+import socket
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from app.core.config import settings
+
+class LeaseLost(Exception):
+    """Raised when a worker finds its shard lease has passed to another worker"""
+
+class SyncShardCoordinator:
+    """Leases hash-range shards of the product catalog to sync workers.
+
+    Every product is assigned ``sync_shard = crc32(_id) % SYNC_SHARD_COUNT``.
+    A worker claims one shard at a time through a lease document in
+    ``sync_leases``; leases carry an expiry that the worker heartbeats, and a
+    fencing ``token`` that is bumped on every claim so a worker that lost its
+    lease cannot renew or release someone else's. Leases of dead workers
+    simply expire and are picked up by the next claim.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, worker_id: Optional[str] = None):
+        self.lease_collection = db.sync_leases
+        self.product_collection = db.products
+        self.shard_count = settings.SYNC_SHARD_COUNT
+        self.lease_seconds = settings.SYNC_LEASE_SECONDS
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @staticmethod
+    def shard_for(product_id, shard_count: int) -> int:
+        """Stable shard number for a product ID"""
+        return zlib.crc32(str(product_id).encode()) % shard_count
+
+    async def ensure_shards(self):
+        """Create lease documents and indexes for every shard"""
+        await self.lease_collection.bulk_write([
+            UpdateOne(
+                {"_id": shard},
+                {"$setOnInsert": {"owner": None, "expires_at": datetime.min, "token": 0}},
+                upsert=True
+            )
+            for shard in range(self.shard_count)
+        ], ordered=False)
+        await self.lease_collection.create_index([("owner", 1), ("expires_at", 1)])
+        await self.product_collection.create_index([("sync_shard", 1), ("next_sync_at", 1)])
+
+    async def assign_missing_shards(self, batch_size: int = 1000) -> int:
+        """Assign a shard to products that do not have one yet"""
+        assigned = 0
+        while True:
+            products = await self.product_collection.find(
+                {"sync_shard": {"$exists": False}}, {"_id": 1}
+            ).limit(batch_size).to_list(batch_size)
+            if not products:
+                return assigned
+            await self.product_collection.bulk_write([
+                UpdateOne(
+                    {"_id": product["_id"]},
+                    {"$set": {"sync_shard": self.shard_for(product["_id"], self.shard_count)}}
+                )
+                for product in products
+            ], ordered=False)
+            assigned += len(products)
+
+    async def claim_shard(self) -> Optional[Dict]:
+        """Claim the least recently processed free or expired shard"""
+        now = datetime.utcnow()
+        return await self.lease_collection.find_one_and_update(
+            {"$or": [{"owner": None}, {"expires_at": {"$lt": now}}]},
+            {
+                "$set": {
+                    "owner": self.worker_id,
+                    "claimed_at": now,
+                    "heartbeat_at": now,
+                    "expires_at": now + timedelta(seconds=self.lease_seconds)
+                },
+                "$inc": {"token": 1}
+            },
+            sort=[("expires_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def renew(self, lease: Dict) -> bool:
+        """Extend a lease, returning False if it was lost to another worker"""
+        now = datetime.utcnow()
+        result = await self.lease_collection.update_one(
+            {"_id": lease["_id"], "owner": self.worker_id, "token": lease["token"]},
+            {"$set": {
+                "heartbeat_at": now,
+                "expires_at": now + timedelta(seconds=self.lease_seconds)
+            }}
+        )
+        # A renew within the same millisecond writes identical values and modifies nothing
+        return result.matched_count == 1
+
+    async def heartbeat(self, lease: Dict):
+        """Renew a lease until cancelled; returns when the lease is lost"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.renew(lease):
+                return
+
+    async def release(self, lease: Dict):
+        """Hand a shard back so any worker can claim it"""
+        await self.lease_collection.update_one(
+            {"_id": lease["_id"], "owner": self.worker_id, "token": lease["token"]},
+            {"$set": {"owner": None, "expires_at": datetime.utcnow()}}
+        )
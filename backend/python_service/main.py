@@ -1,7 +1,9 @@
 from fastapi import FastAPI, HTTPException
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from typing import List, Dict, Any
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import requests
 from datetime import datetime
@@ -45,6 +47,169 @@ async def sync_supplier_products(supplier_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Supplier order consolidation
+CONSOLIDATION_WINDOW_SECONDS = float(os.getenv("CONSOLIDATION_WINDOW_SECONDS", "2"))
+CONSOLIDATION_MAX_BATCH = int(os.getenv("CONSOLIDATION_MAX_BATCH", "50"))
+SUPPLIER_REQUEST_WORKERS = int(os.getenv("SUPPLIER_REQUEST_WORKERS", "16"))
+SUPPLIER_REQUEST_TIMEOUT = float(os.getenv("SUPPLIER_REQUEST_TIMEOUT", "30"))
+
+class PlacedNotRecorded(Exception):
+    """The supplier accepted an order but marking it fulfilled failed; do not place it again"""
+
+    def __init__(self, result: Dict[str, Any], cause: Exception):
+        super().__init__(f"Order placed with supplier but not recorded: {cause}")
+        self.result = result
+
+class OrderConsolidator:
+    """Buffers supplier orders and places each supplier's buffer in one go.
+
+    Orders for a supplier collect until CONSOLIDATION_MAX_BATCH are waiting
+    or CONSOLIDATION_WINDOW_SECONDS have passed since the first one arrived.
+    A supplier with ``bulk_orders`` set gets the whole buffer in one POST to
+    ``{api_url}/orders/bulk``; any other supplier gets one POST per order,
+    sent concurrently from a thread pool. Fulfilled orders are then marked
+    with a single bulk write, and every caller gets its own result back;
+    if that write fails, callers whose order the supplier accepted get
+    ``PlacedNotRecorded`` rather than a plain failure. An order submitted
+    again while it is still buffered or being placed shares the first
+    submission's result instead of being placed twice.
+    """
+
+    def __init__(self, window_seconds: float, max_batch: int, workers: int):
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.buffers: Dict[Any, List[Dict[str, Any]]] = {}
+        self.suppliers: Dict[Any, Dict[str, Any]] = {}
+        self.timers: Dict[Any, asyncio.TimerHandle] = {}
+        self.placing = set()
+        # Order ID -> future of its buffered or in-flight placement
+        self.pending: Dict[Any, asyncio.Future] = {}
+
+    async def submit(self, supplier: Dict[str, Any], order_id: Any, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue one order and wait until its supplier batch has been placed"""
+        if order_id in self.pending:
+            return await asyncio.shield(self.pending[order_id])
+        loop = asyncio.get_running_loop()
+        supplier_id = supplier["_id"]
+        entry = {"order_id": order_id, "payload": payload, "future": loop.create_future()}
+        self.pending[order_id] = entry["future"]
+        entry["future"].add_done_callback(lambda _: self.pending.pop(order_id, None))
+        buffer = self.buffers.setdefault(supplier_id, [])
+        buffer.append(entry)
+        self.suppliers[supplier_id] = supplier
+        if len(buffer) >= self.max_batch:
+            self._flush(supplier_id)
+        elif len(buffer) == 1:
+            self.timers[supplier_id] = loop.call_later(self.window_seconds, self._flush, supplier_id)
+        # Shielded so one caller going away does not cancel a placement others wait on
+        return await asyncio.shield(entry["future"])
+
+    def _flush(self, supplier_id: Any) -> asyncio.Task:
+        timer = self.timers.pop(supplier_id, None)
+        if timer is not None:
+            timer.cancel()
+        task = asyncio.ensure_future(self._place(self.suppliers.pop(supplier_id), self.buffers.pop(supplier_id)))
+        self.placing.add(task)
+        task.add_done_callback(self.placing.discard)
+        return task
+
+    async def flush_all(self):
+        """Place everything still buffered and wait for batches in flight, e.g. on shutdown"""
+        for supplier_id in list(self.buffers):
+            self._flush(supplier_id)
+        await asyncio.gather(*self.placing, return_exceptions=True)
+
+    async def _place(self, supplier: Dict[str, Any], entries: List[Dict[str, Any]]):
+        """Place a batch and resolve every caller's future, whatever goes wrong on the way"""
+        loop = asyncio.get_running_loop()
+        results: List[Any] = []
+        recorded = False
+        error: Exception = Exception("Failed to place order with supplier")
+        try:
+            if supplier.get("bulk_orders"):
+                try:
+                    results = await loop.run_in_executor(self.executor, self._post_bulk, supplier, entries)
+                except Exception as e:
+                    results = [e] * len(entries)
+            else:
+                results = await asyncio.gather(*[
+                    loop.run_in_executor(self.executor, self._post_one, supplier, entry)
+                    for entry in entries
+                ], return_exceptions=True)
+
+            now = datetime.utcnow()
+            updates = [
+                UpdateOne(
+                    {"_id": entry["order_id"]},
+                    {"$set": {
+                        "status": "fulfilled",
+                        "fulfillment_date": now,
+                        "tracking_number": result["tracking_number"]
+                    }}
+                )
+                for entry, result in zip(entries, results)
+                if not isinstance(result, Exception)
+            ]
+            if updates:
+                await loop.run_in_executor(self.executor, lambda: db.orders.bulk_write(updates, ordered=False))
+            recorded = True
+        except Exception as e:
+            error = e
+        finally:
+            for index, entry in enumerate(entries):
+                if entry["future"].done():
+                    continue
+                result = results[index] if index < len(results) else error
+                if isinstance(result, Exception):
+                    entry["future"].set_exception(result)
+                elif not recorded:
+                    # The supplier has the order; only our record of it is missing
+                    entry["future"].set_exception(PlacedNotRecorded(result, error))
+                else:
+                    entry["future"].set_result(result)
+
+    def _post_one(self, supplier: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+        response = requests.post(
+            f"{supplier['api_url']}/orders", json=entry["payload"], timeout=SUPPLIER_REQUEST_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise Exception("Failed to place order with supplier")
+        result = response.json()
+        if not isinstance(result, dict) or not result.get("tracking_number"):
+            raise Exception("Supplier response has no tracking number")
+        return result
+
+    def _post_bulk(self, supplier: Dict[str, Any], entries: List[Dict[str, Any]]) -> List[Any]:
+        """One request for the whole batch; the response lists one result per order, in order"""
+        response = requests.post(
+            f"{supplier['api_url']}/orders/bulk",
+            json={"orders": [entry["payload"] for entry in entries]},
+            timeout=SUPPLIER_REQUEST_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise Exception("Failed to place orders with supplier")
+        results = response.json()["orders"]
+        if len(results) != len(entries):
+            raise Exception("Supplier returned a different number of orders")
+        return [self._check_result(result) for result in results]
+
+    @staticmethod
+    def _check_result(result: Any) -> Any:
+        """A bulk result line, or the exception standing in for a rejected one"""
+        if not isinstance(result, dict):
+            return Exception("Supplier response has no tracking number")
+        if not result.get("tracking_number"):
+            return Exception(result.get("error", "Supplier rejected order"))
+        return result
+
+consolidator = OrderConsolidator(CONSOLIDATION_WINDOW_SECONDS, CONSOLIDATION_MAX_BATCH, SUPPLIER_REQUEST_WORKERS)
+
+@app.on_event("shutdown")
+async def flush_supplier_orders():
+    await consolidator.flush_all()
+    consolidator.executor.shutdown(wait=True)
+
 # Order fulfillment
 @app.post("/api/order/fulfill")
 async def fulfill_order(order_id: str):
@@ -53,6 +218,8 @@ async def fulfill_order(order_id: str):
         order = db.orders.find_one({"_id": order_id})
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
+        if order.get("status") == "fulfilled":
+            return {"message": "Order already fulfilled", "tracking_number": order.get("tracking_number")}
 
         # Get product details
         product = db.products.find_one({"_id": order["product_id"]})
@@ -64,30 +231,24 @@ async def fulfill_order(order_id: str):
         if not supplier:
             raise HTTPException(status_code=404, detail="Supplier not found")
 
-        # Place order with supplier
-        response = requests.post(
-            f"{supplier['api_url']}/orders",
-            json={
+        # Place order with supplier, batched with other orders for the same supplier
+        try:
+            result = await consolidator.submit(supplier, order_id, {
                 "product_id": product["supplier_product_id"],
                 "quantity": order["quantity"],
                 "shipping_address": order["shipping_address"]
+            })
+        except PlacedNotRecorded as e:
+            # Retrying would order twice; hand back what the supplier returned
+            return {
+                "message": "Order placed with supplier but not recorded",
+                "tracking_number": e.result["tracking_number"],
+                "recorded": False
             }
-        )
-
-        if response.status_code != 200:
+        except Exception:
             raise HTTPException(status_code=500, detail="Failed to place order with supplier")
 
-        # Update order status
-        db.orders.update_one(
-            {"_id": order_id},
-            {"$set": {
-                "status": "fulfilled",
-                "fulfillment_date": datetime.utcnow(),
-                "tracking_number": response.json()["tracking_number"]
-            }}
-        )
-
-        return {"message": "Order fulfilled successfully"}
+        return {"message": "Order fulfilled successfully", "tracking_number": result["tracking_number"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
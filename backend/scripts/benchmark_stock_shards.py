@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+import time
+from app.db import get_database
+from services.inventory_service import InventoryService
+
+async def run_reservations(service: InventoryService, product_id: str, reservations: int, concurrency: int) -> float:
+    """Fire single-unit reservations at a product and return reservations per second"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def reserve():
+        async with semaphore:
+            await service.reserve_stock(product_id, 1)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[reserve() for _ in range(reservations)])
+    return reservations / (time.perf_counter() - started)
+
+async def benchmark(reservations: int, concurrency: int, shards: int):
+    """Compare single-document stock updates with sharded counters"""
+    db = await get_database()
+    service = InventoryService(db)
+    await service.initialize()
+    product_ids = []
+    try:
+        for name in ("single", "sharded"):
+            result = await db.products.insert_one({
+                "name": f"stock-benchmark-{name}",
+                "stock": reservations,
+                "reserved_stock": 0
+            })
+            product_ids.append(str(result.inserted_id))
+        await service.shard_product(product_ids[1], shards)
+
+        single = await run_reservations(service, product_ids[0], reservations, concurrency)
+        sharded = await run_reservations(service, product_ids[1], reservations, concurrency)
+        print(f"single document:  {single:10.1f} reservations/sec")
+        print(f"{shards:>3} shards:       {sharded:10.1f} reservations/sec ({sharded / single:.2f}x)")
+    finally:
+        for product_id in product_ids[1:]:
+            await service.stock_shards.unshard_product(product_id)
+        for product_id in product_ids:
+            await db.products.delete_one({"_id": service._product_key(product_id)})
+            await db.inventory_history.delete_many({"product_id": product_id})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sharded stock counters against single-document updates")
+    parser.add_argument("--reservations", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--shards", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.reservations, args.concurrency, args.shards))
@@ -0,0 +1,15 @@
+import argparse
+import asyncio
+from app.db import get_database
+from app.services.fulfillment_worker import FulfillmentWorker
+
+async def run_worker(worker_id: str = None):
+    """Run a single batch fulfillment worker; start as many as the backlog needs"""
+    db = await get_database()
+    await FulfillmentWorker(db, worker_id).run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Place supplier orders for paid orders in leased batches")
+    parser.add_argument("--worker-id", default=None, help="Stable worker name (defaults to host:pid)")
+    args = parser.parse_args()
+    asyncio.run(run_worker(args.worker_id))
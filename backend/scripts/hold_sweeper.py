@@ -0,0 +1,11 @@
+import asyncio
+from app.db import get_database
+from services.inventory_service import InventoryService
+
+async def run_sweeper():
+    """Release expired stock reservation holds until stopped"""
+    db = await get_database()
+    await InventoryService(db).run_hold_sweeper()
+
+if __name__ == "__main__":
+    asyncio.run(run_sweeper())
@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+from app.db import get_database
+from services.inventory_history import InventoryHistory
+
+async def migrate(batch_size: int):
+    """Copy inventory_transactions rows into inventory_history buckets
+
+    Resumable: progress is the last copied ``_id``, stored in ``migrations``.
+    Rows keep their ``_id``; after a crash, rows of the next batch that were
+    already copied are skipped, so re-running never duplicates history.
+    """
+    db = await get_database()
+    history = InventoryHistory(db)
+    await history.ensure_indexes()
+    state = await db.migrations.find_one({"_id": "inventory_history"}) or {}
+    last_id = state.get("last_id")
+    resumed = last_id is not None
+    copied = 0
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        rows = await db.inventory_transactions.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not rows:
+            break
+        if resumed:
+            # The previous run may have copied this batch without recording its progress
+            ids = [row["_id"] for row in rows]
+            done = set()
+            async for bucket in db.inventory_history.find(
+                {"migrated": True, "transactions._id": {"$in": ids}}, {"transactions._id": 1}
+            ):
+                done.update(entry["_id"] for entry in bucket["transactions"])
+            rows = [row for row in rows if row["_id"] not in done]
+            last_id = ids[-1]
+            resumed = False
+        else:
+            last_id = rows[-1]["_id"]
+        await history.record([
+            {
+                "_id": row["_id"],
+                "product_id": row["product_id"],
+                "quantity": row["quantity"],
+                "type": row["type"],
+                "status": row["status"],
+                "created_at": row["created_at"]
+            }
+            for row in rows
+        ], migrated=True)
+        await db.migrations.update_one(
+            {"_id": "inventory_history"}, {"$set": {"last_id": last_id}}, upsert=True
+        )
+        copied += len(rows)
+    print(f"Copied {copied} inventory transactions into inventory_history")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move inventory_transactions into daily history buckets")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size))
@@ -0,0 +1,11 @@
+import asyncio
+from app.db import get_database
+from services.orderService import OrderService
+
+async def run_relay():
+    """Deliver order outbox entries until stopped"""
+    db = await get_database()
+    await OrderService(db).run_outbox_relay()
+
+if __name__ == "__main__":
+    asyncio.run(run_relay())
@@ -0,0 +1,11 @@
+import asyncio
+from app.db import get_database
+from app.services.stock_alerts import StockAlerts
+
+async def rebuild():
+    """Recompute every low-stock alert from the products collection"""
+    db = await get_database()
+    await StockAlerts(db).rebuild()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
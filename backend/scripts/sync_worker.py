@@ -0,0 +1,15 @@
+import argparse
+import asyncio
+from app.db import get_database
+from app.services.supplier_sync import SupplierSyncService
+
+async def run_worker(worker_id: str = None):
+    """Run a single sharded supplier sync worker"""
+    db = await get_database()
+    await SupplierSyncService(db).run_sync_worker(worker_id)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a sharded supplier sync worker")
+    parser.add_argument("--worker-id", default=None, help="Stable worker name (defaults to host:pid)")
+    args = parser.parse_args()
+    asyncio.run(run_worker(args.worker_id))
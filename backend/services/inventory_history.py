@@ -0,0 +1,142 @@
+from typing import Any, Dict, Iterable, List, Optional
+import base64
+from datetime import datetime
+from bson import ObjectId, json_util
+from pymongo import UpdateOne
+from app.core.config import settings
+
+_indexes_ready = False
+
+def encode_history_cursor(bucket: Dict[str, Any], index: int) -> str:
+    raw = json_util.dumps({"t": bucket["created_at"], "b": bucket["_id"], "i": index})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(token: str) -> Dict[str, Any]:
+    try:
+        cursor = json_util.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except Exception:
+        raise ValueError("Invalid history cursor")
+    if not isinstance(cursor, dict) or not {"t", "b", "i"} <= cursor.keys():
+        raise ValueError("Invalid history cursor")
+    return cursor
+
+class InventoryHistory:
+    """Inventory transactions stored in per-product, per-day buckets.
+
+    Each ``inventory_history`` document holds up to ``INVENTORY_HISTORY_BUCKET_SIZE``
+    transactions for one product and day, plus running ``count``, ``net``,
+    ``received`` and ``removed`` totals. A full bucket simply stops matching
+    the upsert filter, so the next write opens a new bucket for that day.
+    ``created_at``/``last_at`` bound the transactions inside a bucket and back
+    the range queries. Rows copied from the old ``inventory_transactions``
+    collection live in separate ``migrated`` buckets, so they never
+    interleave with live writes on the cutover day.
+    """
+
+    def __init__(self, db):
+        self.collection = db.inventory_history
+        self.bucket_size = settings.INVENTORY_HISTORY_BUCKET_SIZE
+
+    async def ensure_indexes(self):
+        global _indexes_ready
+        if _indexes_ready:
+            return
+        await self.collection.create_index([("product_id", 1), ("created_at", -1), ("_id", -1)])
+        await self.collection.create_index([("product_id", 1), ("day", 1), ("count", 1)])
+        _indexes_ready = True
+
+    async def record(self, transactions: Iterable[Dict[str, Any]], migrated: bool = False):
+        """Append transactions (``product_id``, ``quantity``, ``type``, ``status``, ``created_at``)
+
+        Each entry keeps the transaction's ``_id``, or gets a new one.
+        """
+        operations = []
+        for transaction in transactions:
+            created_at = transaction["created_at"]
+            quantity = transaction["quantity"]
+            entry = {k: v for k, v in transaction.items() if k != "product_id"}
+            entry.setdefault("_id", ObjectId())
+            operations.append(UpdateOne(
+                {
+                    "product_id": transaction["product_id"],
+                    "day": datetime(created_at.year, created_at.month, created_at.day),
+                    "count": {"$lt": self.bucket_size},
+                    "migrated": True if migrated else {"$exists": False}
+                },
+                {
+                    "$push": {"transactions": entry},
+                    "$inc": {
+                        "count": 1,
+                        "net": quantity,
+                        "received": max(quantity, 0),
+                        "removed": max(-quantity, 0)
+                    },
+                    "$min": {"created_at": created_at},
+                    "$max": {"last_at": created_at}
+                },
+                upsert=True
+            ))
+        if operations:
+            await self.ensure_indexes()
+            # Ordered, so entries land in each bucket in the order they were given
+            await self.collection.bulk_write(operations)
+
+    async def page(self, product_id: str, start_date: Optional[datetime] = None,
+                   end_date: Optional[datetime] = None, after: Optional[str] = None,
+                   limit: int = 100) -> Dict[str, Any]:
+        """Get up to ``limit`` transactions, newest first, within ``[start_date, end_date]``"""
+        query: Dict[str, Any] = {"product_id": product_id}
+        if start_date:
+            query["last_at"] = {"$gte": start_date}
+        if end_date:
+            query["created_at"] = {"$lte": end_date}
+        position = None
+        if after is not None:
+            position = decode_history_cursor(after)
+            query["$or"] = [
+                {"created_at": {"$lt": position["t"]}},
+                {"created_at": position["t"], "_id": {"$lte": position["b"]}}
+            ]
+
+        transactions: List[Dict[str, Any]] = []
+        next_after = None
+        cursor = self.collection.find(query).sort([("created_at", -1), ("_id", -1)]).batch_size(4)
+        async for bucket in cursor:
+            entries = bucket["transactions"]
+            end = position["i"] if position and bucket["_id"] == position["b"] else len(entries)
+            for index in range(end - 1, -1, -1):
+                entry = entries[index]
+                if (start_date and entry["created_at"] < start_date) or (end_date and entry["created_at"] > end_date):
+                    continue
+                if len(transactions) == limit:
+                    next_after = encode_history_cursor(bucket, index + 1)
+                    break
+                transactions.append(entry)
+            if next_after:
+                break
+        await cursor.close()
+        return {"transactions": transactions, "next_after": next_after}
+
+    async def daily_summary(self, product_id: str, start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Net movement per day, summed from the bucket counters; covers whole days"""
+        match: Dict[str, Any] = {"product_id": product_id}
+        day_range = {}
+        if start_date:
+            day_range["$gte"] = datetime(start_date.year, start_date.month, start_date.day)
+        if end_date:
+            day_range["$lte"] = end_date
+        if day_range:
+            match["day"] = day_range
+        return await self.collection.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": "$day",
+                "transactions": {"$sum": "$count"},
+                "net": {"$sum": "$net"},
+                "received": {"$sum": "$received"},
+                "removed": {"$sum": "$removed"}
+            }},
+            {"$sort": {"_id": 1}},
+            {"$project": {"_id": 0, "day": "$_id", "transactions": 1, "net": 1, "received": 1, "removed": 1}}
+        ]).to_list(None)
@@ -1,149 +1,546 @@
-from typing import Dict, Any
-from app.models import Product, InventoryTransaction
+from typing import Dict, Any, List, Optional
+import asyncio
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from app.core.config import settings
+from app.db.mongodb import get_database
+from app.monitoring import log_error, STOCK_HOLDS_OUTSTANDING, STOCK_HOLDS_RELEASED
+from app.services.stock_alerts import StockAlerts
+from services.inventory_history import InventoryHistory
+from services.stock_holds import StockHolds
+from services.stock_shards import StockShards
 from datetime import datetime
 
 class InventoryService:
-    async def reserve_stock(self, product_id: str, quantity: int) -> Dict[str, Any]:
-        """Reserve stock for an order"""
-        product = await Product.get(product_id)
+    def __init__(self, db=None):
+        self.db = db
+
+    async def initialize(self):
+        """Initialize the database connection if not already initialized"""
+        if self.db is None:
+            self.db = await get_database()
+        self.products = self.db.products
+        self.history = InventoryHistory(self.db)
+        self.stock_shards = StockShards(self.db)
+        self.stock_holds = StockHolds(self.db)
+        self.stock_alerts = StockAlerts(self.db)
+
+    @staticmethod
+    def _product_key(product_id):
+        return ObjectId(product_id) if ObjectId.is_valid(product_id) else product_id
+
+    async def _check_failure(self, product_id: str, reason: str):
+        """Explain a failed conditional update; only runs on the failure path
+
+        Returns normally when the product turns out to have been sharded by
+        another process, so the caller can retry against its shards.
+        """
+        product = await self.products.find_one(
+            {"_id": self._product_key(product_id)}, {"stock_shard_count": 1}
+        )
         if not product:
             raise ValueError("Product not found")
+        if not product.get("stock_shard_count"):
+            raise ValueError(reason)
+        self.stock_shards.remember(product_id, product["stock_shard_count"])
 
-        if product.stock < quantity:
-            raise ValueError("Insufficient stock")
+    async def _sharded_totals(self, product_id: str) -> Dict[str, Any]:
+        """Summed shard counters in the same shape as a product document"""
+        key = self._product_key(product_id)
+        if not await self.stock_shards.shard_count(product_id):
+            # Unsharded since the caller looked; the product document holds the counts again
+            return await self.products.find_one({"_id": key}, {"stock": 1, "reserved_stock": 1, "reorder_point": 1})
+        totals = await self.stock_shards.available(product_id)
+        product = await self.products.find_one({"_id": key}, {"reorder_point": 1}) or {}
+        return {"_id": key, **totals, "reorder_point": product.get("reorder_point")}
 
-        # Create inventory transaction
-        transaction = InventoryTransaction(
-            product_id=product_id,
-            quantity=-quantity,  # Negative for outgoing
-            type="reservation",
-            status="pending",
-            created_at=datetime.utcnow()
-        )
-        await transaction.save()
+    def _transaction(self, product_id: str, quantity: int, type: str, status: str) -> Dict[str, Any]:
+        return {
+            "product_id": product_id,
+            "quantity": quantity,
+            "type": type,
+            "status": status,
+            "created_at": datetime.utcnow()
+        }
 
-        # Update product stock
-        product.stock -= quantity
-        product.reserved_stock += quantity
-        await product.save()
+    async def reserve_stock(self, product_id: str, quantity: int, order_id: Optional[str] = None,
+                            hold_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Reserve stock for an order
 
+        The availability check and the decrement are one conditional update,
+        so concurrent checkouts can never take the same units twice. Products
+        split with ``shard_product`` are reserved against their stock shards.
+        The reservation is held until ``commit_hold`` or ``release_hold``, or
+        until the sweeper releases it after ``STOCK_HOLD_SECONDS``.
+        """
+        await self.initialize()
+        product = await self._reserve(product_id, quantity)
+        hold = self.stock_holds.build(product_id, quantity, order_id, hold_seconds)
+        await self.stock_holds.insert([hold])
+        await self.history.record([
+            self._transaction(product_id, -quantity, "reservation", "pending")  # Negative for outgoing
+        ])
         return {
             "status": "success",
             "product_id": product_id,
+            "hold_id": str(hold["_id"]),
+            "expires_at": hold["expires_at"],
             "reserved_quantity": quantity,
-            "remaining_stock": product.stock
+            "remaining_stock": product["stock"]
         }
 
-    async def release_stock(self, product_id: str, quantity: int) -> Dict[str, Any]:
-        """Release reserved stock"""
-        product = await Product.get(product_id)
-        if not product:
-            raise ValueError("Product not found")
+    async def reserve_items(self, items: List[Dict[str, Any]], order_id: Optional[str] = None,
+                            hold_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Reserve stock for several products, all or nothing
 
-        if product.reserved_stock < quantity:
-            raise ValueError("Insufficient reserved stock")
+        Each product is reserved with its own atomic update, concurrently. If
+        any of them fails, the ones that succeeded are released again before
+        the error is raised.
+        """
+        await self.initialize()
+        quantities: Dict[str, int] = {}
+        for item in items:
+            product_id = str(item["product_id"])
+            quantities[product_id] = quantities.get(product_id, 0) + item["quantity"]
 
-        # Create inventory transaction
-        transaction = InventoryTransaction(
-            product_id=product_id,
-            quantity=quantity,  # Positive for incoming
-            type="release",
-            status="completed",
-            created_at=datetime.utcnow()
+        product_ids = list(quantities)
+        results = await asyncio.gather(
+            *[self._reserve(product_id, quantities[product_id]) for product_id in product_ids],
+            return_exceptions=True
         )
-        await transaction.save()
+        failures = [
+            (product_id, result) for product_id, result in zip(product_ids, results)
+            if isinstance(result, BaseException)
+        ]
+        if failures:
+            # Compensate: hand back everything this call managed to reserve
+            reserved = [
+                product_id for product_id, result in zip(product_ids, results)
+                if not isinstance(result, BaseException)
+            ]
+            await asyncio.gather(*[self._release(product_id, quantities[product_id]) for product_id in reserved])
+            product_id, error = failures[0]
+            if not isinstance(error, ValueError):
+                raise error
+            raise ValueError(f"{error} for product {product_id}")
+
+        holds = [
+            self.stock_holds.build(product_id, quantities[product_id], order_id, hold_seconds)
+            for product_id in product_ids
+        ]
+        await self.stock_holds.insert(holds)
+        await self.history.record([
+            self._transaction(product_id, -quantity, "reservation", "pending")
+            for product_id, quantity in quantities.items()
+        ])
+        return {
+            "status": "success",
+            "items": [
+                {
+                    "product_id": product_id,
+                    "hold_id": str(hold["_id"]),
+                    "reserved_quantity": quantities[product_id],
+                    "remaining_stock": product["stock"]
+                }
+                for product_id, product, hold in zip(product_ids, results, holds)
+            ]
+        }
 
-        # Update product stock
-        product.stock += quantity
-        product.reserved_stock -= quantity
-        await product.save()
+    async def _reserve(self, product_id: str, quantity: int) -> Dict[str, Any]:
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        if await self.stock_shards.shard_count(product_id):
+            await self.stock_shards.move(product_id, quantity, "stock", "reserved_stock", "Insufficient stock")
+            product = await self._sharded_totals(product_id)
+        else:
+            product = await self.products.find_one_and_update(
+                {"_id": self._product_key(product_id), "stock": {"$gte": quantity}},
+                {"$inc": {"stock": -quantity, "reserved_stock": quantity}},
+                projection={"stock": 1, "reserved_stock": 1, "reorder_point": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if product is None:
+                await self._check_failure(product_id, "Insufficient stock")
+                return await self._reserve(product_id, quantity)
+        await self.stock_alerts.apply_if_crossed(product, -quantity)
+        return product
 
+    async def _release(self, product_id: str, quantity: int) -> Dict[str, Any]:
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        if await self.stock_shards.shard_count(product_id):
+            await self.stock_shards.move(product_id, quantity, "reserved_stock", "stock", "Insufficient reserved stock")
+            product = await self._sharded_totals(product_id)
+        else:
+            product = await self.products.find_one_and_update(
+                {"_id": self._product_key(product_id), "reserved_stock": {"$gte": quantity}},
+                {"$inc": {"stock": quantity, "reserved_stock": -quantity}},
+                projection={"stock": 1, "reserved_stock": 1, "reorder_point": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if product is None:
+                await self._check_failure(product_id, "Insufficient reserved stock")
+                return await self._release(product_id, quantity)
+        await self.stock_alerts.apply_if_crossed(product, quantity)
+        return product
+
+    async def release_stock(self, product_id: str, quantity: int) -> Dict[str, Any]:
+        """Release reserved stock"""
+        await self.initialize()
+        product = await self._release(product_id, quantity)
+        await self.history.record([
+            self._transaction(product_id, quantity, "release", "completed")  # Positive for incoming
+        ])
         return {
             "status": "success",
             "product_id": product_id,
             "released_quantity": quantity,
-            "current_stock": product.stock
+            "current_stock": product["stock"]
         }
 
-    async def update_stock(self, product_id: str, quantity: int, type: str = "adjustment") -> Dict[str, Any]:
-        """Update stock levels (for receiving new inventory)"""
-        product = await Product.get(product_id)
-        if not product:
-            raise ValueError("Product not found")
+    async def release_hold(self, hold_id: str) -> Dict[str, Any]:
+        """Give a held reservation back to available stock"""
+        await self.initialize()
+        hold = await self.stock_holds.close(hold_id, "released")
+        if not hold:
+            raise ValueError("Hold not found or already closed")
+        result = await self.release_stock(hold["product_id"], hold["quantity"])
+        STOCK_HOLDS_RELEASED.labels(reason="released").inc()
+        return {**result, "hold_id": hold_id}
+
+    async def commit_hold(self, hold_id: str) -> Dict[str, Any]:
+        """Turn a held reservation into a sale, consuming the reserved units"""
+        await self.initialize()
+        hold = await self.stock_holds.close(hold_id, "committed")
+        if not hold:
+            raise ValueError("Hold not found or already closed")
+        product_id, quantity = hold["product_id"], hold["quantity"]
+        await self._consume_reserved(product_id, quantity)
+        await self.history.record([self._transaction(product_id, -quantity, "sale", "completed")])
+        return {"status": "success", "hold_id": hold_id, "product_id": product_id, "committed_quantity": quantity}
+
+    async def commit_holds(self, hold_ids: List[str], session=None) -> List[Dict[str, Any]]:
+        """Commit several holds at once, all or nothing
+
+        Pass ``session`` to make the commit part of a caller's transaction;
+        the history is left to the caller via ``record_sales`` so it is only
+        written once that transaction has committed.
+        """
+        await self.initialize()
+        holds = await self.stock_holds.close_many(hold_ids, "committed", session=session)
+        for hold in holds:
+            await self._consume_reserved(hold["product_id"], hold["quantity"], session=session)
+        return holds
+
+    async def _consume_reserved(self, product_id: str, quantity: int, session=None):
+        """Drop sold units from reserved stock, on the product or on its shards
 
-        # Create inventory transaction
-        transaction = InventoryTransaction(
-            product_id=product_id,
-            quantity=quantity,
-            type=type,
-            status="completed",
-            created_at=datetime.utcnow()
+        The product write only matches while the product is unsharded, so a
+        stale shard count can never drop units into a field that no longer
+        counts; a miss rereads the count and goes the other way.
+        """
+        if not await self.stock_shards.shard_count(product_id):
+            result = await self.products.update_one(
+                {"_id": self._product_key(product_id), "stock_shard_count": {"$exists": False}},
+                {"$inc": {"reserved_stock": -quantity}},
+                session=session
+            )
+            if result.matched_count:
+                return
+            if await self.stock_shards.refresh_count(product_id) is None:
+                raise ValueError("Product not found")
+            return await self._consume_reserved(product_id, quantity, session)
+        await self.stock_shards.move(
+            product_id, quantity, "reserved_stock", None, "Insufficient reserved stock", session=session
         )
-        await transaction.save()
 
-        # Update product stock
-        product.stock += quantity
-        await product.save()
+    async def record_sales(self, holds: List[Dict[str, Any]]):
+        await self.history.record([
+            self._transaction(hold["product_id"], -hold["quantity"], "sale", "completed") for hold in holds
+        ])
+
+    async def sweep_expired_holds(self, batch_size: Optional[int] = None) -> int:
+        """Release one batch of expired holds and return how many were released
+
+        Holds are marked expired before their stock is returned, so a crash in
+        between can strand units but never release them twice.
+        """
+        await self.initialize()
+        batch_size = batch_size or settings.STOCK_HOLD_SWEEP_BATCH_SIZE
+        holds = await self.stock_holds.claim_expired(batch_size)
+        if holds:
+            quantities: Dict[str, int] = {}
+            for hold in holds:
+                quantities[hold["product_id"]] = quantities.get(hold["product_id"], 0) + hold["quantity"]
+
+            released: Dict[str, int] = {}
+            released_keys = []
+            for product_id, quantity in quantities.items():
+                if await self.stock_shards.shard_count(product_id):
+                    try:
+                        await self.stock_shards.move(
+                            product_id, quantity, "reserved_stock", "stock", "Insufficient reserved stock"
+                        )
+                    except ValueError:
+                        continue
+                    await self.stock_alerts.apply_if_crossed(await self._sharded_totals(product_id), quantity)
+                else:
+                    key = self._product_key(product_id)
+                    result = await self.products.update_one(
+                        {"_id": key, "reserved_stock": {"$gte": quantity}},
+                        {"$inc": {"stock": quantity, "reserved_stock": -quantity}}
+                    )
+                    if result.modified_count != 1:
+                        continue
+                    released_keys.append(key)
+                released[product_id] = quantity
+            if released_keys:
+                await self.stock_alerts.refresh(released_keys)
+            # Only stock that actually moved back is recorded, so a release that
+            # matched nothing leaves no phantom movement in the history
+            if released:
+                await self.history.record([
+                    self._transaction(product_id, quantity, "expiry", "completed")
+                    for product_id, quantity in released.items()
+                ])
+            STOCK_HOLDS_RELEASED.labels(reason="expired").inc(len(holds))
+        STOCK_HOLDS_OUTSTANDING.set(await self.stock_holds.count_outstanding())
+        return len(holds)
+
+    async def run_hold_sweeper(self):
+        """Release expired holds forever, draining backlogs batch by batch"""
+        await self.initialize()
+        await self.stock_holds.ensure_indexes()
+        while True:
+            try:
+                released = await self.sweep_expired_holds()
+                if released < settings.STOCK_HOLD_SWEEP_BATCH_SIZE:
+                    await asyncio.sleep(settings.STOCK_HOLD_SWEEP_INTERVAL_SECONDS)
+            except Exception as e:
+                log_error(e, {"context": "hold_sweeper"})
+                await asyncio.sleep(settings.STOCK_HOLD_SWEEP_INTERVAL_SECONDS)
+
+    async def update_stock(self, product_id: str, quantity: int, type: str = "adjustment") -> Dict[str, Any]:
+        """Update stock levels (for receiving new inventory)"""
+        await self.initialize()
+        if await self.stock_shards.shard_count(product_id):
+            if quantity >= 0:
+                await self.stock_shards.add(product_id, quantity)
+            else:
+                await self.stock_shards.move(product_id, -quantity, "stock", None, "Insufficient stock")
+            product = await self._sharded_totals(product_id)
+        else:
+            product = await self.products.find_one_and_update(
+                {"_id": self._product_key(product_id), "stock_shard_count": {"$exists": False}},
+                {"$inc": {"stock": quantity}},
+                projection={"stock": 1, "reorder_point": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if not product:
+                # Missing, or sharded since the shard count was cached
+                if await self.stock_shards.refresh_count(product_id) is None:
+                    raise ValueError("Product not found")
+                return await self.update_stock(product_id, quantity, type)
+        await self.stock_alerts.apply_if_crossed(product, quantity)
+
+        await self.history.record([self._transaction(product_id, quantity, type, "completed")])
 
         return {
             "status": "success",
             "product_id": product_id,
             "new_quantity": quantity,
-            "total_stock": product.stock
+            "total_stock": product["stock"]
+        }
+
+    async def shard_product(self, product_id: str, shards: int = None) -> Dict[str, Any]:
+        """Spread a hot product's stock over several counter documents"""
+        await self.initialize()
+        count = await self.stock_shards.shard_product(product_id, shards)
+        return {"status": "success", "product_id": product_id, "shards": count}
+
+    async def unshard_product(self, product_id: str) -> Dict[str, Any]:
+        """Move a sharded product's stock back onto the product document"""
+        await self.initialize()
+        totals = await self.stock_shards.unshard_product(product_id)
+        return {"status": "success", "product_id": product_id, **totals}
+
+    async def bulk_update_stock(self, adjustments: List[Dict[str, Any]], type: str = "adjustment") -> Dict[str, Any]:
+        """Apply many ``{"product_id", "delta"}`` stock adjustments at once
+
+        Deltas for the same product are summed and each product gets one
+        ``$inc``; decrements only apply where enough stock is left. Each
+        chunk is read and written in one transaction, so the stock read
+        decides exactly which updates apply; a concurrent write to one of the
+        products makes the transaction retry. Returns one result per product
+        in input order.
+        """
+        await self.initialize()
+        batch_id = ObjectId()
+        deltas: Dict[str, int] = {}
+        for adjustment in adjustments:
+            product_id = str(adjustment["product_id"])
+            deltas[product_id] = deltas.get(product_id, 0) + int(adjustment["delta"])
+
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = []
+        for product_id, delta in deltas.items():
+            if await self.stock_shards.shard_count(product_id):
+                results[product_id] = await self._adjust_sharded(product_id, delta)
+            else:
+                pending.append(product_id)
+
+        batch_size = settings.STOCK_BULK_WRITE_BATCH_SIZE
+        crossed = []
+        for i in range(0, len(pending), batch_size):
+            chunk = {product_id: deltas[product_id] for product_id in pending[i:i + batch_size]}
+            async with await self.db.client.start_session() as session:
+                outcomes, chunk_crossed, resharded = await session.with_transaction(
+                    lambda session: self._adjust_chunk(chunk, session)
+                )
+            results.update(outcomes)
+            crossed += chunk_crossed
+            for product_id in resharded:
+                results[product_id] = await self._adjust_sharded(product_id, deltas[product_id])
+        await self.stock_alerts.apply(crossed)
+
+        applied = [product_id for product_id in deltas if results[product_id]["status"] == "applied"]
+        for i in range(0, len(applied), batch_size):
+            await self.history.record([
+                {**self._transaction(product_id, deltas[product_id], type, "completed"), "batch_id": batch_id}
+                for product_id in applied[i:i + batch_size]
+            ])
+
+        return {
+            "status": "success",
+            "batch_id": str(batch_id),
+            "applied": len(applied),
+            "failed": len(deltas) - len(applied),
+            "results": [
+                {"product_id": product_id, "delta": delta, **results[product_id]}
+                for product_id, delta in deltas.items()
+            ]
         }
 
-    async def get_stock_levels(self, product_id: str = None) -> Dict[str, Any]:
-        """Get current stock levels"""
+    async def _adjust_chunk(self, deltas: Dict[str, int], session):
+        """Apply one chunk of unsharded adjustments inside a transaction
+
+        Products found sharded after all are returned for the shard path.
+        """
+        products = await self.products.find(
+            {"_id": {"$in": [self._product_key(product_id) for product_id in deltas]}},
+            {"stock": 1, "reorder_point": 1, "stock_shard_count": 1},
+            session=session
+        ).to_list(None)
+        found = {str(product["_id"]): product for product in products}
+        results: Dict[str, Dict[str, Any]] = {}
+        operations = []
+        crossed = []
+        resharded = []
+        for product_id, delta in deltas.items():
+            product = found.get(product_id)
+            if product is None:
+                results[product_id] = {"status": "not_found"}
+            elif product.get("stock_shard_count"):
+                self.stock_shards.remember(product_id, product["stock_shard_count"])
+                resharded.append(product_id)
+            elif product.get("stock", 0) + delta < 0:
+                results[product_id] = {"status": "insufficient_stock", "stock": product.get("stock", 0)}
+            else:
+                stock = product.get("stock", 0) + delta
+                results[product_id] = {"status": "applied", "stock": stock}
+                operations.append(UpdateOne(
+                    {"_id": product["_id"], "stock_shard_count": {"$exists": False}}, {"$inc": {"stock": delta}}
+                ))
+                if self.stock_alerts.is_low(product) != self.stock_alerts.is_low(product, stock):
+                    crossed.append({**product, "stock": stock})
+        if operations:
+            await self.products.bulk_write(operations, ordered=False, session=session)
+        return results, crossed, resharded
+
+    async def _adjust_sharded(self, product_id: str, delta: int) -> Dict[str, Any]:
+        try:
+            if delta >= 0:
+                await self.stock_shards.add(product_id, delta)
+            else:
+                await self.stock_shards.move(product_id, -delta, "stock", None, "Insufficient stock")
+        except ValueError:
+            return {"status": "insufficient_stock", "stock": (await self.stock_shards.available(product_id))["stock"]}
+        product = await self._sharded_totals(product_id)
+        await self.stock_alerts.apply_if_crossed(product, delta)
+        return {"status": "applied", "stock": product["stock"]}
+
+    async def get_stock_levels(self, product_id: str = None, after: Optional[str] = None,
+                               limit: int = 50) -> Dict[str, Any]:
+        """Get current stock levels
+
+        Without a product_id, returns one page of low-stock products from the
+        ``stock_alerts`` view; pass ``next_cursor`` back as ``after`` for the
+        next page.
+        """
+        await self.initialize()
         if product_id:
-            product = await Product.get(product_id)
+            if await self.stock_shards.shard_count(product_id):
+                product = await self.stock_shards.available(product_id)
+            else:
+                product = await self.products.find_one(
+                    {"_id": self._product_key(product_id)}, {"stock": 1, "reserved_stock": 1}
+                )
             if not product:
                 raise ValueError("Product not found")
-            
+
+            reserved_stock = product.get("reserved_stock", 0)
             return {
                 "product_id": product_id,
-                "available_stock": product.stock,
-                "reserved_stock": product.reserved_stock,
-                "total_stock": product.stock + product.reserved_stock
+                "available_stock": product["stock"],
+                "reserved_stock": reserved_stock,
+                "total_stock": product["stock"] + reserved_stock
             }
         else:
-            # Get all products with low stock
-            low_stock_products = await Product.find(
-                {"stock": {"$lt": 10}}  # Assuming 10 is the low stock threshold
-            ).to_list(length=None)
-            
+            page = await self.stock_alerts.list_alerts(after, limit)
+            for item in page["items"]:
+                if item.pop("sharded"):
+                    totals = await self.stock_shards.available(item["product_id"])
+                    item["available_stock"] = totals["stock"]
+                    item["reserved_stock"] = totals["reserved_stock"]
+            return {"low_stock_products": page["items"], "next_cursor": page["next_cursor"]}
+
+    async def set_reorder_point(self, product_id: str, reorder_point: Optional[int]) -> Dict[str, Any]:
+        """Set the stock level at or below which a product shows up as low stock"""
+        await self.initialize()
+        stock = None
+        if await self.stock_shards.shard_count(product_id):
+            stock = (await self.stock_shards.available(product_id))["stock"]
+        await self.stock_alerts.set_reorder_point(product_id, reorder_point, stock)
+        return {"status": "success", "product_id": product_id, "reorder_point": reorder_point}
+
+    async def get_inventory_history(self, product_id: str, start_date: datetime = None, end_date: datetime = None,
+                                    after: Optional[str] = None, limit: int = 100,
+                                    summary: bool = False) -> Dict[str, Any]:
+        """Get inventory transaction history
+
+        Returns one page of transactions, newest first; pass ``next_after``
+        back as ``after`` for the next page. With ``summary=True`` returns the
+        net movement per day instead.
+        """
+        await self.initialize()
+        if summary:
             return {
-                "low_stock_products": [
-                    {
-                        "product_id": p.id,
-                        "name": p.name,
-                        "available_stock": p.stock,
-                        "reserved_stock": p.reserved_stock
-                    }
-                    for p in low_stock_products
-                ]
+                "product_id": product_id,
+                "days": await self.history.daily_summary(product_id, start_date, end_date)
             }
 
-    async def get_inventory_history(self, product_id: str, start_date: datetime = None, end_date: datetime = None) -> Dict[str, Any]:
-        """Get inventory transaction history"""
-        query = {"product_id": product_id}
-        
-        if start_date:
-            query["created_at"] = {"$gte": start_date}
-        if end_date:
-            query["created_at"] = {"$lte": end_date}
-        
-        transactions = await InventoryTransaction.find(query).sort("created_at", -1).to_list(length=None)
-        
+        page = await self.history.page(product_id, start_date, end_date, after, limit)
         return {
             "product_id": product_id,
             "transactions": [
                 {
-                    "id": t.id,
-                    "type": t.type,
-                    "quantity": t.quantity,
-                    "status": t.status,
-                    "created_at": t.created_at
+                    "id": str(t["_id"]) if "_id" in t else None,
+                    "type": t["type"],
+                    "quantity": t["quantity"],
+                    "status": t["status"],
+                    "created_at": t["created_at"]
                 }
-                for t in transactions
-            ]
-        } 
\ No newline at end of file
+                for t in page["transactions"]
+            ],
+            "next_after": page["next_after"]
+        }
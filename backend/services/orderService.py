@@ -1,82 +1,194 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
+import time
 from datetime import datetime
+from bson import ObjectId
+from app.core.config import settings
+from app.db.mongodb import get_database
 from app.models import Order, OrderItem, Product, User
-from app.services.shipping_service import ShippingService
-from app.services.notification_service import NotificationService
-from app.services.inventory_service import InventoryService
+from app.monitoring import log_error, ORDER_STAGE_DURATION
+from services.shipping_service import ShippingService
+from services.notification_service import NotificationService
+from services.inventory_service import InventoryService
+from services.order_outbox import OrderOutbox
+
+# Side effects that run after an order is committed, delivered through the outbox
+ORDER_SIDE_EFFECTS = ["order_confirmation", "warehouse_notification"]
+
+# Outbox deliveries started by process_order; held so they are not garbage collected
+_deliveries = set()
 
 class OrderService:
-    def __init__(self):
+    def __init__(self, db=None):
+        self.db = db
         self.shipping_service = ShippingService()
         self.notification_service = NotificationService()
-        self.inventory_service = InventoryService()
+        self.inventory_service = InventoryService(db)
+
+    async def initialize(self):
+        """Initialize the database connection if not already initialized"""
+        if self.db is None:
+            self.db = await get_database()
+        self.outbox = OrderOutbox(self.db)
 
     async def process_order(self, order_id: str) -> Dict[str, Any]:
-        """Process a new order through the fulfillment pipeline"""
+        """Process a new order through the fulfillment pipeline
+
+        Stages run in order: ``reserve`` checks and reserves every line in one
+        all-or-nothing call, ``label`` creates the shipping label, and
+        ``commit`` saves the order, records its notifications in the outbox
+        and turns the holds into sales in a single transaction, so a crash
+        never leaves a processing order without its notifications or its
+        consumed stock. Notifications are delivered concurrently in the
+        background once that commits; the outbox relay retries any that
+        fail. Returns the time spent in each stage.
+        """
+        await self.initialize()
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
         order = await Order.get(order_id)
         if not order:
             raise ValueError("Order not found")
 
-        try:
-            # 1. Validate inventory
-            await self._validate_inventory(order.items)
+        # 1. Validate and reserve inventory
+        stage_started = time.perf_counter()
+        reservation = await self.inventory_service.reserve_items(
+            [{"product_id": item.product_id, "quantity": item.quantity} for item in order.items],
+            order_id=str(order.id)
+        )
+        hold_ids = [item["hold_id"] for item in reservation["items"]]
+        timings["reserve"] = self._record_stage("reserve", stage_started)
 
-            # 2. Reserve inventory
-            await self._reserve_inventory(order.items)
+        try:
+            # 2. Process payment (assuming payment is already processed)
 
-            # 3. Process payment (assuming payment is already processed)
-            
-            # 4. Create shipping label
+            # 3. Create shipping label
+            stage_started = time.perf_counter()
             shipping_label = await self.shipping_service.create_shipping_label(
                 order=order,
                 shipping_method=order.shipping_method
             )
+            timings["label"] = self._record_stage("label", stage_started)
 
-            # 5. Update order status
-            order.status = "processing"
-            order.shipping_label = shipping_label
-            order.updated_at = datetime.utcnow()
-            await order.save()
-
-            # 6. Notify customer
-            await self.notification_service.send_order_confirmation(order)
-
-            # 7. Notify warehouse
-            await self.notification_service.notify_warehouse(order)
-
-            return {
-                "status": "success",
-                "order_id": order.id,
-                "shipping_label": shipping_label
-            }
-
-        except Exception as e:
-            # Handle any errors and rollback inventory
-            await self._release_inventory(order.items)
-            raise e
-
-    async def _validate_inventory(self, items: List[OrderItem]) -> None:
-        """Validate that all items are in stock"""
-        for item in items:
-            product = await Product.get(item.product_id)
-            if not product or product.stock < item.quantity:
-                raise ValueError(f"Insufficient stock for product {item.product_id}")
-
-    async def _reserve_inventory(self, items: List[OrderItem]) -> None:
-        """Reserve inventory for the order"""
-        for item in items:
-            await self.inventory_service.reserve_stock(
-                product_id=item.product_id,
-                quantity=item.quantity
-            )
+            # 4. Update order status, record its side effects and consume the reserved units
+            stage_started = time.perf_counter()
+            now = datetime.utcnow()
+            async with await self.db.client.start_session() as session:
+                entries, holds = await session.with_transaction(
+                    lambda session: self._commit(order, shipping_label, hold_ids, now, session)
+                )
+        except Exception:
+            # Handle any errors and rollback inventory; the transaction left no trace
+            await self._release_holds(hold_ids)
+            raise
+
+        order.status = "processing"
+        order.shipping_label = shipping_label
+        order.updated_at = now
+        await self.inventory_service.record_sales(holds)
+        timings["commit"] = self._record_stage("commit", stage_started)
+
+        # 5. Notify customer and warehouse, off the critical path
+        if entries:
+            delivery = asyncio.create_task(self._deliver(order, entries))
+            _deliveries.add(delivery)
+            delivery.add_done_callback(_deliveries.discard)
+
+        timings["total"] = time.perf_counter() - started
+        return {
+            "status": "success",
+            "order_id": order.id,
+            "shipping_label": shipping_label,
+            "timings": timings
+        }
 
-    async def _release_inventory(self, items: List[OrderItem]) -> None:
+    async def _commit(self, order: Order, shipping_label: Any, hold_ids: List[str], now: datetime, session):
+        """The commit stage's writes; runs inside process_order's transaction"""
+        order_key = ObjectId(order.id) if ObjectId.is_valid(order.id) else order.id
+        result = await self.db.orders.update_one(
+            {"_id": order_key},
+            {"$set": {
+                "status": "processing",
+                "shipping_label": shipping_label,
+                "fulfillment_status": "ready",
+                "updated_at": now
+            }},
+            session=session
+        )
+        if result.matched_count == 0:
+            raise ValueError("Order not found")
+        entries = await self.outbox.enqueue(str(order.id), ORDER_SIDE_EFFECTS, session=session)
+        holds = await self.inventory_service.commit_holds(hold_ids, session=session)
+        return entries, holds
+
+    @staticmethod
+    def _record_stage(stage: str, started: float) -> float:
+        elapsed = time.perf_counter() - started
+        ORDER_STAGE_DURATION.labels(stage=stage).observe(elapsed)
+        return elapsed
+
+    async def _release_holds(self, hold_ids: List[str]) -> None:
         """Release reserved inventory"""
-        for item in items:
-            await self.inventory_service.release_stock(
-                product_id=item.product_id,
-                quantity=item.quantity
-            )
+        results = await asyncio.gather(
+            *[self.inventory_service.release_hold(hold_id) for hold_id in hold_ids],
+            return_exceptions=True
+        )
+        for result in results:
+            # An already-closed hold was released by the sweeper; anything else is logged
+            if isinstance(result, Exception) and not isinstance(result, ValueError):
+                log_error(result, {"context": "release_holds"})
+
+    async def _send(self, order: Order, kind: str) -> Dict[str, Any]:
+        if kind == "order_confirmation":
+            return await self.notification_service.send_order_confirmation(order)
+        if kind == "warehouse_notification":
+            return await self.notification_service.notify_warehouse(order)
+        raise ValueError(f"Unknown order side effect: {kind}")
+
+    async def _deliver(self, order: Order, entries: List[Dict[str, Any]]) -> None:
+        """Send one order's outbox entries concurrently and record each outcome"""
+        results = await asyncio.gather(
+            *[self._send(order, entry["kind"]) for entry in entries],
+            return_exceptions=True
+        )
+        for entry, result in zip(entries, results):
+            if isinstance(result, Exception):
+                log_error(result, {"context": "order_outbox", "order_id": entry["order_id"], "kind": entry["kind"]})
+                await self.outbox.retry(entry, result)
+            else:
+                await self.outbox.complete(entry)
+
+    async def relay_outbox(self, batch_size: Optional[int] = None) -> int:
+        """Deliver one batch of outbox entries whose lease lapsed; returns how many were claimed"""
+        await self.initialize()
+        entries = await self.outbox.claim(batch_size or settings.ORDER_OUTBOX_BATCH_SIZE)
+        by_order: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            by_order.setdefault(entry["order_id"], []).append(entry)
+
+        async def deliver(order_id: str, order_entries: List[Dict[str, Any]]):
+            order = await Order.get(order_id)
+            if not order:
+                for entry in order_entries:
+                    await self.outbox.retry(entry, ValueError("Order not found"))
+                return
+            await self._deliver(order, order_entries)
+
+        await asyncio.gather(*[deliver(order_id, group) for order_id, group in by_order.items()])
+        return len(entries)
+
+    async def run_outbox_relay(self):
+        """Deliver outbox entries forever, draining backlogs batch by batch"""
+        await self.initialize()
+        await self.outbox.ensure_indexes()
+        while True:
+            try:
+                claimed = await self.relay_outbox()
+                if claimed < settings.ORDER_OUTBOX_BATCH_SIZE:
+                    await asyncio.sleep(settings.ORDER_OUTBOX_POLL_INTERVAL_SECONDS)
+            except Exception as e:
+                log_error(e, {"context": "order_outbox_relay"})
+                await asyncio.sleep(settings.ORDER_OUTBOX_POLL_INTERVAL_SECONDS)
 
     async def update_order_status(self, order_id: str, status: str) -> Dict[str, Any]:
         """Update the status of an order"""
@@ -122,8 +234,12 @@ class OrderService:
         if order.status not in ["pending", "processing"]:
             raise ValueError("Order cannot be cancelled in current state")
 
-        # Release inventory
-        await self._release_inventory(order.items)
+        # Return inventory; only processed orders have consumed stock, pending ones hold none
+        if order.status == "processing":
+            await self.inventory_service.bulk_update_stock(
+                [{"product_id": item.product_id, "delta": item.quantity} for item in order.items],
+                type="cancellation"
+            )
 
         # Update order status
         order.status = "cancelled"
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from app.core.config import settings
+
+_indexes_ready = False
+
+class OrderOutbox:
+    """Durable queue of order side effects in the ``order_outbox`` collection.
+
+    Entries are keyed by ``(order_id, kind)``, so enqueueing the same effect
+    twice is harmless. A ``pending`` entry belongs to whoever holds its lease
+    (``available_at`` in the future); once the lease lapses any relay may
+    claim it. Entries end ``sent``, or ``failed`` after
+    ``ORDER_OUTBOX_MAX_ATTEMPTS`` attempts.
+    """
+
+    def __init__(self, db):
+        self.collection = db.order_outbox
+        self.lease_seconds = settings.ORDER_OUTBOX_LEASE_SECONDS
+        self.max_attempts = settings.ORDER_OUTBOX_MAX_ATTEMPTS
+
+    async def ensure_indexes(self):
+        global _indexes_ready
+        if _indexes_ready:
+            return
+        await self.collection.create_index([("order_id", 1), ("kind", 1)], unique=True)
+        # Drives the relay: pending entries in lease expiry order
+        await self.collection.create_index([("status", 1), ("available_at", 1)])
+        _indexes_ready = True
+
+    async def enqueue(self, order_id: str, kinds: List[str], session=None) -> List[Dict[str, Any]]:
+        """Record side effects for an order, leased to the caller for immediate delivery
+
+        Pass ``session`` to enqueue as part of the transaction that commits the order.
+        """
+        await self.ensure_indexes()
+        now = datetime.utcnow()
+        token = ObjectId()
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"order_id": order_id, "kind": kind},
+                {"$setOnInsert": {
+                    "status": "pending",
+                    "attempts": 0,
+                    "created_at": now,
+                    "available_at": now + timedelta(seconds=self.lease_seconds),
+                    "enqueue_token": token
+                }},
+                upsert=True
+            )
+            for kind in kinds
+        ], ordered=False, session=session)
+        # Entries that already existed keep their own lease and are left to the relay
+        return await self.collection.find(
+            {"order_id": order_id, "enqueue_token": token}, session=session
+        ).to_list(None)
+
+    async def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` pending entries whose lease has lapsed"""
+        claimed = []
+        for _ in range(limit):
+            now = datetime.utcnow()
+            entry = await self.collection.find_one_and_update(
+                {"status": "pending", "available_at": {"$lte": now}},
+                {"$set": {"available_at": now + timedelta(seconds=self.lease_seconds)}},
+                sort=[("available_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if entry is None:
+                break
+            claimed.append(entry)
+        return claimed
+
+    async def complete(self, entry: Dict[str, Any]):
+        await self.collection.update_one(
+            {"_id": entry["_id"], "status": "pending"},
+            {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$inc": {"attempts": 1}}
+        )
+
+    async def retry(self, entry: Dict[str, Any], error: Exception):
+        """Record a failed attempt and back off exponentially, or give up"""
+        attempts = entry.get("attempts", 0) + 1
+        update: Dict[str, Any] = {"$set": {"last_error": str(error)}, "$inc": {"attempts": 1}}
+        if attempts >= self.max_attempts:
+            update["$set"]["status"] = "failed"
+        else:
+            update["$set"]["available_at"] = datetime.utcnow() + timedelta(seconds=min(2 ** attempts, 3600))
+        await self.collection.update_one({"_id": entry["_id"], "status": "pending"}, update)
+
+    async def count_pending(self, order_id: Optional[str] = None) -> int:
+        query: Dict[str, Any] = {"status": "pending"}
+        if order_id is not None:
+            query["order_id"] = order_id
+        return await self.collection.count_documents(query)
@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.core.config import settings
+
+_indexes_ready = False
+
+class StockHolds:
+    """Expiring reservation holds in the ``stock_holds`` collection.
+
+    Every reservation records a hold with an ``expires_at`` timestamp. A hold
+    leaves the ``held`` state exactly once: ``committed`` when the order goes
+    through, ``released`` when it is given back, or ``expired`` when the
+    sweeper reclaims it. Each transition is a conditional update on
+    ``status: "held"``, so only one caller ever returns the stock.
+    """
+
+    def __init__(self, db):
+        self.collection = db.stock_holds
+        self.hold_seconds = settings.STOCK_HOLD_SECONDS
+
+    async def ensure_indexes(self):
+        global _indexes_ready
+        if _indexes_ready:
+            return
+        # Drives the sweeper: held documents in expiry order
+        await self.collection.create_index([("status", 1), ("expires_at", 1)])
+        await self.collection.create_index("order_id", sparse=True)
+        _indexes_ready = True
+
+    def build(self, product_id: str, quantity: int, order_id: Optional[str] = None,
+              hold_seconds: Optional[float] = None) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        hold = {
+            "_id": ObjectId(),
+            "product_id": product_id,
+            "quantity": quantity,
+            "status": "held",
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=hold_seconds or self.hold_seconds)
+        }
+        if order_id is not None:
+            hold["order_id"] = order_id
+        return hold
+
+    async def insert(self, holds: List[Dict[str, Any]]):
+        await self.ensure_indexes()
+        await self.collection.insert_many(holds)
+
+    async def close(self, hold_id: str, status: str) -> Optional[Dict[str, Any]]:
+        """Move a hold out of ``held``; returns None if it was already closed"""
+        if not ObjectId.is_valid(hold_id):
+            return None
+        return await self.collection.find_one_and_update(
+            {"_id": ObjectId(hold_id), "status": "held"},
+            {"$set": {"status": status, "closed_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def close_many(self, hold_ids: List[str], status: str, session=None) -> List[Dict[str, Any]]:
+        """Move several holds out of ``held`` together; raises ValueError unless all of them were held
+
+        Meant to run inside a transaction, which the error aborts.
+        """
+        keys = [ObjectId(hold_id) for hold_id in hold_ids if ObjectId.is_valid(hold_id)]
+        holds = await self.collection.find(
+            {"_id": {"$in": keys}, "status": "held"}, session=session
+        ).to_list(None)
+        if len(keys) != len(hold_ids) or len(holds) != len(hold_ids):
+            raise ValueError("Hold not found or already closed")
+        result = await self.collection.update_many(
+            {"_id": {"$in": keys}, "status": "held"},
+            {"$set": {"status": status, "closed_at": datetime.utcnow()}},
+            session=session
+        )
+        if result.modified_count != len(keys):
+            raise ValueError("Hold not found or already closed")
+        return holds
+
+    async def claim_expired(self, limit: int) -> List[Dict[str, Any]]:
+        """Mark up to ``limit`` overdue holds expired and return the ones this call won"""
+        now = datetime.utcnow()
+        candidates = await self.collection.find(
+            {"status": "held", "expires_at": {"$lte": now}}, {"_id": 1}
+        ).sort("expires_at", 1).limit(limit).to_list(limit)
+        if not candidates:
+            return []
+        token = ObjectId()
+        result = await self.collection.update_many(
+            {"_id": {"$in": [hold["_id"] for hold in candidates]}, "status": "held"},
+            {"$set": {"status": "expired", "closed_at": now, "sweep_token": token}}
+        )
+        if not result.modified_count:
+            return []
+        return await self.collection.find({"sweep_token": token}).to_list(None)
+
+    async def count_outstanding(self) -> int:
+        return await self.collection.count_documents({"status": "held"})
@@ -0,0 +1,233 @@
+from typing import Dict, Optional
+import random
+import time
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.core.config import settings
+
+# Product ID -> shard count for every sharded product, reloaded every STOCK_SHARD_CACHE_SECONDS
+_sharded_products: Dict[str, int] = {}
+_sharded_loaded_at: Optional[float] = None
+_indexes_ready = False
+
+class StockShards:
+    """Optional sharded stock counters for flash-sale products.
+
+    A sharded product keeps its ``stock`` and ``reserved_stock`` in
+    ``stock_shard_count`` documents of the ``stock_shards`` collection instead
+    of on the product, so concurrent reservations spread their writes over
+    several documents. A move picks a random shard first and, when that shard
+    cannot cover the quantity, gathers it from the fullest shards, handing
+    back partial takes if the total falls short. Totals are only summed when
+    someone asks for them.
+    """
+
+    def __init__(self, db):
+        self.products = db.products
+        self.shards = db.stock_shards
+        self.cache_seconds = settings.STOCK_SHARD_CACHE_SECONDS
+
+    @staticmethod
+    def _product_key(product_id):
+        return ObjectId(product_id) if ObjectId.is_valid(product_id) else product_id
+
+    async def ensure_indexes(self):
+        global _indexes_ready
+        if _indexes_ready:
+            return
+        await self.shards.create_index([("product_id", 1), ("shard", 1)], unique=True)
+        await self.products.create_index("stock_shard_count", sparse=True)
+        _indexes_ready = True
+
+    async def shard_count(self, product_id) -> int:
+        """Number of shards holding a product's stock, or 0 when it is not sharded"""
+        global _sharded_products, _sharded_loaded_at
+        now = time.monotonic()
+        if _sharded_loaded_at is None or now - _sharded_loaded_at > self.cache_seconds:
+            products = await self.products.find(
+                {"stock_shard_count": {"$exists": True}}, {"stock_shard_count": 1}
+            ).to_list(None)
+            _sharded_products = {str(p["_id"]): p["stock_shard_count"] for p in products}
+            _sharded_loaded_at = now
+        return _sharded_products.get(str(product_id), 0)
+
+    def remember(self, product_id, count: int):
+        """Record a product found to be sharded before the next reload"""
+        _sharded_products[str(product_id)] = count
+
+    async def shard_product(self, product_id, count: Optional[int] = None) -> int:
+        """Move a product's stock into ``count`` shard documents"""
+        await self.ensure_indexes()
+        count = count or settings.STOCK_SHARD_COUNT
+        key = self._product_key(product_id)
+        product = await self.products.find_one_and_update(
+            {"_id": key, "stock_shard_count": {"$exists": False}},
+            {"$set": {"stock_shard_count": count, "stock": 0, "reserved_stock": 0}},
+            projection={"stock": 1, "reserved_stock": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if product is None:
+            raise ValueError("Product not found or already sharded")
+
+        stock = product.get("stock", 0)
+        await self.shards.insert_many([
+            {
+                "product_id": key,
+                "shard": shard,
+                "stock": stock // count + (1 if shard < stock % count else 0),
+                "reserved_stock": product.get("reserved_stock", 0) if shard == 0 else 0
+            }
+            for shard in range(count)
+        ])
+        self.remember(product_id, count)
+        return count
+
+    async def unshard_product(self, product_id) -> Dict[str, int]:
+        """Fold the shards back into the product document once the rush is over"""
+        key = self._product_key(product_id)
+        count = await self.shard_count(product_id)
+        totals = {"stock": 0, "reserved_stock": 0}
+        # Delete shards one by one so each returns its final counts atomically
+        for shard in range(count):
+            doc = await self.shards.find_one_and_delete({"product_id": key, "shard": shard})
+            if doc:
+                totals["stock"] += doc["stock"]
+                totals["reserved_stock"] += doc["reserved_stock"]
+        await self.products.update_one(
+            {"_id": key},
+            {"$inc": totals, "$unset": {"stock_shard_count": ""}}
+        )
+        _sharded_products.pop(str(product_id), None)
+        return totals
+
+    async def available(self, product_id) -> Dict[str, int]:
+        """Sum a sharded product's counters"""
+        results = await self.shards.aggregate([
+            {"$match": {"product_id": self._product_key(product_id)}},
+            {"$group": {"_id": None, "stock": {"$sum": "$stock"}, "reserved_stock": {"$sum": "$reserved_stock"}}}
+        ]).to_list(1)
+        if not results:
+            return {"stock": 0, "reserved_stock": 0}
+        return {"stock": results[0]["stock"], "reserved_stock": results[0]["reserved_stock"]}
+
+    async def refresh_count(self, product_id) -> Optional[int]:
+        """Reread a product's shard count past the cache; None when the product does not exist"""
+        product = await self.products.find_one({"_id": self._product_key(product_id)}, {"stock_shard_count": 1})
+        if product is None:
+            return None
+        count = product.get("stock_shard_count", 0)
+        if count:
+            self.remember(product_id, count)
+        else:
+            _sharded_products.pop(str(product_id), None)
+        return count
+
+    async def _add_to_shards(self, product_id, quantity: int, field: str, attempts: int = 3) -> bool:
+        """Add units to one random shard; False when the product turns out not to be sharded
+
+        The cached shard count can be stale, so a write that matches no shard
+        rereads the count before trying again.
+        """
+        key = self._product_key(product_id)
+        count = await self.shard_count(product_id)
+        for _ in range(attempts):
+            if not count:
+                return False
+            result = await self.shards.update_one(
+                {"product_id": key, "shard": random.randrange(count)},
+                {"$inc": {field: quantity}}
+            )
+            if result.matched_count:
+                return True
+            count = await self.refresh_count(product_id)
+            if count is None:
+                raise ValueError("Product not found")
+        raise ValueError("Stock shards changed during the write")
+
+    async def add(self, product_id, quantity: int, field: str = "stock"):
+        """Add units to one random shard, or to the product if it has been unsharded meanwhile"""
+        while not await self._add_to_shards(product_id, quantity, field):
+            result = await self.products.update_one(
+                {"_id": self._product_key(product_id), "stock_shard_count": {"$exists": False}},
+                {"$inc": {field: quantity}}
+            )
+            if result.matched_count:
+                return
+            # Sharded again in between; the reread count sends the units back to the shards
+            if await self.refresh_count(product_id) is None:
+                raise ValueError("Product not found")
+
+    async def set_total(self, product_id, stock: int, attempts: int = 3) -> int:
+        """Bring a sharded product's summed ``stock`` to ``stock``, e.g. after a supplier sync
+
+        Adds or takes the difference; a take that loses a race with a
+        reservation is recomputed and retried. A product unsharded in the
+        meantime gets ``stock`` set directly. Returns the change applied.
+        """
+        key = self._product_key(product_id)
+        for _ in range(attempts):
+            if not await self.shard_count(product_id):
+                product = await self.products.find_one_and_update(
+                    {"_id": key, "stock_shard_count": {"$exists": False}},
+                    {"$set": {"stock": stock}},
+                    projection={"stock": 1},
+                    return_document=ReturnDocument.BEFORE
+                )
+                if product is not None:
+                    return stock - product.get("stock", 0)
+                if await self.refresh_count(product_id) is None:
+                    raise ValueError("Product not found")
+                continue
+            delta = stock - (await self.available(product_id))["stock"]
+            if delta >= 0:
+                if delta and not await self._add_to_shards(product_id, delta, "stock"):
+                    continue
+                return delta
+            try:
+                await self.move(product_id, -delta, "stock", None, "Insufficient stock")
+                return delta
+            except ValueError:
+                continue
+        return 0
+
+    async def move(self, product_id, quantity: int, source: str, target: Optional[str], reason: str,
+                   session=None):
+        """Take ``quantity`` from ``source`` (adding it to ``target``) across the shards
+
+        Raises ValueError(reason) without changing anything when the shards
+        together hold less than ``quantity``.
+        """
+        key = self._product_key(product_id)
+        count = await self.shard_count(product_id)
+
+        if await self._take(key, random.randrange(count), quantity, source, target, session=session):
+            return
+
+        # The random shard was short; collect from the fullest shards instead
+        shards = await self.shards.find(
+            {"product_id": key, source: {"$gt": 0}}, {"shard": 1, source: 1}, session=session
+        ).sort(source, -1).to_list(None)
+        taken = []
+        remaining = quantity
+        for shard in shards:
+            amount = min(shard[source], remaining)
+            if await self._take(key, shard["shard"], amount, source, target, session=session):
+                taken.append((shard["shard"], amount))
+                remaining -= amount
+                if remaining == 0:
+                    return
+
+        for shard, amount in taken:
+            await self._take(key, shard, -amount, source, target, guard=False, session=session)
+        raise ValueError(reason)
+
+    async def _take(self, key, shard: int, amount: int, source: str, target: Optional[str],
+                    guard: bool = True, session=None) -> bool:
+        query = {"product_id": key, "shard": shard}
+        if guard:
+            query[source] = {"$gte": amount}
+        inc = {source: -amount}
+        if target:
+            inc[target] = amount
+        result = await self.shards.update_one(query, {"$inc": inc}, session=session)
+        return result.modified_count > 0
@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import AsyncMock
+from bson import ObjectId
+from app.services import fulfillment_worker
+from app.services.fulfillment_worker import FulfillmentWorker
+
+async def insert_orders(test_db, count, product_id, payment_status="paid"):
+    await test_db.orders.insert_many([
+        {
+            "user_id": "user1",
+            "items": [{"product_id": str(product_id), "quantity": 1}],
+            "shipping_address": {"city": "Sample City"},
+            "status": "processing",
+            "fulfillment_status": "ready",
+            "payment_status": payment_status,
+            "created_at": i
+        }
+        for i in range(count)
+    ])
+
+@pytest.mark.asyncio
+async def test_workers_claim_disjoint_batches_of_paid_orders(test_db):
+    """Test that concurrent workers never lease the same order and skip unpaid ones"""
+    product_id = ObjectId()
+    await insert_orders(test_db, 5, product_id)
+    await insert_orders(test_db, 2, product_id, payment_status="pending")
+    first = FulfillmentWorker(test_db, "worker-a")
+    second = FulfillmentWorker(test_db, "worker-b")
+    first.batch_size = second.batch_size = 3
+
+    batch_a = await first.claim_batch()
+    batch_b = await second.claim_batch()
+    assert len(batch_a) == 3
+    assert len(batch_b) == 2
+    assert not {o["_id"] for o in batch_a} & {o["_id"] for o in batch_b}
+    assert await first.claim_batch() == []
+
+@pytest.mark.asyncio
+async def test_batch_places_lines_once_and_retries_failures(test_db, monkeypatch):
+    """Test that placed lines are recorded and only failed lines are placed again"""
+    supplier_id = ObjectId()
+    product = await test_db.products.insert_one({"supplier_id": supplier_id, "supplier_product_id": "sp-1"})
+    await insert_orders(test_db, 4, product.inserted_id)
+
+    api = AsyncMock()
+    calls = []
+    async def place_order(supplier_product_id, quantity, shipping_address):
+        calls.append(supplier_product_id)
+        if len(calls) == 2:
+            raise Exception("Failed to place order: 503")
+        return {"order_id": f"po-{len(calls)}"}
+    api.place_order = place_order
+    monkeypatch.setattr(fulfillment_worker.supplier_registry, "prefetch", AsyncMock())
+    monkeypatch.setattr(fulfillment_worker.supplier_registry, "get_client", AsyncMock(return_value=api))
+    monkeypatch.setattr(fulfillment_worker.supplier_registry, "get_supplier", AsyncMock(return_value={"name": "acme"}))
+
+    worker = FulfillmentWorker(test_db, "worker-a")
+    counts = await worker.process_batch(await worker.claim_batch())
+    assert counts == {"fulfilled": 3, "retry": 1, "failed": 0}
+    assert await test_db.orders.count_documents({"fulfillment_status": "placed", "supplier_orders.0": {"$exists": True}}) == 3
+    # The worker only tracks fulfillment; the order status stays process_order's
+    assert await test_db.orders.count_documents({"status": "processing"}) == 4
+
+    failed = await test_db.orders.find_one({"fulfillment_status": "ready"})
+    assert failed["fulfillment_attempts"] == 1
+    assert "supplier_orders" not in failed
+    # Backed off, so it is not claimable straight away
+    assert await worker.claim_batch() == []
+
+@pytest.mark.asyncio
+async def test_exhausted_orders_fail_without_leaving_the_status_enum(test_db, monkeypatch):
+    """Test that running out of attempts marks the fulfillment failed, not the order status"""
+    await insert_orders(test_db, 1, ObjectId())
+    monkeypatch.setattr(fulfillment_worker.supplier_registry, "prefetch", AsyncMock())
+    worker = FulfillmentWorker(test_db, "worker-a")
+    worker.max_attempts = 1
+
+    counts = await worker.process_batch(await worker.claim_batch())
+    assert counts == {"fulfilled": 0, "retry": 0, "failed": 1}
+    order = await test_db.orders.find_one({"fulfillment_status": "failed"})
+    assert order["status"] == "processing"
+    assert order["fulfillment_errors"][0].startswith("No supplier for product")
+
+@pytest.mark.asyncio
+async def test_recorded_placements_are_never_overwritten(test_db, monkeypatch):
+    """Test that a line placed twice keeps its first record, and a missing supplier doc does not fail the batch"""
+    supplier_id = ObjectId()
+    product = await test_db.products.insert_one({"supplier_id": supplier_id, "supplier_product_id": "sp-2"})
+    await insert_orders(test_db, 1, product.inserted_id)
+    api = AsyncMock()
+    api.place_order = AsyncMock(return_value={"order_id": "po-first"})
+    monkeypatch.setattr(fulfillment_worker.supplier_registry, "prefetch", AsyncMock())
+    monkeypatch.setattr(fulfillment_worker.supplier_registry, "get_client", AsyncMock(return_value=api))
+    monkeypatch.setattr(fulfillment_worker.supplier_registry, "get_supplier", AsyncMock(return_value=None))
+
+    worker = FulfillmentWorker(test_db, "worker-a")
+    orders = await worker.claim_batch()
+    assert await worker.process_batch(orders) == {"fulfilled": 1, "retry": 0, "failed": 0}
+
+    # A late duplicate left over for _record must not replace the first supplier order
+    await worker._record(orders, {orders[0]["_id"]: {"0": {"order_id": "po-second"}}}, {})
+    order = await test_db.orders.find_one({"_id": orders[0]["_id"]})
+    assert order["supplier_orders"]["0"]["order_id"] == "po-first"
@@ -0,0 +1,27 @@
+import pytest
+from app.services.import_stream import parse_rows
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+async def collect(rows):
+    return [row async for row in rows]
+
+@pytest.mark.asyncio
+async def test_ndjson_rows_split_across_chunks():
+    """Test that NDJSON lines are reassembled across chunk boundaries"""
+    data = b'{"id": "a", "price": 1}\n\nnot json\n{"id": "b", "name": "caf\xc3\xa9"}'
+    rows = await collect(parse_rows(chunked(data, 5), "ndjson"))
+    assert rows == [{"id": "a", "price": 1}, None, {"id": "b", "name": "café"}]
+
+@pytest.mark.asyncio
+async def test_csv_rows_with_quoted_newlines():
+    """Test CSV parsing with a header, CRLF endings and multi-line quoted fields"""
+    data = b'id,name,description\r\na,Mug,"Large\r\nceramic, blue"\r\nb,Cup\r\nc,Plate,Flat\r\n'
+    rows = await collect(parse_rows(chunked(data, 7), "csv"))
+    assert rows == [
+        {"id": "a", "name": "Mug", "description": "Large\nceramic, blue"},
+        None,
+        {"id": "c", "name": "Plate", "description": "Flat"}
+    ]
@@ -0,0 +1,289 @@
+import pytest
+import asyncio
+from bson import ObjectId
+from services.inventory_service import InventoryService
+
+@pytest.mark.asyncio
+async def test_concurrent_reservations_never_oversell(test_db):
+    """Test that many concurrent checkouts reserve exactly the available stock"""
+    result = await test_db.products.insert_one({"name": "Hot item", "stock": 25, "reserved_stock": 0})
+    product_id = str(result.inserted_id)
+    service = InventoryService(test_db)
+
+    outcomes = await asyncio.gather(
+        *[service.reserve_stock(product_id, 1) for _ in range(200)],
+        return_exceptions=True
+    )
+    succeeded = [o for o in outcomes if not isinstance(o, Exception)]
+    failed = [o for o in outcomes if isinstance(o, Exception)]
+    assert len(succeeded) == 25
+    assert all(str(e) == "Insufficient stock" for e in failed)
+
+    product = await test_db.products.find_one({"_id": result.inserted_id})
+    assert product["stock"] == 0
+    assert product["reserved_stock"] == 25
+    history = await service.get_inventory_history(product_id, limit=100)
+    assert len(history["transactions"]) == 25
+
+@pytest.mark.asyncio
+async def test_multi_item_reservation_is_all_or_nothing(test_db):
+    """Test that a failing line releases the lines that were already reserved"""
+    plenty = await test_db.products.insert_one({"name": "Plenty", "stock": 10, "reserved_stock": 0})
+    scarce = await test_db.products.insert_one({"name": "Scarce", "stock": 1, "reserved_stock": 0})
+    service = InventoryService(test_db)
+
+    with pytest.raises(ValueError, match="Insufficient stock"):
+        await service.reserve_items([
+            {"product_id": str(plenty.inserted_id), "quantity": 3},
+            {"product_id": str(scarce.inserted_id), "quantity": 2}
+        ])
+    assert (await test_db.products.find_one({"_id": plenty.inserted_id}))["stock"] == 10
+    assert (await test_db.products.find_one({"_id": plenty.inserted_id}))["reserved_stock"] == 0
+
+    result = await service.reserve_items([
+        {"product_id": str(plenty.inserted_id), "quantity": 3},
+        {"product_id": str(plenty.inserted_id), "quantity": 2},
+        {"product_id": str(scarce.inserted_id), "quantity": 1}
+    ])
+    assert [item["remaining_stock"] for item in result["items"]] == [5, 0]
+
+@pytest.mark.asyncio
+async def test_sharded_reservations_never_oversell(test_db):
+    """Test that sharded counters hand out exactly the stock, gathering across shards"""
+    result = await test_db.products.insert_one({"name": "Flash sale", "stock": 30, "reserved_stock": 0})
+    product_id = str(result.inserted_id)
+    service = InventoryService(test_db)
+    await service.shard_product(product_id, 4)
+
+    outcomes = await asyncio.gather(
+        *[service.reserve_stock(product_id, 2) for _ in range(40)],
+        return_exceptions=True
+    )
+    assert len([o for o in outcomes if not isinstance(o, Exception)]) == 15
+    levels = await service.get_stock_levels(product_id)
+    assert levels["available_stock"] == 0
+    assert levels["reserved_stock"] == 30
+
+    # Reserved units sit on several shards; releasing 30 at once has to gather them
+    await service.release_stock(product_id, 30)
+    totals = await service.unshard_product(product_id)
+    assert totals["stock"] == 30 and totals["reserved_stock"] == 0
+    assert (await test_db.products.find_one({"_id": result.inserted_id}))["stock"] == 30
+
+@pytest.mark.asyncio
+async def test_supplier_stock_is_written_into_shards(test_db):
+    """Test that setting a sharded product's total adds or takes only the difference"""
+    result = await test_db.products.insert_one({"name": "Synced flash sale", "stock": 20, "reserved_stock": 0})
+    product_id = str(result.inserted_id)
+    service = InventoryService(test_db)
+    await service.shard_product(product_id, 4)
+    await service.reserve_stock(product_id, 5)
+
+    assert await service.stock_shards.set_total(product_id, 3) == -12
+    assert (await service.stock_shards.available(product_id)) == {"stock": 3, "reserved_stock": 5}
+    assert await service.stock_shards.set_total(product_id, 10) == 7
+    assert (await service.stock_shards.available(product_id))["stock"] == 10
+    assert (await test_db.products.find_one({"_id": result.inserted_id}))["stock"] == 0
+
+@pytest.mark.asyncio
+async def test_writes_follow_a_product_sharded_behind_the_cache(test_db):
+    """Test that stock written after another process sharded or unsharded the product is not lost"""
+    result = await test_db.products.insert_one({"name": "Sharded elsewhere", "stock": 10, "reserved_stock": 4})
+    product_id = str(result.inserted_id)
+    service = InventoryService(test_db)
+    assert await service.stock_shards.shard_count(product_id) == 0  # Cached as unsharded
+
+    # Another process shards the product without touching this process's cache
+    await test_db.products.update_one(
+        {"_id": result.inserted_id}, {"$set": {"stock_shard_count": 2, "stock": 0, "reserved_stock": 0}}
+    )
+    await test_db.stock_shards.insert_many([
+        {"product_id": result.inserted_id, "shard": 0, "stock": 5, "reserved_stock": 4},
+        {"product_id": result.inserted_id, "shard": 1, "stock": 5, "reserved_stock": 0}
+    ])
+    await service.update_stock(product_id, 3)
+    # A hold taken before the sharding is committed against the shards
+    hold = service.stock_holds.build(product_id, 4)
+    await service.stock_holds.insert([hold])
+    await service.commit_hold(str(hold["_id"]))
+    assert await service.stock_shards.available(product_id) == {"stock": 13, "reserved_stock": 0}
+    product = await test_db.products.find_one({"_id": result.inserted_id})
+    assert (product["stock"], product["reserved_stock"]) == (0, 0)
+
+    # And back: unsharded elsewhere while this process still caches two shards
+    await service.stock_shards.unshard_product(product_id)
+    service.stock_shards.remember(product_id, 2)
+    await service.stock_shards.add(product_id, 2)
+    assert (await test_db.products.find_one({"_id": result.inserted_id}))["stock"] == 15
+
+@pytest.mark.asyncio
+async def test_sweeper_releases_only_expired_holds(test_db):
+    """Test that expired holds return their stock once and live holds are kept"""
+    result = await test_db.products.insert_one({"name": "Abandoned", "stock": 10, "reserved_stock": 0})
+    product_id = str(result.inserted_id)
+    service = InventoryService(test_db)
+
+    expired = await service.reserve_stock(product_id, 3, hold_seconds=-1)
+    await service.reserve_stock(product_id, 2, hold_seconds=-1)
+    live = await service.reserve_stock(product_id, 4)
+
+    assert await service.sweep_expired_holds() == 2
+    assert await service.sweep_expired_holds() == 0
+    product = await test_db.products.find_one({"_id": result.inserted_id})
+    assert product["stock"] == 6
+    assert product["reserved_stock"] == 4
+
+    with pytest.raises(ValueError):
+        await service.release_hold(expired["hold_id"])
+    await service.commit_hold(live["hold_id"])
+    product = await test_db.products.find_one({"_id": result.inserted_id})
+    assert product["stock"] == 6
+    assert product["reserved_stock"] == 0
+
+@pytest.mark.asyncio
+async def test_sweeper_records_only_stock_it_returned(test_db):
+    """Test that an expired hold whose stock was already given back leaves no expiry history"""
+    result = await test_db.products.insert_one({"name": "Drained", "stock": 10, "reserved_stock": 0})
+    product_id = str(result.inserted_id)
+    service = InventoryService(test_db)
+    await service.reserve_stock(product_id, 3, hold_seconds=-1)
+    # Another process already returned the reserved units
+    await test_db.products.update_one({"_id": result.inserted_id}, {"$set": {"stock": 10, "reserved_stock": 0}})
+
+    assert await service.sweep_expired_holds() == 1
+    product = await test_db.products.find_one({"_id": result.inserted_id})
+    assert (product["stock"], product["reserved_stock"]) == (10, 0)
+    history = await service.get_inventory_history(product_id, limit=100)
+    assert [t["type"] for t in history["transactions"]] == ["reservation"]
+
+@pytest.mark.asyncio
+async def test_commit_holds_is_all_or_nothing(test_db):
+    """Test that committing holds consumes none of them if any is already closed"""
+    result = await test_db.products.insert_one({"name": "Bundled", "stock": 10, "reserved_stock": 0})
+    product_id = str(result.inserted_id)
+    service = InventoryService(test_db)
+    first = await service.reserve_stock(product_id, 3)
+    second = await service.reserve_stock(product_id, 2)
+    await service.release_hold(second["hold_id"])
+
+    with pytest.raises(ValueError):
+        await service.commit_holds([first["hold_id"], second["hold_id"]])
+    assert (await test_db.products.find_one({"_id": result.inserted_id}))["reserved_stock"] == 3
+
+    holds = await service.commit_holds([first["hold_id"]])
+    assert [hold["quantity"] for hold in holds] == [3]
+    product = await test_db.products.find_one({"_id": result.inserted_id})
+    assert product["stock"] == 7
+    assert product["reserved_stock"] == 0
+
+@pytest.mark.asyncio
+async def test_bulk_stock_adjustments_report_per_sku(test_db):
+    """Test that bulk adjustments merge deltas, guard decrements and log applied rows"""
+    first = await test_db.products.insert_one({"name": "A", "stock": 5, "reserved_stock": 0})
+    second = await test_db.products.insert_one({"name": "B", "stock": 1, "reserved_stock": 0})
+    missing = "64b7f0f0f0f0f0f0f0f0f0f0"
+    service = InventoryService(test_db)
+
+    result = await service.bulk_update_stock([
+        {"product_id": str(first.inserted_id), "delta": 10},
+        {"product_id": str(second.inserted_id), "delta": -3},
+        {"product_id": str(first.inserted_id), "delta": -2},
+        {"product_id": missing, "delta": 4}
+    ], type="receiving")
+
+    assert [(r["status"], r.get("stock")) for r in result["results"]] == [
+        ("applied", 13), ("insufficient_stock", 1), ("not_found", None)
+    ]
+    assert result["applied"] == 1 and result["failed"] == 2
+    history = await service.get_inventory_history(str(first.inserted_id))
+    assert [(t["type"], t["quantity"]) for t in history["transactions"]] == [("receiving", 8)]
+
+@pytest.mark.asyncio
+async def test_stock_alerts_follow_reorder_points(test_db):
+    """Test that low-stock alerts are raised and cleared as stock crosses the reorder point"""
+    # test_db is shared across the session; start from an empty view
+    await test_db.stock_alerts.delete_many({})
+    result = await test_db.products.insert_one({"name": "Mug", "stock": 12, "reserved_stock": 0})
+    product_id = str(result.inserted_id)
+    service = InventoryService(test_db)
+
+    reservation = await service.reserve_stock(product_id, 3)
+    page = await service.get_stock_levels()
+    assert [item["product_id"] for item in page["low_stock_products"]] == [product_id]
+    assert page["low_stock_products"][0]["available_stock"] == 9
+
+    await service.release_hold(reservation["hold_id"])
+    assert (await service.get_stock_levels())["low_stock_products"] == []
+
+    await service.set_reorder_point(product_id, 20)
+    page = await service.get_stock_levels(limit=1)
+    assert page["low_stock_products"][0]["reorder_point"] == 20
+    assert page["next_cursor"] == product_id
+    assert (await service.get_stock_levels(after=page["next_cursor"]))["low_stock_products"] == []
+
+@pytest.mark.asyncio
+async def test_stock_alerts_are_seeded_once(test_db):
+    """Test that the first rebuild picks up products that were low before the view existed"""
+    from app.services.stock_alerts import StockAlerts
+    await test_db.stock_alerts.delete_many({})
+    await test_db.stock_alert_rebuilds.delete_many({})
+    result = await test_db.products.insert_one({"name": "Already low", "stock": 1})
+    alerts = StockAlerts(test_db)
+
+    assert await alerts.rebuild_if_needed() is True
+    assert await test_db.stock_alerts.find_one({"_id": result.inserted_id})
+    await test_db.stock_alerts.delete_many({})
+    assert await alerts.rebuild_if_needed() is False
+    assert await test_db.stock_alerts.count_documents({}) == 0
+
+@pytest.mark.asyncio
+async def test_rebuild_skips_products_without_stock(test_db):
+    """Test that products created through ProductCreate, which carry stock_quantity only, are not alerted"""
+    from app.models.product import ProductCreate
+    from app.services.product import ProductService
+    from app.services.stock_alerts import StockAlerts
+    await test_db.stock_alerts.delete_many({})
+    created = await ProductService(test_db).create_product(ProductCreate(
+        name="Catalogue only", description="No stock field", price=9.99, image_url="https://example.com/c.jpg",
+        category="misc", supplier_id="supplier1", stock_quantity=0, sku="CAT-1"
+    ))
+    alerts = StockAlerts(test_db)
+
+    await alerts.rebuild()
+    assert await test_db.stock_alerts.find_one({"_id": ObjectId(created.id)}) is None
+    assert alerts.is_low({"stock_quantity": 0}) is False
+
+@pytest.mark.asyncio
+async def test_history_pages_across_buckets_and_summarises_days(test_db):
+    """Test cursor paging over full buckets, date ranges and the daily summary"""
+    from datetime import datetime, timedelta
+    service = InventoryService(test_db)
+    await service.initialize()
+    service.history.bucket_size = 3
+    day = datetime(2024, 5, 1, 12)
+    await service.history.record([
+        {"product_id": "sku-1", "quantity": q, "type": "adjustment", "status": "completed",
+         "created_at": day + timedelta(hours=3 * i)}
+        for i, q in enumerate([5, -2, 4, -1, 3, 7, -6])
+    ])
+    assert await test_db.inventory_history.count_documents({"product_id": "sku-1"}) >= 3
+
+    seen = []
+    after = None
+    while True:
+        page = await service.get_inventory_history("sku-1", after=after, limit=2)
+        seen += [t["quantity"] for t in page["transactions"]]
+        after = page["next_after"]
+        if after is None:
+            break
+    assert seen == [-6, 7, 3, -1, 4, -2, 5]
+
+    ranged = await service.get_inventory_history(
+        "sku-1", start_date=day + timedelta(hours=3), end_date=day + timedelta(hours=9)
+    )
+    assert [t["quantity"] for t in ranged["transactions"]] == [-1, 4, -2]
+
+    summary = await service.get_inventory_history("sku-1", summary=True)
+    assert [(d["day"], d["net"]) for d in summary["days"]] == [
+        (datetime(2024, 5, 1), 6), (datetime(2024, 5, 2), 4)
+    ]
@@ -0,0 +1,97 @@
+import pytest
+from bson import ObjectId
+from app.services.order import OrderService
+
+ADDRESS = {
+    "street": "123 Main St",
+    "city": "Sample City",
+    "state": "Sample State",
+    "postal_code": "12345",
+    "country": "Sample Country"
+}
+
+async def insert_product(test_db, name, stock, price=10.0):
+    result = await test_db.products.insert_one({"name": name, "price": price, "stock": stock})
+    return result.inserted_id
+
+async def fill_cart(test_db, user_id, lines):
+    await test_db.cart_items.insert_many([
+        {
+            "user_id": user_id,
+            "product_id": str(product_id),
+            "quantity": quantity,
+            "price": 10.0,
+            "name": f"Item {index}",
+            "category": "misc"
+        }
+        for index, (product_id, quantity) in enumerate(lines)
+    ])
+
+async def stock_of(test_db, product_id):
+    return (await test_db.products.find_one({"_id": product_id}))["stock"]
+
+@pytest.mark.asyncio
+async def test_order_with_one_short_item_changes_no_stock(test_db):
+    """Test that a cart with one short line places no order and leaves every product untouched"""
+    user_id = ObjectId()
+    plenty = await insert_product(test_db, "Plenty", 5)
+    scarce = await insert_product(test_db, "Scarce", 1)
+    await fill_cart(test_db, user_id, [(plenty, 2), (scarce, 3)])
+
+    assert await OrderService(test_db).create_order(str(user_id), ADDRESS, ADDRESS, "card") is None
+    assert await stock_of(test_db, plenty) == 5
+    assert await stock_of(test_db, scarce) == 1
+    assert await test_db.orders.count_documents({}) == 0
+    assert await test_db.cart_items.count_documents({"user_id": user_id}) == 2
+
+@pytest.mark.asyncio
+async def test_order_with_unknown_product_is_rejected(test_db):
+    """Test that a cart line for a product that no longer exists places no order"""
+    user_id = ObjectId()
+    known = await insert_product(test_db, "Known", 5)
+    await fill_cart(test_db, user_id, [(known, 1), (ObjectId(), 1)])
+
+    assert await OrderService(test_db).create_order(str(user_id), ADDRESS, ADDRESS, "card") is None
+    assert await stock_of(test_db, known) == 5
+    assert await test_db.orders.count_documents({}) == 0
+
+@pytest.mark.asyncio
+async def test_order_takes_sharded_and_unsharded_stock(test_db):
+    """Test that one order decrements both sharded and plain products and clears the cart"""
+    service = OrderService(test_db)
+    user_id = ObjectId()
+    sharded = await insert_product(test_db, "Flash sale", 10)
+    plain = await insert_product(test_db, "Everyday", 5)
+    await service.stock_shards.shard_product(str(sharded), 2)
+    await fill_cart(test_db, user_id, [(sharded, 3), (plain, 2)])
+
+    order = await service.create_order(str(user_id), ADDRESS, ADDRESS, "card")
+    assert order is not None
+    assert order.total_amount == 50.0
+    assert (await service.stock_shards.available(str(sharded)))["stock"] == 7
+    assert await stock_of(test_db, plain) == 3
+    assert await test_db.cart_items.count_documents({"user_id": user_id}) == 0
+
+@pytest.mark.asyncio
+async def test_aborted_order_returns_sharded_stock(test_db, monkeypatch):
+    """Test that shard units taken before the transaction come back when it aborts"""
+    service = OrderService(test_db)
+    user_id = ObjectId()
+    sharded = await insert_product(test_db, "Flash sale 2", 10)
+    plain = await insert_product(test_db, "Everyday 2", 2)
+    await service.stock_shards.shard_product(str(sharded), 2)
+    await fill_cart(test_db, user_id, [(sharded, 3), (plain, 2)])
+
+    take_sharded = service._take_sharded
+    async def take_then_lose_race(quantities):
+        taken = await take_sharded(quantities)
+        # A concurrent checkout buys the plain product after the stock check
+        await test_db.products.update_one({"_id": plain}, {"$inc": {"stock": -1}})
+        return taken
+    monkeypatch.setattr(service, "_take_sharded", take_then_lose_race)
+
+    assert await service.create_order(str(user_id), ADDRESS, ADDRESS, "card") is None
+    assert (await service.stock_shards.available(str(sharded)))["stock"] == 10
+    assert await stock_of(test_db, plain) == 1
+    assert await test_db.orders.count_documents({}) == 0
+    assert await test_db.cart_items.count_documents({"user_id": user_id}) == 2
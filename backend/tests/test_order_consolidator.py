@@ -0,0 +1,125 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from python_service import main
+from python_service.main import OrderConsolidator, PlacedNotRecorded
+
+PER_ORDER = {"_id": "supplier-1", "api_url": "https://supplier.example"}
+BULK = {"_id": "supplier-2", "api_url": "https://bulk.example", "bulk_orders": True}
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+@pytest.fixture
+def supplier_api(monkeypatch):
+    """Records supplier POSTs; set ``responder`` to shape the replies"""
+    api = MagicMock()
+    api.calls = []
+    api.responder = lambda url, body: FakeResponse(
+        {"orders": [{"tracking_number": f"T-{o['product_id']}"} for o in body["orders"]]}
+        if url.endswith("/bulk") else {"tracking_number": f"T-{body['product_id']}"}
+    )
+
+    def post(url, json, timeout):
+        api.calls.append((url, json))
+        return api.responder(url, json)
+
+    monkeypatch.setattr(main.requests, "post", post)
+    monkeypatch.setattr(main, "db", MagicMock())
+    return api
+
+def consolidator(window_seconds=0.05, max_batch=10):
+    return OrderConsolidator(window_seconds, max_batch, workers=4)
+
+async def submit_all(orders, supplier, ids):
+    return await asyncio.wait_for(asyncio.gather(
+        *[orders.submit(supplier, order_id, {"product_id": order_id, "quantity": 1}) for order_id in ids],
+        return_exceptions=True
+    ), timeout=5)
+
+@pytest.mark.asyncio
+async def test_batch_flushes_when_full_without_waiting_for_the_window(supplier_api):
+    """Test that a full buffer is placed at once and a lone order waits for the window"""
+    orders = consolidator(window_seconds=60, max_batch=2)
+    results = await submit_all(orders, PER_ORDER, ["a", "b"])
+    assert [r["tracking_number"] for r in results] == ["T-a", "T-b"]
+
+    orders = consolidator(window_seconds=0.05, max_batch=10)
+    results = await submit_all(orders, PER_ORDER, ["c"])
+    assert results[0]["tracking_number"] == "T-c"
+    main.db.orders.bulk_write.assert_called()
+
+@pytest.mark.asyncio
+async def test_bulk_suppliers_get_one_request_and_others_one_per_order(supplier_api):
+    """Test that bulk suppliers get the batch in one POST and the rest one POST each"""
+    await submit_all(consolidator(), BULK, ["a", "b", "c"])
+    assert [url for url, _ in supplier_api.calls] == ["https://bulk.example/orders/bulk"]
+
+    supplier_api.calls.clear()
+    await submit_all(consolidator(), PER_ORDER, ["d", "e"])
+    assert sorted(url for url, _ in supplier_api.calls) == ["https://supplier.example/orders"] * 2
+
+@pytest.mark.asyncio
+async def test_bulk_response_with_wrong_count_fails_every_caller(supplier_api):
+    """Test that a bulk reply that cannot be matched to the orders fails them all"""
+    supplier_api.responder = lambda url, body: FakeResponse({"orders": [{"tracking_number": "T-1"}]})
+    results = await submit_all(consolidator(), BULK, ["a", "b"])
+    assert all(isinstance(r, Exception) and "different number" in str(r) for r in results)
+    main.db.orders.bulk_write.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_rejected_lines_fail_alone(supplier_api):
+    """Test that a rejected or malformed line fails its own caller and is not marked fulfilled"""
+    supplier_api.responder = lambda url, body: FakeResponse({"orders": [
+        {"tracking_number": "T-a"}, {"error": "Out of stock"}, "garbage"
+    ]})
+    results = await submit_all(consolidator(), BULK, ["a", "b", "c"])
+    assert results[0]["tracking_number"] == "T-a"
+    assert str(results[1]) == "Out of stock"
+    assert isinstance(results[2], Exception)
+    updates = main.db.orders.bulk_write.call_args[0][0]
+    assert len(updates) == 1
+
+    supplier_api.responder = lambda url, body: FakeResponse({"status": "ok"})
+    results = await submit_all(consolidator(), PER_ORDER, ["d"])
+    assert "no tracking number" in str(results[0])
+
+@pytest.mark.asyncio
+async def test_failed_bookkeeping_reports_placed_not_recorded(supplier_api):
+    """Test that callers learn their order was placed when marking it fulfilled fails"""
+    main.db.orders.bulk_write.side_effect = RuntimeError("primary stepped down")
+    results = await submit_all(consolidator(), PER_ORDER, ["a"])
+    assert isinstance(results[0], PlacedNotRecorded)
+    assert results[0].result["tracking_number"] == "T-a"
+
+@pytest.mark.asyncio
+async def test_flush_all_places_buffered_orders(supplier_api):
+    """Test that shutdown places orders still waiting for their window"""
+    orders = consolidator(window_seconds=60)
+    waiting = asyncio.ensure_future(orders.submit(PER_ORDER, "a", {"product_id": "a", "quantity": 1}))
+    await asyncio.sleep(0)
+    assert orders.buffers
+
+    await orders.flush_all()
+    assert (await asyncio.wait_for(waiting, timeout=5))["tracking_number"] == "T-a"
+    assert not orders.buffers and not orders.timers
+
+@pytest.mark.asyncio
+async def test_resubmitted_order_is_placed_once(supplier_api):
+    """Test that the same order submitted twice in one window shares a single placement"""
+    results = await submit_all(consolidator(), PER_ORDER, ["a", "a"])
+    assert results[0] == results[1]
+    assert len(supplier_api.calls) == 1
+
+@pytest.mark.asyncio
+async def test_fulfilled_order_is_not_placed_again(supplier_api):
+    """Test that fulfilling an already fulfilled order returns its tracking number without a placement"""
+    main.db.orders.find_one.return_value = {"_id": "o1", "status": "fulfilled", "tracking_number": "T-old"}
+    result = await main.fulfill_order("o1")
+    assert result["tracking_number"] == "T-old"
+    assert supplier_api.calls == []
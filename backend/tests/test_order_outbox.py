@@ -0,0 +1,39 @@
+import pytest
+from datetime import datetime, timedelta
+from services.order_outbox import OrderOutbox
+
+@pytest.mark.asyncio
+async def test_enqueue_is_idempotent_and_leased_to_the_caller(test_db):
+    """Test that re-enqueueing an order's effects neither duplicates nor re-leases them"""
+    outbox = OrderOutbox(test_db)
+    first = await outbox.enqueue("order-1", ["order_confirmation", "warehouse_notification"])
+    again = await outbox.enqueue("order-1", ["order_confirmation", "warehouse_notification"])
+
+    assert sorted(entry["kind"] for entry in first) == ["order_confirmation", "warehouse_notification"]
+    assert again == []
+    assert await test_db.order_outbox.count_documents({"order_id": "order-1"}) == 2
+    # Still leased to the first caller, so a relay finds nothing to claim
+    assert await outbox.claim(10) == []
+
+@pytest.mark.asyncio
+async def test_relay_claims_lapsed_entries_and_retries_with_backoff(test_db):
+    """Test that lapsed leases are claimed once and failures back off until they give up"""
+    outbox = OrderOutbox(test_db)
+    outbox.max_attempts = 2
+    await outbox.enqueue("order-2", ["order_confirmation"])
+    await test_db.order_outbox.update_many({}, {"$set": {"available_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    claimed = await outbox.claim(10)
+    assert [entry["kind"] for entry in claimed] == ["order_confirmation"]
+    assert await outbox.claim(10) == []
+
+    await outbox.retry(claimed[0], RuntimeError("smtp down"))
+    entry = await test_db.order_outbox.find_one({"_id": claimed[0]["_id"]})
+    assert entry["status"] == "pending"
+    assert entry["attempts"] == 1
+    assert entry["available_at"] > datetime.utcnow()
+
+    await outbox.retry(entry, RuntimeError("smtp down"))
+    entry = await test_db.order_outbox.find_one({"_id": claimed[0]["_id"]})
+    assert entry["status"] == "failed"
+    assert await outbox.count_pending("order-2") == 0
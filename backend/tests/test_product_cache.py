@@ -0,0 +1,73 @@
+import pytest
+import asyncio
+from app.services.product_cache import ProductCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+    return ProductCache(ttl_seconds=30, negative_ttl_seconds=5, max_entries=2, clock=clock)
+
+def make_loader(calls, product, delay=0.0):
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return product
+    return load
+
+@pytest.mark.asyncio
+async def test_hot_product_is_loaded_once(cache):
+    """Test that concurrent and repeated reads share a single database load"""
+    calls = []
+    load = make_loader(calls, {"name": "Mug"}, delay=0.01)
+    products = await asyncio.gather(*[cache.get("p1", load) for _ in range(10)])
+    assert await cache.get("p1", load) == {"name": "Mug"}
+    assert len(calls) == 1
+    assert all(p == {"name": "Mug"} for p in products)
+    assert cache.stats()["hit_ratio"] == pytest.approx(1 / 2)
+
+@pytest.mark.asyncio
+async def test_missing_products_are_negatively_cached(cache, clock):
+    """Test that unknown IDs are cached briefly and then looked up again"""
+    calls = []
+    load = make_loader(calls, None)
+    assert await cache.get("missing", load) is None
+    assert await cache.get("missing", load) is None
+    assert len(calls) == 1
+    clock.now = 6
+    await cache.get("missing", load)
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_invalidate_and_lru_eviction(cache):
+    """Test that writes drop entries and the least recently used entry is evicted"""
+    calls = []
+    await cache.get("p1", make_loader(calls, {"price": 1}))
+    await cache.invalidate(["p1"])
+    assert await cache.get("p1", make_loader(calls, {"price": 2})) == {"price": 2}
+
+    await cache.get("p2", make_loader(calls, {"price": 3}))
+    await cache.get("p1", make_loader(calls, {"price": 2}))
+    await cache.get("p3", make_loader(calls, {"price": 4}))
+    assert len(calls) == 4
+    await cache.get("p2", make_loader(calls, {"price": 3}))
+    assert len(calls) == 5
+
+@pytest.mark.asyncio
+async def test_load_racing_an_invalidation_is_not_cached(cache):
+    """Test that a read started before a write cannot cache the old document"""
+    calls = []
+    stale = asyncio.ensure_future(cache.get("p1", make_loader(calls, {"price": 1}, delay=0.01)))
+    await asyncio.sleep(0)
+    await cache.invalidate(["p1"])
+    assert await stale == {"price": 1}
+    assert await cache.get("p1", make_loader(calls, {"price": 2})) == {"price": 2}
@@ -0,0 +1,154 @@
+import pytest
+from bson import ObjectId
+import app.services.product as product_module
+from app.services.product import ProductService, prepare_import_rows
+
+SUPPLIER_ID = str(ObjectId())
+IMPORT_INDEX = "import_source_1_import_data.id_1"
+
+def make_row(external_id, price=10.0, **extra):
+    row = {
+        "id": external_id,
+        "name": f"Imported {external_id}",
+        "description": "Imported product",
+        "price": price,
+        "supplier_id": SUPPLIER_ID
+    }
+    row.update(extra)
+    return row
+
+@pytest.fixture
+async def product_service(test_db):
+    product_module._import_indexes_ready.discard(test_db.products.full_name)
+    return ProductService(test_db)
+
+@pytest.mark.asyncio
+async def test_bulk_import_reports_per_row_outcomes(product_service, test_db):
+    """Test that bulk import upserts rows and reports what happened to each"""
+    rows = [
+        make_row("a"),
+        make_row("b"),
+        {"name": "Missing fields"},
+        make_row("a", price=12.0),
+        make_row(None, name="Imported without id 1"),
+        make_row(None, name="Imported without id 2")
+    ]
+    result = await product_service.bulk_import_products("feed", rows)
+
+    assert [r["status"] for r in result["results"]] == [
+        "superseded", "inserted", "invalid", "inserted", "inserted", "inserted"
+    ]
+    assert result["inserted"] == 4
+    assert await test_db.products.count_documents({"import_source": "feed"}) == 4
+    product = await test_db.products.find_one({"import_source": "feed", "import_data.id": "a"})
+    assert product["price"] == 12.0
+
+@pytest.mark.asyncio
+async def test_bulk_import_updates_existing_rows(product_service, test_db):
+    """Test that re-importing a feed updates products instead of duplicating them"""
+    await product_service.bulk_import_products("feed", [make_row("a"), make_row("b")])
+    original = await test_db.products.find_one({"import_source": "feed", "import_data.id": "a"})
+    result = await product_service.bulk_import_products("feed", [make_row("a", price=20.0), make_row("c")])
+
+    assert [r["status"] for r in result["results"]] == ["updated", "inserted"]
+    assert await test_db.products.count_documents({"import_source": "feed"}) == 3
+    product = await test_db.products.find_one({"import_source": "feed", "import_data.id": "a"})
+    assert product["price"] == 20.0
+    assert product["_id"] == original["_id"]
+    assert product["created_at"] == original["created_at"]
+
+def test_prepare_import_rows_is_pure_and_picklable():
+    """Test that the process-pool stage returns plain, picklable rows"""
+    import pickle
+    no_id = make_row(None)
+    del no_id["id"]
+    prepared = prepare_import_rows("feed", [make_row("a"), {"name": "Missing fields"}, no_id])
+    assert pickle.loads(pickle.dumps(prepared)) == prepared
+    assert prepared[0]["external_id"] == "a"
+    assert prepared[0]["product"]["supplier_id"] == ObjectId(SUPPLIER_ID)
+    assert prepared[1] == {"error": "Invalid import data"}
+    assert prepared[2]["external_id"] is None
+    assert "id" not in prepared[2]["product"]["import_data"]
+
+@pytest.mark.asyncio
+async def test_import_index_detaches_existing_duplicates(product_service, test_db):
+    """Test that legacy duplicate imports are detached so the unique key can be built"""
+    # Earlier tests built the unique key; start from a collection that predates it
+    if IMPORT_INDEX in await test_db.products.index_information():
+        await test_db.products.drop_index(IMPORT_INDEX)
+    await test_db.products.insert_many([
+        {"name": "Legacy old", "import_source": "legacy", "import_data": {"id": "x"}, "updated_at": 1},
+        {"name": "Legacy new", "import_source": "legacy", "import_data": {"id": "x"}, "updated_at": 2}
+    ])
+    await product_service.ensure_import_indexes()
+
+    kept = await test_db.products.find_one({"import_source": "legacy", "import_data.id": "x"})
+    assert kept["name"] == "Legacy new"
+    detached = await test_db.products.find_one({"name": "Legacy old"})
+    assert detached["import_data"] == {"duplicate_of_id": "x"}
+
+@pytest.mark.asyncio
+async def test_reimport_invalidates_cached_products(product_service, test_db):
+    """Test that an updated import row is not served stale from the product cache"""
+    from app.services.product_cache import product_cache
+    await product_service.bulk_import_products("cached-feed", [make_row("c1")])
+    product_id = str((await test_db.products.find_one({"import_source": "cached-feed"}))["_id"])
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return {"_id": product_id}
+
+    await product_cache.get(product_id, load)
+    await product_cache.get(product_id, load)
+    assert len(loads) == 1
+
+    await product_service.bulk_import_products("cached-feed", [make_row("c1", price=99.0)])
+    await product_cache.get(product_id, load)
+    assert len(loads) == 2
+    await product_cache.invalidate()
+
+@pytest.mark.asyncio
+async def test_single_reimport_invalidates_cached_product(product_service, test_db, monkeypatch):
+    """Test that import_product does not leave the pre-import document in the product cache"""
+    from app.services.product_cache import product_cache
+    # Import rows lack the listing fields the Product model needs; only the cache is under test
+    monkeypatch.setattr(product_service, "_imported_product", lambda product: product)
+    created = await product_service.import_product("single-feed", make_row("s1"))
+    product_id = str(created["_id"])
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return {"_id": product_id}
+
+    await product_cache.get(product_id, load)
+    updated = await product_service.import_product("single-feed", make_row("s1", price=42.0))
+    assert updated["_id"] == created["_id"]
+    await product_cache.get(product_id, load)
+    assert len(loads) == 2
+    await product_cache.invalidate()
+
+@pytest.mark.asyncio
+async def test_csv_import_stores_numeric_types(product_service, test_db):
+    """Test that CSV string values are stored as numbers and bad numbers are reported"""
+    from app.services.import_stream import parse_rows
+
+    async def chunks():
+        yield (
+            "id,name,description,price,supplier_id,stock,supplier_price,min_order_quantity,shipping_weight\n"
+            f"csv-1,CSV Mug,Mug,9.5,{SUPPLIER_ID},12,4.25,2,0.4\n"
+            f"csv-2,CSV Cup,Cup,3,{SUPPLIER_ID},lots,1,,\n"
+        ).encode()
+
+    rows = [row async for row in parse_rows(chunks(), "csv")]
+    result = await product_service.bulk_import_products("csv-feed", rows)
+
+    assert [r["status"] for r in result["results"]] == ["inserted", "invalid"]
+    assert result["results"][1]["error"] == "Invalid stock: 'lots'"
+    product = await test_db.products.find_one({"import_source": "csv-feed"})
+    assert product["price"] == 9.5
+    assert product["stock"] == 12 and isinstance(product["stock"], int)
+    assert product["min_order_quantity"] == 2 and isinstance(product["min_order_quantity"], int)
+    assert product["supplier_price"] == 4.25
+    assert product["shipping_weight"] == 0.4
@@ -0,0 +1,50 @@
+import pytest
+from bson import ObjectId
+from app.services.product import ProductService
+
+def make_product(i, category="Mugs"):
+    return {
+        "name": f"Product {i}",
+        "description": "x" * 1000,
+        "price": 10.0 + i,
+        "image_url": f"https://example.com/{i}.jpg",
+        "category": category,
+        "supplier_id": ObjectId(),
+        "stock_quantity": 5,
+        "supplier_data": {"description": "y" * 1000}
+    }
+
+@pytest.mark.asyncio
+async def test_list_products_pages_with_cursor(test_db):
+    """Test that cursor pages cover a category exactly once, in order"""
+    await test_db.products.insert_many(
+        [make_product(i) for i in range(5)] + [make_product(i, "Plates") for i in range(5, 7)]
+    )
+    service = ProductService(test_db)
+
+    seen = []
+    after = None
+    while True:
+        page = await service.list_products(limit=2, after=after, category="Mugs")
+        seen += [item.name for item in page.items]
+        if page.next_cursor is None:
+            break
+        after = page.next_cursor
+    assert seen == [f"Product {i}" for i in range(5)]
+
+@pytest.mark.asyncio
+async def test_list_products_returns_summaries(test_db):
+    """Test that list pages leave out heavy fields and stringify IDs"""
+    product = make_product(1)
+    await test_db.products.insert_one(product)
+    page = await ProductService(test_db).list_products(supplier_id=str(product["supplier_id"]))
+    assert len(page.items) == 1
+    item = page.items[0].model_dump()
+    assert item["supplier_id"] == str(product["supplier_id"])
+    assert "description" not in item and "supplier_data" not in item
+
+@pytest.mark.asyncio
+async def test_list_products_rejects_bad_cursor(test_db):
+    """Test that a malformed cursor is reported as a ValueError"""
+    with pytest.raises(ValueError):
+        await ProductService(test_db).list_products(after="not-a-cursor")
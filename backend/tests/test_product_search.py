@@ -0,0 +1,24 @@
+import pytest
+from app.services.product_sourcing_service import ProductSourcingService
+
+@pytest.mark.parametrize("sort_order", [1, -1])
+@pytest.mark.asyncio
+async def test_keyset_pages_include_products_missing_the_sort_field(test_db, sort_order):
+    """Test that paging by price visits priced and unpriced products exactly once"""
+    await test_db.products.insert_many(
+        [{"name": f"priced-{i}", "price": float(i % 3)} for i in range(5)]
+        + [{"name": f"unpriced-{i}"} for i in range(4)]
+    )
+    service = ProductSourcingService(test_db)
+    seen = []
+    after = None
+    while True:
+        filters = {"sort_by": "price", "sort_order": sort_order, "per_page": 2, "total": "none"}
+        if after:
+            filters["after"] = after
+        result = await service.search_products("", filters)
+        seen += [product["name"] for product in result["products"]]
+        after = result["next_after"]
+        if after is None:
+            break
+    assert sorted(seen) == sorted([f"priced-{i}" for i in range(5)] + [f"unpriced-{i}" for i in range(4)])
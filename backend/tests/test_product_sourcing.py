@@ -0,0 +1,106 @@
+import pytest
+from app.services.product_sourcing_service import ProductSourcingService
+
+@pytest.mark.asyncio
+async def test_variations_for_many_parents_come_back_grouped(test_db):
+    """Test that bulk lookup groups children by parent and keeps parents without any"""
+    await test_db.products.insert_many([
+        {"_id": "shirt", "name": "Shirt"},
+        {"_id": "mug", "name": "Mug"},
+        {"_id": "lamp", "name": "Lamp"}
+    ])
+    service = ProductSourcingService(test_db)
+    for size in ["S", "M", "L"]:
+        await service.create_product_variation("shirt", {"name": f"Shirt {size}", "size": size})
+    await service.create_product_variation("mug", {"name": "Mug blue", "color": "blue"})
+
+    variations = await service.get_variations_bulk(["shirt", "mug", "lamp"], limit_per_parent=2)
+    assert len(variations["shirt"]) == 2
+    assert [v["name"] for v in variations["mug"]] == ["Mug blue"]
+    assert variations["lamp"] == []
+    assert variations["mug"][0]["base_product"] == "Mug"
+    assert [v["size"] for v in await service.get_product_variations("shirt")] == ["S", "M", "L"]
+
+@pytest.mark.asyncio
+async def test_variation_count_is_maintained_and_rebuilt(test_db):
+    """Test that creating variations bumps the count and a rebuild resets parents left without any"""
+    await test_db.products.insert_many([{"_id": "desk", "name": "Desk"}, {"_id": "chair", "name": "Chair"}])
+    service = ProductSourcingService(test_db)
+    await service.create_product_variation("desk", {"name": "Desk oak"})
+    await service.create_product_variation("desk", {"name": "Desk pine"})
+    await service.create_product_variation("chair", {"name": "Chair red"})
+    assert (await test_db.products.find_one({"_id": "desk"}))["variation_count"] == 2
+    assert await service.create_product_variation("missing", {"name": "Ghost"}) == {"error": "Product not found"}
+
+    # Variations deleted behind the counter's back
+    await test_db.products.delete_many({"parent_id": "chair"})
+    await test_db.products.delete_one({"name": "Desk pine"})
+    await test_db.products.update_one({"_id": "desk"}, {"$set": {"variation_count": 7}})
+
+    assert await service.rebuild_variation_counts() == 1
+    assert (await test_db.products.find_one({"_id": "desk"}))["variation_count"] == 1
+    assert (await test_db.products.find_one({"_id": "chair"}))["variation_count"] == 0
+
+class FakeCatalog:
+    """Supplier catalog served a page at a time; pages in ``failing`` answer 503"""
+
+    def __init__(self, products):
+        self.products = products
+        self.failing = set()
+        self.requested = []
+
+    def get(self, url, params=None, headers=None):
+        self.requested.append(params["page"])
+        return FakeCatalogResponse(self, params["page"], params["limit"])
+
+class FakeCatalogResponse:
+    def __init__(self, catalog, page, limit):
+        self.status = 503 if page in catalog.failing else 200
+        self.body = catalog.products[(page - 1) * limit:page * limit]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        return self.body
+
+@pytest.fixture
+async def importer(test_db):
+    await test_db.suppliers.insert_one({"_id": "acme", "name": "Acme", "api_url": "https://acme.example", "api_key": "k"})
+    service = ProductSourcingService(test_db)
+    service.session = FakeCatalog([{"name": f"Lamp {i}", "price": 10.0 + i} for i in range(5)])
+    return service
+
+@pytest.mark.asyncio
+async def test_bulk_import_pages_until_the_catalog_is_exhausted(importer, test_db):
+    """Test that every page is written and malformed rows are counted, not imported"""
+    del importer.session.products[3]["price"]
+    result = await importer.bulk_import_products("acme", "lighting", page_size=2)
+
+    assert importer.session.requested == [1, 2, 3]
+    assert (result["status"], result["pages"], result["imported_count"], result["failed_count"]) == ("completed", 3, 4, 1)
+    assert await test_db.products.count_documents({"supplier_id": "acme"}) == 4
+    job = await importer.get_import_job(result["job_id"])
+    assert (job["read_count"], job["imported_count"]) == (5, 4)
+
+@pytest.mark.asyncio
+async def test_failed_bulk_import_resumes_after_its_last_page(importer, test_db):
+    """Test that resuming a failed import refetches only the missing pages and keeps the counters"""
+    importer.session.failing.add(2)
+    failed = await importer.bulk_import_products("acme", "lighting", page_size=2)
+    assert (failed["status"], failed["pages"], failed["imported_count"]) == ("failed", 1, 2)
+
+    importer.session.failing.clear()
+    importer.session.requested.clear()
+    resumed = await importer.bulk_import_products("acme", "lighting", job_id=failed["job_id"])
+    assert importer.session.requested == [2, 3]
+    assert resumed["job_id"] == failed["job_id"]
+    assert (resumed["status"], resumed["pages"], resumed["imported_count"]) == ("completed", 3, 5)
+    assert await test_db.products.count_documents({"supplier_id": "acme"}) == 5
+
+    again = await importer.bulk_import_products("acme", "lighting", job_id=failed["job_id"])
+    assert again == {"error": "Import job already completed"}
+    assert "error" in await importer.bulk_import_products("acme", "other", job_id=failed["job_id"])
@@ -0,0 +1,166 @@
+import pytest
+import asyncio
+from app.services.quote_cache import QuoteCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+    return QuoteCache(ttl_seconds=30, stale_seconds=60, max_entries=100, clock=clock)
+
+def make_fetcher(calls, price=10.0, delay=0.0):
+    async def fetch():
+        calls.append(price)
+        await asyncio.sleep(delay)
+        return {"price": price}
+    return fetch
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_single_flighted(cache):
+    """Test that identical concurrent requests share one upstream call"""
+    calls = []
+    fetch = make_fetcher(calls, delay=0.01)
+    quotes = await asyncio.gather(*[cache.get(("s1", "p1"), fetch) for _ in range(10)])
+    assert len(calls) == 1
+    assert all(q == {"price": 10.0} for q in quotes)
+
+@pytest.mark.asyncio
+async def test_fresh_quote_is_served_from_cache(cache, clock):
+    """Test that quotes within the TTL do not hit the supplier"""
+    calls = []
+    await cache.get(("s1", "p1"), make_fetcher(calls))
+    clock.now = 29
+    assert await cache.get(("s1", "p1"), make_fetcher(calls, price=12.0)) == {"price": 10.0}
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_stale_quote_is_served_while_refreshing(cache, clock):
+    """Test stale-while-revalidate behaviour"""
+    calls = []
+    await cache.get(("s1", "p1"), make_fetcher(calls))
+    clock.now = 45
+    assert await cache.get(("s1", "p1"), make_fetcher(calls, price=12.0)) == {"price": 10.0}
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert await cache.get(("s1", "p1"), make_fetcher(calls, price=14.0)) == {"price": 12.0}
+    assert calls == [10.0, 12.0]
+
+@pytest.mark.asyncio
+async def test_expired_quote_is_refetched_and_failures_not_cached(cache, clock):
+    """Test that expired entries block on a new fetch and misses are not stored"""
+    calls = []
+    await cache.get(("s1", "p1"), make_fetcher(calls))
+    clock.now = 100
+    assert await cache.get(("s1", "p1"), make_fetcher(calls, price=11.0)) == {"price": 11.0}
+
+    async def unavailable():
+        calls.append(None)
+        return None
+
+    assert await cache.get(("s2", "p1"), unavailable) is None
+    assert await cache.get(("s2", "p1"), unavailable) is None
+    assert calls == [10.0, 11.0, None, None]
+
+class TestComparePrices:
+    """compare_prices fan-out: deadline, partial results and hedged retries"""
+
+    @pytest.fixture
+    def service(self, test_db, monkeypatch):
+        from app.services import product_sourcing_service as sourcing
+        from app.services.quote_cache import quote_cache
+        quote_cache.invalidate()
+        service = sourcing.ProductSourcingService(test_db)
+        service.session = object()  # Requests go through the patched _fetch_quote
+        monkeypatch.setattr(sourcing.settings, "PRICE_COMPARISON_HEDGE_AFTER_SECONDS", 0.05)
+        yield service
+        quote_cache.invalidate()
+
+    @staticmethod
+    def quote(supplier, price):
+        return {
+            "supplier_id": supplier["_id"], "supplier_name": supplier["name"], "status": "ok",
+            "price": price, "shipping_cost": 1.0, "stock_quantity": 5, "estimated_delivery": None
+        }
+
+    @pytest.mark.asyncio
+    async def test_deadline_returns_partial_results(self, service, test_db, monkeypatch):
+        """Test that answers within the deadline are ranked and late or failing suppliers are marked"""
+        await test_db.products.insert_one({"_id": "p-deadline", "categories": ["lamps"]})
+        await test_db.suppliers.insert_many([
+            {"_id": name, "name": name, "product_categories": ["lamps"]}
+            for name in ["pricey", "cheap", "slow", "broken"]
+        ])
+
+        async def fetch(supplier, product_id):
+            if supplier["name"] == "slow":
+                await asyncio.sleep(1)
+            if supplier["name"] == "broken":
+                raise RuntimeError("502")
+            return self.quote(supplier, 9.0 if supplier["name"] == "pricey" else 4.0)
+        monkeypatch.setattr(service, "_fetch_quote", fetch)
+
+        started = asyncio.get_running_loop().time()
+        results = await service.compare_prices("p-deadline", deadline=0.3)
+        assert asyncio.get_running_loop().time() - started < 0.9
+        assert [(r["supplier_name"], r["status"]) for r in results[:2]] == [("cheap", "ok"), ("pricey", "ok")]
+        assert {(r["supplier_name"], r["status"]) for r in results[2:]} == {("slow", "timeout"), ("broken", "error")}
+
+    @pytest.mark.asyncio
+    async def test_slow_request_is_hedged(self, service, monkeypatch):
+        """Test that a slow first attempt triggers a second request and the first answer wins"""
+        supplier = {"_id": "hedged", "name": "hedged"}
+        calls = []
+
+        async def fetch(supplier, product_id):
+            calls.append(product_id)
+            if len(calls) == 1:
+                await asyncio.sleep(1)
+            return self.quote(supplier, 3.0)
+        monkeypatch.setattr(service, "_fetch_quote", fetch)
+
+        quote = await asyncio.wait_for(service._fetch_quote_hedged(supplier, "p-hedge"), timeout=0.5)
+        assert quote["price"] == 3.0
+        assert len(calls) == 2
+
+        prompt_calls = []
+
+        async def prompt(supplier, product_id):
+            prompt_calls.append(product_id)
+            return self.quote(supplier, 3.0)
+        monkeypatch.setattr(service, "_fetch_quote", prompt)
+        assert (await service._fetch_quote_hedged(supplier, "p-fast"))["price"] == 3.0
+        assert len(prompt_calls) == 1  # No hedge for a prompt answer
+
+    @pytest.mark.asyncio
+    async def test_comparisons_share_cached_quotes(self, service, test_db, monkeypatch):
+        """Test that concurrent and repeated comparisons fetch each supplier quote once"""
+        await test_db.products.insert_one({"_id": "p-cached", "categories": ["rugs"]})
+        await test_db.suppliers.insert_many([
+            {"_id": name, "name": name, "product_categories": ["rugs"]} for name in ["north", "south"]
+        ])
+        calls = []
+
+        async def fetch(supplier, product_id):
+            calls.append(supplier["name"])
+            await asyncio.sleep(0.01)
+            return self.quote(supplier, 5.0)
+        monkeypatch.setattr(service, "_fetch_quote", fetch)
+
+        first, second = await asyncio.gather(
+            service.compare_prices("p-cached", deadline=1),
+            service.compare_prices("p-cached", deadline=1)
+        )
+        assert first == second
+        assert sorted(calls) == ["north", "south"]
+
+        await service.compare_prices("p-cached", deadline=1)
+        assert len(calls) == 2
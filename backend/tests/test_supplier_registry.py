@@ -0,0 +1,70 @@
+import pytest
+from app.services.supplier_registry import SupplierRegistry
+
+@pytest.fixture
+def registry():
+    return SupplierRegistry(ttl_seconds=60)
+
+@pytest.mark.asyncio
+async def test_supplier_is_served_from_cache(registry, test_db):
+    """Test that a cached supplier is not re-read until invalidated"""
+    result = await test_db.suppliers.insert_one({"name": "AliExpress", "api_key": "key"})
+    supplier_id = result.inserted_id
+
+    supplier = await registry.get_supplier(test_db.suppliers, supplier_id)
+    assert supplier["api_key"] == "key"
+
+    await test_db.suppliers.update_one({"_id": supplier_id}, {"$set": {"api_key": "rotated"}})
+    cached = await registry.get_supplier(test_db.suppliers, str(supplier_id))
+    assert cached["api_key"] == "key"
+
+    await registry.invalidate(supplier_id)
+    refreshed = await registry.get_supplier(test_db.suppliers, supplier_id)
+    assert refreshed["api_key"] == "rotated"
+
+@pytest.mark.asyncio
+async def test_prefetch_caches_missing_suppliers(registry, test_db):
+    """Test that prefetch loads found suppliers and remembers missing ones"""
+    result = await test_db.suppliers.insert_one({"name": "Amazon"})
+    missing_id = "5f0000000000000000000000"
+
+    await registry.prefetch(test_db.suppliers, [result.inserted_id, missing_id])
+    await test_db.suppliers.delete_many({})
+
+    assert (await registry.get_supplier(test_db.suppliers, result.inserted_id))["name"] == "Amazon"
+    assert await registry.get_supplier(test_db.suppliers, missing_id) is None
+
+@pytest.mark.asyncio
+async def test_client_is_rebuilt_when_credentials_rotate(test_db, monkeypatch):
+    """Test that a refreshed supplier with new credentials gets a new client"""
+    from unittest.mock import AsyncMock, MagicMock
+    from app.services import supplier_registry as registry_module
+    built = []
+
+    def create(supplier):
+        client = MagicMock()
+        client.__aenter__ = AsyncMock()
+        client.__aexit__ = AsyncMock()
+        built.append(client)
+        return client
+    monkeypatch.setattr(registry_module.SupplierAPIFactory, "create_api_from_document", create)
+
+    registry = SupplierRegistry(ttl_seconds=0)
+    result = await test_db.suppliers.insert_one({"name": "AliExpress", "api_key": "key"})
+    first = await registry.get_client(test_db.suppliers, result.inserted_id)
+    assert await registry.get_client(test_db.suppliers, result.inserted_id) is first
+
+    await test_db.suppliers.update_one({"_id": result.inserted_id}, {"$set": {"api_key": "rotated"}})
+    second = await registry.get_client(test_db.suppliers, result.inserted_id)
+    assert second is not first
+    # Both earlier callers still hold the old client, so it stays open until the last lets go
+    first.__aexit__.assert_not_awaited()
+    await registry.release(first)
+    first.__aexit__.assert_not_awaited()
+    await registry.release(first)
+    first.__aexit__.assert_awaited_once()
+
+    await registry.invalidate(result.inserted_id)
+    second.__aexit__.assert_not_awaited()
+    await registry.close()
+    second.__aexit__.assert_awaited_once()
@@ -0,0 +1,112 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from app.services import supplier_sync
+from app.services.supplier_sync import SupplierSyncService
+
+class RecordingCollection:
+    """Passes batch writes through to a collection, recording each batch size"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.batches.append(len(operations))
+        return await self.collection.bulk_write(operations, ordered=ordered)
+
+    async def insert_many(self, documents, ordered=True):
+        self.batches.append(len(documents))
+        return await self.collection.insert_many(documents, ordered=ordered)
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    calls = []
+
+    async def invalidate(product_ids=None):
+        calls.append(sorted(product_ids))
+    monkeypatch.setattr(supplier_sync.product_cache, "invalidate", invalidate)
+    return calls
+
+@pytest.mark.asyncio
+async def test_buffered_writes_are_merged_and_flushed_in_batches(test_db, invalidated):
+    """Test that queued fields merge per product and updates and logs are written in batches"""
+    await test_db.products.insert_many([{"_id": f"p{i}", "name": f"Product {i}", "price": 1.0} for i in range(3)])
+    service = SupplierSyncService(test_db)
+    service.write_batch_size = 2
+    service.product_collection = RecordingCollection(test_db.products)
+    service.sync_collection = RecordingCollection(test_db.sync_logs)
+
+    next_sync_at = datetime.utcnow() + timedelta(hours=1)
+    service._queue_product_update("p0", {"price": 2.0})
+    service._queue_product_update("p0", {"next_sync_at": next_sync_at})
+    service._queue_product_update("p1", {"next_sync_at": next_sync_at})
+    service._queue_product_update("p2", {"price": 3.0})
+    for i in range(3):
+        await service._log_sync({"_id": f"p{i}"}, {"price": 1.0})
+    assert service._pending_write_count() == 6
+
+    await service.flush_writes()
+    assert service.product_collection.batches == [2, 1]
+    assert service.sync_collection.batches == [2, 1]
+    assert service._pending_write_count() == 0
+
+    p0 = await test_db.products.find_one({"_id": "p0"})
+    assert p0["price"] == 2.0 and "next_sync_at" in p0
+    assert await test_db.sync_logs.count_documents({}) == 3
+    # Scheduling-only updates leave the product cache alone
+    assert invalidated == [["p0", "p2"]]
+
+@pytest.fixture
+def metrics(monkeypatch):
+    names = ["SUPPLIER_REQUEST_LATENCY", "SYNC_PRODUCTS", "SYNC_RUN_DURATION", "SYNC_QUEUE_DEPTH",
+             "SYNC_STALEST_PRODUCT_AGE", "log_error"]
+    mocks = {name: MagicMock() for name in names}
+    for name, mock in mocks.items():
+        monkeypatch.setattr(supplier_sync, name, mock)
+    return mocks
+
+@pytest.mark.asyncio
+async def test_finished_run_stores_summary_and_publishes_metrics(test_db, metrics):
+    """Test that a run records counts, per-supplier latency and backlog in sync_runs and the gauges"""
+    await test_db.products.insert_many([
+        {"_id": "due", "name": "Due", "last_sync": datetime.utcnow() - timedelta(hours=2)},
+        {"_id": "later", "name": "Later", "next_sync_at": datetime.utcnow() + timedelta(hours=1)}
+    ])
+    service = SupplierSyncService(test_db)
+    started = service._start_run()
+    service._count("synced")
+    service._count("synced")
+    service._count("skipped")
+    service._record_failure({"_id": "broken"}, RuntimeError("supplier timed out"))
+    service._observe_latency("Acme", 0.2)
+    service._observe_latency("Acme", 0.4)
+
+    await service._finish_run("worker", started, query={"supplier_id": "acme"}, worker_id="w1")
+
+    run = await test_db.sync_runs.find_one({})
+    assert (run["mode"], run["worker_id"], run["query"]) == ("worker", "w1", {"supplier_id": "acme"})
+    assert (run["products_synced"], run["products_skipped"], run["products_failed"]) == (2, 1, 1)
+    assert run["queue_depth"] == 1
+    assert run["stalest_product_age_seconds"] >= 7200
+    assert run["errors"] == [{"product_id": "broken", "error": "supplier timed out"}]
+    [acme] = run["suppliers"]
+    assert (acme["name"], acme["requests"], acme["max_latency_seconds"]) == ("Acme", 2, 0.4)
+    assert acme["avg_latency_seconds"] == pytest.approx(0.3)
+
+    metrics["SYNC_RUN_DURATION"].labels.assert_called_with(mode="worker")
+    metrics["SYNC_QUEUE_DEPTH"].set.assert_called_with(1)
+    metrics["SYNC_STALEST_PRODUCT_AGE"].set.assert_called_once()
+    assert [c.kwargs for c in metrics["SYNC_PRODUCTS"].labels.call_args_list] == [
+        {"status": "synced"}, {"status": "synced"}, {"status": "skipped"}, {"status": "failed"}
+    ]
+    metrics["SUPPLIER_REQUEST_LATENCY"].labels.assert_called_with(supplier="Acme")
+
+@pytest.mark.asyncio
+async def test_empty_run_only_refreshes_the_backlog_gauges(test_db, metrics):
+    """Test that a run that found nothing to sync stores no summary"""
+    service = SupplierSyncService(test_db)
+    await service._finish_run("full", service._start_run())
+    assert await test_db.sync_runs.count_documents({}) == 0
+    metrics["SYNC_QUEUE_DEPTH"].set.assert_called_with(0)
+    metrics["SYNC_STALEST_PRODUCT_AGE"].set.assert_not_called()
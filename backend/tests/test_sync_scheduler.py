@@ -0,0 +1,37 @@
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+from app.services.sync_scheduler import SyncScheduler
+
+@pytest.fixture
+def scheduler():
+    return SyncScheduler(MagicMock())
+
+def test_hot_product_syncs_more_often_than_dead_sku(scheduler):
+    """Test that sales velocity shortens the sync interval"""
+    hot = scheduler.compute_interval(sales_velocity=50, price_volatility=0, stock=500)
+    dead = scheduler.compute_interval(sales_velocity=0, price_volatility=0, stock=500)
+    assert hot < dead
+
+def test_price_volatility_and_low_stock_shorten_interval(scheduler):
+    """Test that volatile prices and low stock pull the interval down"""
+    stable = scheduler.compute_interval(sales_velocity=1, price_volatility=0, stock=500)
+    volatile = scheduler.compute_interval(sales_velocity=1, price_volatility=20, stock=500)
+    low_stock = scheduler.compute_interval(sales_velocity=1, price_volatility=0, stock=1)
+    assert volatile < stable
+    assert low_stock < stable
+
+def test_interval_is_clamped(scheduler):
+    """Test that intervals stay within the configured bounds"""
+    fastest = scheduler.compute_interval(sales_velocity=10_000, price_volatility=1_000, stock=0)
+    slowest = scheduler.compute_interval(sales_velocity=0, price_volatility=0, stock=10_000)
+    assert fastest == scheduler.min_interval
+    assert slowest <= scheduler.max_interval
+
+def test_schedule_sets_next_sync_at(scheduler):
+    """Test that scheduling a product stores its interval and due time"""
+    product = {"_id": "prod1", "price_volatility": 10.0, "sales_velocity": 2.0}
+    fields = scheduler.schedule(product, price_change=0.0, stock=100)
+    assert fields["price_volatility"] == 5.0
+    assert fields["sales_velocity"] == 2.0
+    assert fields["next_sync_at"] > datetime.utcnow()
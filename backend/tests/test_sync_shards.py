@@ -0,0 +1,85 @@
+import pytest
+from datetime import datetime, timedelta
+from app.services.sync_shards import SyncShardCoordinator
+
+def test_shard_for_is_stable_and_in_range():
+    """Test that products map to the same shard every time"""
+    shards = {SyncShardCoordinator.shard_for(f"product{i}", 8) for i in range(200)}
+    assert shards <= set(range(8))
+    assert len(shards) == 8
+    assert SyncShardCoordinator.shard_for("abc", 8) == SyncShardCoordinator.shard_for("abc", 8)
+
+@pytest.mark.asyncio
+async def test_workers_never_hold_the_same_shard(test_db):
+    """Test that each shard is leased to at most one live worker"""
+    first = SyncShardCoordinator(test_db, "worker-a")
+    second = SyncShardCoordinator(test_db, "worker-b")
+    first.shard_count = second.shard_count = 2
+    await first.ensure_shards()
+
+    lease_a = await first.claim_shard()
+    lease_b = await second.claim_shard()
+    assert lease_a["_id"] != lease_b["_id"]
+    assert await first.claim_shard() is None
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reassigned_and_fenced(test_db):
+    """Test that a dead worker's shard is reclaimed and it cannot renew it"""
+    dead = SyncShardCoordinator(test_db, "dead-worker")
+    alive = SyncShardCoordinator(test_db, "alive-worker")
+    dead.shard_count = alive.shard_count = 1
+    await dead.ensure_shards()
+
+    stale_lease = await dead.claim_shard()
+    await test_db.sync_leases.update_one(
+        {"_id": stale_lease["_id"]},
+        {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+    )
+
+    new_lease = await alive.claim_shard()
+    assert new_lease["owner"] == "alive-worker"
+    assert new_lease["token"] > stale_lease["token"]
+    assert await dead.renew(stale_lease) is False
+    assert await alive.renew(new_lease) is True
+
+@pytest.mark.asyncio
+async def test_renew_in_the_same_instant_keeps_the_lease(test_db, monkeypatch):
+    """Test that a renew writing identical timestamps is not mistaken for a lost lease"""
+    from app.services import sync_shards
+    coordinator = SyncShardCoordinator(test_db, "fast-worker")
+    coordinator.shard_count = 1
+    await coordinator.ensure_shards()
+    lease = await coordinator.claim_shard()
+
+    frozen = datetime.utcnow()
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return frozen
+    monkeypatch.setattr(sync_shards, "datetime", FrozenDatetime)
+    assert await coordinator.renew(lease) is True
+    assert await coordinator.renew(lease) is True
+
+@pytest.mark.asyncio
+async def test_flush_is_dropped_after_lease_is_lost(test_db):
+    """Test that a worker whose shard was reassigned writes nothing"""
+    from app.services.supplier_sync import SupplierSyncService
+    from app.services.sync_shards import LeaseLost
+    dead = SyncShardCoordinator(test_db, "dead-worker")
+    alive = SyncShardCoordinator(test_db, "alive-worker")
+    dead.shard_count = alive.shard_count = 1
+    await dead.ensure_shards()
+    stale_lease = await dead.claim_shard()
+    await test_db.sync_leases.update_one(
+        {"_id": stale_lease["_id"]},
+        {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+    )
+    await alive.claim_shard()
+
+    result = await test_db.products.insert_one({"name": "Fenced", "stock": 5})
+    service = SupplierSyncService(test_db)
+    service._fence = lambda: dead.renew(stale_lease)
+    service._queue_product_update(result.inserted_id, {"stock": 1})
+    with pytest.raises(LeaseLost):
+        await service.flush_writes()
+    assert (await test_db.products.find_one({"_id": result.inserted_id}))["stock"] == 5